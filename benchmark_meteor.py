@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare the in-process METEOR approximation against the METEOR jar: runtime, corpus-level
+deviation and segment-level correlation/deviation.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from argparse import ArgumentParser
+import sys
+import time
+
+import numpy as np
+
+from measure_scores import load_data, create_coco_refs, create_coco_sys, add_meteor_args, get_meteor_args
+from pycocoevalcap.tokenizer.ptbtokenizer import PTBTokenizer
+from pycocoevalcap.meteor.meteor import Meteor
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox
+
+
+def rank(values):
+    """Return ranks of the given values (ties get the average rank)."""
+    values = np.asarray(values)
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    for val in np.unique(values):
+        ranks[values == val] = ranks[values == val].mean()
+    return ranks
+
+
+def timed(scorer, gts, res):
+    """Run the scorer, return corpus score, segment scores and the time taken."""
+    start = time.time()
+    score, scores = scorer.compute_score(gts, res)
+    return score, np.array(scores), time.time() - start
+
+
+def report(gts, res, use_jar=True, meteor_args=None):
+    """Print out the comparison report for the given tokenized references & outputs
+    (meteor_args: keyword arguments for the METEOR jar wrapper, see create_meteor)."""
+    approx_score, approx_scores, approx_time = timed(MeteorApprox(), gts, res)
+    print('Segments: %d' % len(res))
+    print('Approx. METEOR: %.4f (%.3fs)' % (approx_score, approx_time))
+    if not use_jar:
+        return
+    jar_score, jar_scores, jar_time = timed(Meteor(**(meteor_args or {})), gts, res)
+    diffs = approx_scores - jar_scores
+    print('Jar METEOR:     %.4f (%.3fs, incl. JVM startup)' % (jar_score, jar_time))
+    print('Corpus-level deviation: %+.4f' % (approx_score - jar_score))
+    print('Segment-level Pearson r: %.4f' % np.corrcoef(approx_scores, jar_scores)[0, 1])
+    print('Segment-level Spearman rho: %.4f' % np.corrcoef(rank(approx_scores), rank(jar_scores))[0, 1])
+    print('Segment-level deviation: mean %+.4f, mean abs. %.4f, max abs. %.4f'
+          % (diffs.mean(), np.abs(diffs).mean(), np.abs(diffs).max()))
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='Approximate METEOR vs. METEOR jar -- benchmark & comparison')
+    ap.add_argument('-P', '--pretokenized', action='store_true',
+                    help='Inputs are already PTB-tokenized & lowercased (skip tokenization)')
+    ap.add_argument('-n', '--no-jar', action='store_true', help='Only benchmark the approximation')
+    ap.add_argument('-r', '--repeat', type=int, default=1, help='Repeat the data N times (for timing)')
+    add_meteor_args(ap, approx=False, bootstrap=False)
+    ap.add_argument('ref_file', type=str, nargs='?', default='example-inputs/devel-conc.txt',
+                    help='References file (default: E2E example inputs)')
+    ap.add_argument('sys_file', type=str, nargs='?', default='example-inputs/baseline-output.txt',
+                    help='System outputs file (default: E2E example inputs)')
+    args = ap.parse_args()
+
+    _, data_ref, data_sys = load_data(args.ref_file, args.sys_file)
+    data_ref = data_ref * args.repeat
+    data_sys = data_sys * args.repeat
+    gts = {}
+    for ann in create_coco_refs(data_ref)['annotations']:
+        gts.setdefault(ann['image_id'], []).append({'caption': ann['caption']})
+    res = {inst['image_id']: [{'caption': inst['caption']}] for inst in create_coco_sys(data_sys)}
+    if args.pretokenized:
+        gts = {key: [' '.join(ref['caption'].split()) for ref in refs] for key, refs in gts.items()}
+        res = {key: [' '.join(hyp['caption'].split()) for hyp in hyps] for key, hyps in res.items()}
+    else:
+        print('Tokenizing...', file=sys.stderr)
+        tokenizer = PTBTokenizer()
+        gts = tokenizer.tokenize(gts)
+        res = tokenizer.tokenize(res)
+    report(gts, res, not args.no_jar, get_meteor_args(ap, args))
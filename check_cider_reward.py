@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Check the CIDEr-D reward object (pycocoevalcap.cider.cider_reward): its per-sample scores must
+equal the per-segment scores of Cider.compute_score on the full corpus, and scoring hypotheses
+with n-grams unseen in the references must not grow its memory (the IDF cache and the
+vocabulary stay the same size), so it can be used for any number of training steps.
+"""
+
+from __future__ import print_function
+from builtins import range
+from argparse import ArgumentParser
+import random
+import sys
+
+from measure_scores import load_data
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.cider.cider_reward import CiderReward
+
+
+def simple_tokenize(sent):
+    """Lowercase & split off punctuation (any consistent tokenization will do here)."""
+    return ' '.join(sent.lower().replace('.', ' .').replace(',', ' ,').split())
+
+
+def novel_hypotheses(data_sys, num_hyps, rng):
+    """Outputs with randomly inserted new words (unseen in the references & in each other)."""
+    hyps = []
+    for hyp_no in range(num_hyps):
+        tokens = rng.choice(data_sys).split()
+        for tok_no in range(rng.randint(1, 5)):
+            tokens.insert(rng.randint(0, len(tokens)), 'novelword%d_%d' % (hyp_no, tok_no))
+        hyps.append(' '.join(tokens))
+    return hyps
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='CIDEr-D reward -- score & memory check')
+    ap.add_argument('-n', '--hypotheses', type=int, default=100,
+                    help='Number of novel hypotheses to score (default: 100)')
+    ap.add_argument('--seed', type=int, default=1234, help='Random seed (default: 1234)')
+    ap.add_argument('ref_file', type=str, nargs='?', default='example-inputs/devel-conc.txt',
+                    help='References file (default: E2E example inputs)')
+    ap.add_argument('sys_file', type=str, nargs='?', default='example-inputs/baseline-output.txt',
+                    help='System outputs file (default: E2E example inputs)')
+    args = ap.parse_args()
+
+    _, data_ref, data_sys = load_data(args.ref_file, args.sys_file)
+    gts = {inst_no: [simple_tokenize(ref) for ref in refs] for inst_no, refs in enumerate(data_ref)}
+    res = {inst_no: [simple_tokenize(sent)] for inst_no, sent in enumerate(data_sys)}
+    reward = CiderReward(gts)
+    ok = True
+
+    _, cider_scores = Cider().compute_score(gts, res)
+    reward_scores = reward(list(res.keys()), [res[inst_no][0] for inst_no in res])
+    max_diff = max(abs(reward_scores - cider_scores))
+    print('Max. difference from Cider.compute_score: %g' % max_diff)
+    ok = ok and max_diff < 1e-12
+
+    rng = random.Random(args.seed)
+    hyps = novel_hypotheses([res[inst_no][0] for inst_no in res], args.hypotheses, rng)
+    ref_ids = [rng.choice(list(gts.keys())) for _ in hyps]
+    cache_size, vocab_size = len(reward.references._idf), len(reward.vocab)
+    reward(ref_ids, hyps)
+    print('IDF cache size: %d -> %d, vocabulary size: %d -> %d after %d novel hypotheses'
+          % (cache_size, len(reward.references._idf), vocab_size, len(reward.vocab), len(hyps)))
+    ok = ok and cache_size == len(reward.references._idf) and vocab_size == len(reward.vocab)
+
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
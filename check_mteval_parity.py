@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Check that the Perl-compatible Python BLEU & NIST (metrics.pymteval with perl_compat=True,
+the default in measure_scores.py) give the same results as the MTEval Perl script, on the given
+data and on randomized multi-reference data sampled from it.
+
+Compared are the segment-level statistics that the script writes out for significance tests
+(closest reference length, n-gram matches, output & reference n-gram counts, NIST information
+of the matches) and the reported BLEU & NIST scores. Needs Perl with the XML::Twig module.
+"""
+
+from __future__ import print_function
+from __future__ import division
+from builtins import zip
+from builtins import range
+from argparse import ArgumentParser
+from tempfile import mkdtemp
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+
+from measure_scores import load_data, create_mteval_file
+from metrics.pymteval import BLEUNISTScore
+
+# n-gram orders to compare (NIST uses up to 5-grams, BLEU up to 4-grams)
+MAX_NGRAM = 5
+# tokens inserted into the randomized data (incl. "0", which the script treats specially)
+EXTRA_TOKENS = ['0', '0', 'the', 'The', 'restaurant', '.', ',', '£20-25', 'CAFÉ', '-']
+
+
+def run_perl(data_ref, data_sys):
+    """Run the Perl script, return BLEU & NIST as reported (strings) and segment statistics."""
+    temp_path = mkdtemp(prefix='e2e-parity-')
+    try:
+        files = {}
+        for name, data in [('ref', data_ref), ('tst', data_sys), ('src', [''] * len(data_sys))]:
+            files[name] = os.path.join(temp_path, 'mteval_%s.sgm' % name)
+            create_mteval_file(data, files[name], name)
+        stats_file = os.path.join(temp_path, 'mteval_stats.txt')
+        mteval_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                   'mteval', 'mteval-v13a-sig.pl')
+        out = subprocess.check_output(['perl', mteval_path, '-r', files['ref'], '-s', files['src'],
+                                       '-t', files['tst'], '-f', stats_file], stderr=subprocess.STDOUT)
+        out = out.decode('UTF-8')
+        # the statistics are written out for both metrics, they're the same
+        with open(stats_file) as fh:
+            stats = [parse_stats_line(line) for line in fh][:len(data_sys)]
+    finally:
+        shutil.rmtree(temp_path)
+    bleu = re.search(r'BLEU score = ([0-9.]+)', out).group(1)
+    nist = re.search(r'NIST score = ([0-9.]+)', out).group(1)
+    return bleu, nist, stats
+
+
+def parse_stats_line(line):
+    """Parse one segment's line of the script's statistics file (fields separated by `|`,
+    n-gram values for 1..9-grams). The 1st field (number of reference sets) is skipped."""
+    fields = [field.split() for field in line.split('|')]
+    ref_len = int(fields[1][0])
+    matches, tst_counts, ref_counts = [[int(val) for val in fields[i][:MAX_NGRAM]] for i in (2, 3, 4)]
+    tst_info = [float(val) for val in fields[5][:MAX_NGRAM]]
+    return ref_len, matches, tst_counts, ref_counts, tst_info
+
+
+def run_python(data_ref, data_sys):
+    """Compute BLEU & NIST in Perl-compatible mode, return them formatted as the script
+    reports them, along with segment statistics in the script's format."""
+    bleu_nist = BLEUNISTScore(perl_compat=True)
+    for sents_ref, sent_sys in zip(data_ref, data_sys):
+        bleu_nist.append(sent_sys, sents_ref)
+    bleu, nist = bleu_nist.score()
+
+    # segment statistics, with information values from all references
+    scorer = bleu_nist.nist
+    stats = []
+    for sents_ref, sent_sys in zip(data_ref, data_sys):
+        pred_sent, ref_sents = scorer.encode(sent_sys, sents_ref)
+        hit_ngrams = [scorer.clipped_hits(n, pred_sent, ref_sents) for n in range(1, MAX_NGRAM + 1)]
+        stats.append((bleu_nist.bleu.perl_closest_ref_len(len(pred_sent), ref_sents),
+                      [sum(hits.values()) for hits in hit_ngrams],
+                      [max(len(pred_sent) - n, 0) for n in range(MAX_NGRAM)],
+                      [sum(max(len(ref_sent) - n, 0) for ref_sent in ref_sents) for n in range(MAX_NGRAM)],
+                      [sum(scorer.info(ngram) * cnt for ngram, cnt in hits.items()) for hits in hit_ngrams]))
+    return '%.4f' % bleu, '%.4f' % nist, stats
+
+
+def compare(data_ref, data_sys, label, max_errors=5):
+    """Compare the Perl script & Python on the given data, print out the results.
+    @return: True if everything matched
+    """
+    perl_bleu, perl_nist, perl_stats = run_perl(data_ref, data_sys)
+    py_bleu, py_nist, py_stats = run_python(data_ref, data_sys)
+    errors = []
+    for seg_no, (perl_seg, py_seg) in enumerate(zip(perl_stats, py_stats)):
+        if perl_seg[:4] != py_seg[:4] or not all(math.isclose(perl_info, py_info, rel_tol=1e-9, abs_tol=1e-9)
+                                                 for perl_info, py_info in zip(perl_seg[4], py_seg[4])):
+            errors.append('  segment %d: Perl %s, Python %s' % (seg_no, perl_seg, py_seg))
+    if len(perl_stats) != len(py_stats):
+        errors.append('  number of segments: Perl %d, Python %d' % (len(perl_stats), len(py_stats)))
+    ok = not errors and (perl_bleu, perl_nist) == (py_bleu, py_nist)
+    print('%s: %d segments, BLEU Perl %s / Python %s, NIST Perl %s / Python %s -- %s'
+          % (label, len(data_sys), perl_bleu, py_bleu, perl_nist, py_nist, 'OK' if ok else 'MISMATCH'))
+    for error in errors[:max_errors]:
+        print(error)
+    if len(errors) > max_errors:
+        print('  ... %d more mismatched segments' % (len(errors) - max_errors))
+    return ok
+
+
+def perturb(sent, rng):
+    """Randomly edit a sentence (delete, insert, swap or uppercase tokens)."""
+    tokens = sent.split()
+    for _ in range(rng.randint(0, 3)):
+        op = rng.randrange(4)
+        if op == 0 and tokens:
+            del tokens[rng.randrange(len(tokens))]
+        elif op == 1:
+            tokens.insert(rng.randint(0, len(tokens)), rng.choice(EXTRA_TOKENS))
+        elif op == 2 and len(tokens) > 1:
+            i, j = rng.sample(range(len(tokens)), 2)
+            tokens[i], tokens[j] = tokens[j], tokens[i]
+        elif tokens:
+            i = rng.randrange(len(tokens))
+            tokens[i] = tokens[i].upper()
+    return ' '.join(tokens)
+
+
+def random_data(data_ref, data_sys, num_segs, rng):
+    """Sample randomized multi-reference data: a random number of (perturbed) references for each
+    segment, outputs taken from the system, the references, or other segments' references,
+    sometimes cut down to 0-3 tokens."""
+    rand_ref, rand_sys = [], []
+    for _ in range(num_segs):
+        inst_no = rng.randrange(len(data_ref))
+        refs = rng.sample(data_ref[inst_no], rng.randint(1, len(data_ref[inst_no])))
+        rand_ref.append([perturb(ref, rng) if rng.random() < 0.3 else ref for ref in refs])
+        source = rng.randrange(3)
+        if source == 0:
+            sent = data_sys[inst_no]
+        elif source == 1:
+            sent = rng.choice(data_ref[inst_no])
+        else:
+            sent = rng.choice(rng.choice(data_ref))
+        if rng.random() < 0.1:
+            sent = ' '.join(sent.split()[:rng.randint(0, 3)])
+        rand_sys.append(perturb(sent, rng))
+    return rand_ref, rand_sys
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='Perl-compatible Py-MTEval vs. MTEval Perl script -- parity check')
+    ap.add_argument('-n', '--trials', type=int, default=5, help='Number of randomized data sets (default: 5)')
+    ap.add_argument('-S', '--segments', type=int, default=500,
+                    help='Number of segments in each randomized data set (default: 500)')
+    ap.add_argument('--seed', type=int, default=1234, help='Random seed (default: 1234)')
+    ap.add_argument('ref_file', type=str, nargs='?', default='example-inputs/devel-conc.txt',
+                    help='References file (default: E2E example inputs)')
+    ap.add_argument('sys_file', type=str, nargs='?', default='example-inputs/baseline-output.txt',
+                    help='System outputs file (default: E2E example inputs)')
+    args = ap.parse_args()
+
+    _, data_ref, data_sys = load_data(args.ref_file, args.sys_file)
+    ok = compare(data_ref, data_sys, 'Input data')
+    rng = random.Random(args.seed)
+    for trial in range(args.trials):
+        rand_ref, rand_sys = random_data(data_ref, data_sys, args.segments, rng)
+        ok = compare(rand_ref, rand_sys, 'Random data %d' % (trial + 1)) and ok
+    sys.exit(0 if ok else 1)
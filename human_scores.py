@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Human upper bound: score each reference against the remaining references of its segment
+(leave-one-out) and print out corpus-level BLEU, NIST, METEOR, ROUGE-L & CIDEr of all the
+held-out references, see metrics/human.py.
+"""
+
+from __future__ import print_function
+from argparse import ArgumentParser
+import sys
+
+from measure_scores import (load_refs, tokenize_coco, create_mteval_corpus, print_scores, add_pretokenized_args,
+                            get_pretokenized, add_meteor_args, get_meteor_args)
+from metrics.human import human_scores
+from pycocoevalcap.eval import create_meteor
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='E2E Challenge evaluation -- leave-one-out human upper bound')
+    ap.add_argument('-p', '--python', action='store_true',
+                    help='Use Python implementation of MTEval with proper NIST for variable numbers of ' +
+                    'references, instead of reproducing the Perl script\'s results')
+    ap.add_argument('-w', '--workers', type=int, default=1, help='Number of parallel tokenization processes')
+    add_pretokenized_args(ap, 'References')
+    add_meteor_args(ap, bootstrap=False)
+    ap.add_argument('-t', '--table', action='store_true', help='Print out results as a line in a TSV table?')
+    ap.add_argument('-H', '--header', action='store_true', help='Print TSV table header?')
+    ap.add_argument('ref_file', type=str, help='References file (see measure_scores.py)')
+    args = ap.parse_args()
+    pretokenized = get_pretokenized(ap, args)
+
+    meteor_args = get_meteor_args(ap, args)
+    data_ref = load_refs(args.ref_file)
+    print('Scoring %d references of %d segments with 2+ references' %
+          (sum(len(refs) for refs in data_ref if len(refs) > 1), sum(1 for refs in data_ref if len(refs) > 1)),
+          file=sys.stderr)
+    coco_ref, _ = tokenize_coco(data_ref, [], args.workers, 'ptb' in pretokenized)
+    perl_compat = not args.python
+    scores = human_scores(data_ref, coco_ref, create_meteor(meteor_args),
+                          create_mteval_corpus('mteval' in pretokenized, perl_compat), perl_compat)
+    print_scores(scores, args.table, args.header, args.ref_file)
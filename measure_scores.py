@@ -4,6 +4,7 @@
 from __future__ import print_function
 from builtins import zip
 from builtins import str
+from builtins import range
 import codecs
 from argparse import ArgumentParser
 from tempfile import mkdtemp
@@ -13,16 +14,29 @@ import subprocess
 import re
 import sys
 import csv
+import random
 
 from pycocotools.coco import COCO
-from pycocoevalcap.eval import COCOEvalCap
-from metrics.pymteval import BLEUScore, NISTScore
+from pycocoevalcap.eval import COCOEvalCap, create_meteor
+from pycocoevalcap.tokenizer.ptbtokenizer import PTBTokenizer
+from metrics.pymteval import BLEUNISTScore, NGramScore
+from metrics.seg_level import SegLevelScorer
+from metrics.suff_stats import SufficientStats
+from metrics.sampled import SampledEvaluator, ptb_tokenize, whitespace_normalize
+from metrics.corpus import Corpus, whitespace_tokenize
 
 # CSV headers
 HEADER_SRC = r'(mr|src|source|meaning(?:[_ .-]rep(?:resentation)?)?|da|dial(?:ogue)?[_ .-]act)s?'
 HEADER_SYS = r'(out(?:put)?|ref(?:erence)?|sys(?:tem)?(?:[_ .-](?:out(?:put)?|ref(?:erence)?))?)s?'
 HEADER_REF = r'(trg|tgt|target|ref(?:erence)?|human(?:[_ .-](?:ref(?:erence)?))?)s?'
 
+# Tokenization schemes that the inputs may already follow (tokenization is skipped for them),
+# with a check whether a sentence looks tokenized according to the scheme
+TOKENIZATION_SCHEMES = {
+    'ptb': PTBTokenizer.is_tokenized,  # MS-COCO metrics: lowercased, no punctuation
+    'mteval': NGramScore.is_tokenized,  # Py-MTEval (BLEU & NIST unless --perl)
+}
+
 
 def read_lines(file_name, multi_ref=False):
     """Read one instance per line from a text file. In multi-ref mode, assumes multiple lines
@@ -200,6 +214,17 @@ def create_mteval_file(refs, path, file_type):
         fh.write('</%s>' % settype)
 
 
+def load_refs(ref_file, data_src=()):
+    """Load the references from the given file, grouped by segment (for TSV files, according to
+    the given sources if they are real, by identical sources on consecutive lines otherwise)."""
+    if re.search('\.[ct]sv$', ref_file, re.I):
+        return read_and_group_tsv(ref_file, data_src)
+    data_ref = read_lines(ref_file, multi_ref=True)
+    if len(data_ref) == 1:  # this was apparently a single-ref file -> fix the structure
+        data_ref = [[inst] for inst in data_ref[0]]
+    return data_ref
+
+
 def load_data(ref_file, sys_file, src_file=None):
     """Load the data from the given files."""
     # read SRC/SYS files
@@ -213,36 +238,109 @@ def load_data(ref_file, sys_file, src_file=None):
         data_src = [''] * len(data_sys)
 
     # read REF file
-    if re.search('\.[ct]sv$', ref_file, re.I):
-        data_ref = read_and_group_tsv(ref_file, data_src)
-    else:
-        data_ref = read_lines(ref_file, multi_ref=True)
-        if len(data_ref) == 1:  # this was apparently a single-ref file -> fix the structure
-            data_ref = [[inst] for inst in data_ref[0]]
+    data_ref = load_refs(ref_file, data_src)
 
     # sanity check
     assert(len(data_ref) == len(data_sys) == len(data_src))
     return data_src, data_ref, data_sys
 
 
+def add_pretokenized_args(ap, what='Inputs'):
+    """Add the -P/--pretokenized & --pretokenized-schemes options to an argument parser."""
+    ap.add_argument('-P', '--pretokenized', action='store_true',
+                    help=what + ' are already tokenized (space-separated tokens), skip tokenization ' +
+                    '(for the schemes given by --pretokenized-schemes)')
+    ap.add_argument('--pretokenized-schemes', type=str, default=None,
+                    help='Comma-separated tokenization schemes the data follows (implies -P): ptb ' +
+                    '(MS-COCO metrics: lowercased, no punctuation), mteval (BLEU & NIST unless --perl). ' +
+                    'Default: all schemes')
+
+
+def get_pretokenized(ap, args):
+    """Return the list of tokenization schemes to skip given the -P options (see
+    add_pretokenized_args), report unknown schemes as argument errors."""
+    if args.pretokenized_schemes is not None:
+        schemes = [scheme for scheme in args.pretokenized_schemes.split(',') if scheme]
+    elif args.pretokenized:
+        schemes = sorted(TOKENIZATION_SCHEMES)
+    else:
+        return []
+    for scheme in schemes:
+        if scheme not in TOKENIZATION_SCHEMES:
+            ap.error('Unknown tokenization scheme: %s' % scheme)
+    return schemes
+
+
+def add_meteor_args(ap, approx=True, bootstrap=True):
+    """Add the METEOR options to an argument parser: -M/--meteor-workers, --meteor-mem &
+    --meteor-cache for the METEOR jar's processes, optionally --meteor-approx & --meteor-bootstrap."""
+    ap.add_argument('-M', '--meteor-workers', type=int, default=1,
+                    help='Number of METEOR processes to run in parallel')
+    ap.add_argument('--meteor-mem', type=str, default='2G',
+                    help='Maximum Java heap size for each METEOR process (default: 2G)')
+    ap.add_argument('--meteor-cache', type=str, default=None,
+                    help='Persistent cache file for METEOR segment statistics & scores (optional)')
+    if approx:
+        ap.add_argument('--meteor-approx', action='store_true',
+                        help='Use a fast in-process approximation of METEOR (exact & stem matching only, no Java)')
+    if bootstrap:
+        ap.add_argument('--meteor-bootstrap', type=int, default=0,
+                        help='Number of bootstrap resamples for a 95%% confidence interval of METEOR ' +
+                        '(default: 0 = none)')
+
+
+def get_meteor_args(ap, args):
+    """Return METEOR settings (see create_meteor) given the command-line options (see
+    add_meteor_args), report options of the METEOR jar's processes combined with --meteor-approx
+    as argument errors."""
+    bootstrap = getattr(args, 'meteor_bootstrap', 0)
+    if getattr(args, 'meteor_approx', False):
+        if args.meteor_workers != 1 or args.meteor_mem != '2G' or args.meteor_cache is not None:
+            ap.error('-M, --meteor-mem & --meteor-cache cannot be used with --meteor-approx (no Java processes)')
+        return {'approx': True, 'bootstrap': bootstrap}
+    return {'workers': args.meteor_workers, 'mem': args.meteor_mem, 'cache_file': args.meteor_cache,
+            'bootstrap': bootstrap}
+
+
+def check_pretokenized(data_ref, data_sys, schemes, sample_size=100):
+    """Check a random sample of references & system outputs if they look tokenized according
+    to the given schemes, print a warning if they don't."""
+    sents = list(data_sys) + [ref for refs in data_ref for ref in refs]
+    sample = random.Random(1234).sample(sents, min(sample_size, len(sents)))
+    for scheme in schemes:
+        bad = [sent for sent in sample if not TOKENIZATION_SCHEMES[scheme](sent)]
+        if bad:
+            print('WARNING: %d/%d sampled sentences do not look %s-tokenized, e.g.: %s'
+                  % (len(bad), len(sample), scheme, bad[0]), file=sys.stderr)
+
+
 def evaluate(data_src, data_ref, data_sys,
              print_as_table=False, print_table_header=False, sys_fname='',
-             python=False):
-    """Main procedure, running the MS-COCO & MTEval evaluators on the loaded data."""
+             python=False, workers=1, pretokenized=(), meteor_args=None, perl=False):
+    """Main procedure, running the MS-COCO & MTEval evaluators on the loaded data.
+    BLEU & NIST are computed by the Perl script if perl is set, by the Python implementation
+    if python is set, and by the Python implementation in Perl-compatible mode by default."""
 
     # run the MS-COCO evaluator
-    coco_eval = run_coco_eval(data_ref, data_sys)
+    coco_eval = run_coco_eval(data_ref, data_sys, workers, 'ptb' in pretokenized, meteor_args)
     scores = {metric: score for metric, score in list(coco_eval.eval.items())}
 
     # run MT-Eval (original or Python)
-    if python:
-        mteval_scores = run_pymteval(data_ref, data_sys)
-    else:
+    if perl:
         mteval_scores = run_mteval(data_ref, data_sys, data_src)
+    else:
+        mteval_scores = run_pymteval(data_ref, data_sys, workers, 'mteval' in pretokenized,
+                                     perl_compat=not python)
     scores.update(mteval_scores)
 
-    # print out the results
-    metric_names = ['BLEU', 'NIST', 'METEOR', 'ROUGE_L', 'CIDEr']
+    print_scores(scores, print_as_table, print_table_header, sys_fname)
+
+
+def print_scores(scores, print_as_table=False, print_table_header=False, sys_fname='',
+                 metric_names=('BLEU', 'NIST', 'METEOR', 'ROUGE_L', 'CIDEr')):
+    """Print out corpus-level scores (as a table line or a listing, with confidence intervals
+    where available)."""
+    metric_names = list(metric_names)
     if print_as_table:
         if print_table_header:
             print('\t'.join(['File'] + metric_names))
@@ -250,7 +348,10 @@ def evaluate(data_src, data_ref, data_sys,
     else:
         print('SCORES:\n==============')
         for metric in metric_names:
-            print('%s: %.4f' % (metric, scores[metric]))
+            if metric + '_CI' in scores:
+                print('%s: %.4f (CI: %.4f-%.4f)' % ((metric, scores[metric]) + scores[metric + '_CI']))
+            else:
+                print('%s: %.4f' % (metric, scores[metric]))
         print()
 
 
@@ -290,23 +391,39 @@ def run_mteval(data_ref, data_sys, data_src):
     return {'NIST': nist, 'BLEU': bleu}
 
 
-def run_pymteval(data_ref, data_sys):
-    """Run document-level BLEU and NIST in their Python implementation (should give the
-    same results as Perl)."""
-    print('Running Py-MTEval metrics...', file=sys.stderr)
-    bleu = BLEUScore()
-    nist = NISTScore()
+def create_mteval_corpus(pretokenized=False, perl_compat=False):
+    """Create the corpus for Py-MTEval scorers, pre-tokenized sentences are just split
+    on whitespace (otherwise the scorers' own tokenization is used)."""
+    if pretokenized:
+        return Corpus(lowercase='ascii' if perl_compat else True, tokenize=whitespace_tokenize)
+    return None
+
+
+def run_pymteval(data_ref, data_sys, workers=1, pretokenized=False, perl_compat=False):
+    """Run document-level BLEU and NIST in their Python implementation (gives the same results
+    as Perl in Perl-compatible mode)."""
+    print('Running Py-MTEval metrics%s...' % (' (Perl-compatible)' if perl_compat else ''), file=sys.stderr)
+    # both metrics are collected at once, each sentence is tokenized & counted only once
+    bleu_nist = BLEUNISTScore(corpus=create_mteval_corpus(pretokenized, perl_compat), perl_compat=perl_compat)
+    tokenize_corpus(bleu_nist.corpus, data_ref, data_sys, workers)
 
     # collect statistics
     for sents_ref, sent_sys in zip(data_ref, data_sys):
-        bleu.append(sent_sys, sents_ref)
-        nist.append(sent_sys, sents_ref)
+        bleu_nist.append(sent_sys, sents_ref)
 
     # return the computed scores
-    return {'NIST': nist.score(), 'BLEU': bleu.score()}
+    bleu, nist = bleu_nist.score()
+    return {'NIST': nist, 'BLEU': bleu}
+
+
+def tokenize_corpus(corpus, data_ref, data_sys, workers=1):
+    """Tokenize all references & system outputs into the given corpus, in parallel if
+    more workers are requested."""
+    if workers > 1:
+        corpus.encode_all([ref for refs in data_ref for ref in refs] + list(data_sys), workers)
 
 
-def run_coco_eval(data_ref, data_sys):
+def run_coco_eval(data_ref, data_sys, workers=1, pretokenized=False, meteor_args=None):
     """Run the COCO evaluator, return the resulting evaluation object (contains both
     system- and segment-level scores."""
     # convert references and system outputs to MS-COCO format in-memory
@@ -319,37 +436,76 @@ def run_coco_eval(data_ref, data_sys):
     coco.createIndex()
 
     coco_res = coco.loadRes(resData=coco_sys)
-    coco_eval = COCOEvalCap(coco, coco_res)
+    coco_eval = COCOEvalCap(coco, coco_res, workers, pretokenized, meteor_args)
     coco_eval.evaluate()
 
     return coco_eval
 
 
-def sent_level_scores(data_src, data_ref, data_sys, out_fname):
-    """Collect segment-level scores for the given data and write them out to a TSV file."""
-    res_data = []
-    headers = ['src', 'sys_out', 'BLEU', 'sentBLEU', 'NIST']
-    coco_scorers = ['METEOR', 'ROUGE_L', 'CIDEr']
-    mteval_scorers = [BLEUScore(), BLEUScore(smoothing=1.0), NISTScore()]
-    headers.extend(coco_scorers)
-
-    # prepare COCO scores
-    coco_eval = run_coco_eval(data_ref, data_sys)
-    # go through the segments
-    for inst_no, (sent_src, sents_ref, sent_sys) in enumerate(zip(data_src, data_ref, data_sys)):
-        res_line = [sent_src, sent_sys]
-        # run the PyMTEval scorers for the given segment
-        for scorer in mteval_scorers:
-            scorer.reset()
-            scorer.append(sent_sys, sents_ref)
-            res_line.append('%.4f' % scorer.score())
-        # extract the segment-level scores from the COCO object
-        for coco_scorer in coco_scorers:
-            res_line.append('%.4f' % coco_eval.imgToEval['inst-%d' % inst_no][coco_scorer])
-        # collect the results
-        res_data.append(res_line)
-    # write the output file
-    write_tsv(out_fname, headers, res_data)
+def tokenize_coco(data_ref, data_sys, workers=1, pretokenized=False):
+    """PTB-tokenize references & system outputs for the MS-COCO metrics, as COCOEvalCap does
+    (pre-tokenized sentences are just normalized for whitespace).
+    @return: tokenized references (list of lists) & system outputs (list)
+    """
+    if pretokenized:
+        return ([[' '.join(ref.split()) for ref in refs] for refs in data_ref],
+                [' '.join(sent.split()) for sent in data_sys])
+    print('tokenization...', file=sys.stderr)
+    tokenizer = PTBTokenizer(workers=workers)
+    coco_ref = tokenizer.tokenize({inst_no: [{'caption': ref} for ref in refs]
+                                   for inst_no, refs in enumerate(data_ref)})
+    coco_sys = (tokenizer.tokenize({inst_no: [{'caption': sent}] for inst_no, sent in enumerate(data_sys)})
+                if data_sys else {})
+    return ([coco_ref[inst_no] for inst_no in range(len(data_ref))],
+            [coco_sys[inst_no][0] for inst_no in range(len(data_sys))])
+
+
+def sent_level_scores(data_src, data_ref, data_sys, out_fname, workers=1, pretokenized=(),
+                      meteor_args=None, chunk_size=1000):
+    """Collect segment-level scores for the given data and write them out to a TSV file.
+    METEOR is computed for all segments first, the other metrics in chunks of segments (by
+    a pool of processes if more workers are requested), writing out each chunk once it's done."""
+    headers = ['src', 'sys_out', 'BLEU', 'sentBLEU', 'NIST', 'METEOR', 'ROUGE_L', 'CIDEr']
+    coco_ref, coco_sys = tokenize_coco(data_ref, data_sys, workers, 'ptb' in pretokenized)
+
+    # METEOR runs its own (Java) processes, on all segments at once
+    meteor = create_meteor(meteor_args)
+    print('computing %s score...' % meteor.method(), file=sys.stderr)
+    _, meteor_scores = meteor.compute_score(dict(enumerate(coco_ref)),
+                                            {inst_no: [sent] for inst_no, sent in enumerate(coco_sys)})
+
+    print('computing BLEU, sentBLEU, NIST, ROUGE_L & CIDEr scores...', file=sys.stderr)
+    scorer = SegLevelScorer(data_ref, data_sys, coco_ref, coco_sys,
+                            create_mteval_corpus('mteval' in pretokenized), workers)
+    with codecs.open(out_fname, 'wb', 'UTF-8') as fh:
+        fh.write('\t'.join(headers) + '\n')
+        for inst_no, (bleu, sent_bleu, nist, rouge, cider) in enumerate(scorer.iter_scores(workers, chunk_size)):
+            scores = [bleu, sent_bleu, nist, meteor_scores[inst_no], rouge, cider]
+            fh.write('\t'.join([data_src[inst_no], data_sys[inst_no]] + ['%.4f' % score for score in scores]) + '\n')
+
+
+def compute_stats(data_ref, data_sys, workers=1, pretokenized=(), meteor_args=None, perl_compat=True):
+    """Compute sufficient statistics of all metrics for the given data, which can be merged
+    with statistics of other parts of the data (see merge_stats.py)."""
+    coco_ref, coco_sys = tokenize_coco(data_ref, data_sys, workers, 'ptb' in pretokenized)
+    print('computing sufficient statistics...', file=sys.stderr)
+    return SufficientStats.compute(data_ref, data_sys, coco_ref, coco_sys, create_meteor(meteor_args),
+                                   create_mteval_corpus('mteval' in pretokenized, perl_compat), perl_compat, workers)
+
+
+def sampled_scores(data_src, data_ref, data_sys, pretokenized=(), perl_compat=True, ci_width=0.05,
+                   time_budget=None, seed=None):
+    """Estimate corpus-level BLEU, NIST, ROUGE-L & CIDEr with confidence intervals from a
+    stratified random sample of the segments (see metrics/sampled.py)."""
+    print('Preparing references for sampled evaluation...', file=sys.stderr)
+    evaluator = SampledEvaluator(data_ref, data_src,
+                                 mteval_corpus=create_mteval_corpus('mteval' in pretokenized, perl_compat),
+                                 perl_compat=perl_compat,
+                                 coco_tokenize=whitespace_normalize if 'ptb' in pretokenized else ptb_tokenize)
+    print('Scoring samples...', file=sys.stderr)
+    scores = evaluator.evaluate(data_sys, ci_width, time_budget, seed=seed)
+    print('Scored %d of %d segments' % (scores['sample_size'], len(evaluator)), file=sys.stderr)
+    return scores
 
 
 if __name__ == '__main__':
@@ -357,11 +513,35 @@ if __name__ == '__main__':
     ap.add_argument('-l', '--sent-level', '--seg-level', '--sentence-level', '--segment-level',
                     type=str, help='Output segment-level scores in a TSV format to the given file?',
                     default=None)
+    ap.add_argument('-S', '--stats-file', type=str, default=None,
+                    help='Write sufficient statistics of all metrics to the given file (JSON, gzipped ' +
+                    'if it ends with .gz) for merging with other parts of the data by merge_stats.py')
+    ap.add_argument('--sampled', action='store_true',
+                    help='Estimate BLEU, NIST, ROUGE-L & CIDEr with 95%% confidence intervals from a random ' +
+                    'sample of segments, stratified by MR size (growing the sample until the intervals ' +
+                    'are narrow enough, see --ci-width & --time-budget)')
+    ap.add_argument('--ci-width', type=float, default=0.05,
+                    help='Maximum confidence interval width with --sampled, relative to the scores (default: 0.05)')
+    ap.add_argument('--time-budget', type=float, default=None,
+                    help='Stop growing the sample with --sampled after the given number of seconds (optional)')
+    ap.add_argument('--seed', type=int, default=None, help='Random seed for --sampled (optional)')
     ap.add_argument('-s', '--src-file', type=str, help='Source file -- if given, system output ' +
                     'should be a TSV with source & output columns, source is checked for integrity',
                     default=None)
     ap.add_argument('-p', '--python', action='store_true',
-                    help='Use Python implementation of MTEval instead of Perl?')
+                    help='Use Python implementation of MTEval with proper NIST for variable numbers of ' +
+                    'references, instead of reproducing the Perl script\'s results')
+    ap.add_argument('--perl', action='store_true',
+                    help='Run the original MTEval Perl script for BLEU & NIST (needs Perl & XML::Twig)')
+    ap.add_argument('-w', '--workers', type=int, default=1,
+                    help='Number of parallel tokenization & segment-level scoring processes ' +
+                    '(useful for very large files)')
+    ap.add_argument('--chunk-size', type=int, default=1000,
+                    help='Number of segments scored at a time by each process with -l (default: 1000)')
+    add_pretokenized_args(ap)
+    ap.add_argument('-C', '--check-sample', type=int, default=100,
+                    help='Number of sentences to check if they look pre-tokenized (0 = no check)')
+    add_meteor_args(ap)
     ap.add_argument('-t', '--table', action='store_true', help='Print out results as a line in a'
                     'TSV table?')
     ap.add_argument('-H', '--header', action='store_true', help='Print TSV table header?')
@@ -372,9 +552,30 @@ if __name__ == '__main__':
     ap.add_argument('sys_file', type=str, help='System output file to evaluate (text file with ' +
                     'one output per line, or a TSV file with sources & corresponding outputs).')
     args = ap.parse_args()
+    pretokenized = get_pretokenized(ap, args)
+    if args.python and args.perl:
+        ap.error('Use either -p/--python or --perl, not both')
+    if args.stats_file is not None and (args.perl or args.sent_level is not None):
+        ap.error('-S/--stats-file cannot be used with --perl or -l')
+    if args.sampled and (args.perl or args.sent_level is not None or args.stats_file is not None):
+        ap.error('--sampled cannot be used with --perl, -l or -S')
+
+    meteor_args = get_meteor_args(ap, args)
 
     data_src, data_ref, data_sys = load_data(args.ref_file, args.sys_file, args.src_file)
+    if pretokenized and args.check_sample:
+        check_pretokenized(data_ref, data_sys, pretokenized, args.check_sample)
     if args.sent_level is not None:
-        sent_level_scores(data_src, data_ref, data_sys, args.sent_level)
+        sent_level_scores(data_src, data_ref, data_sys, args.sent_level, args.workers, pretokenized,
+                          meteor_args, args.chunk_size)
+    elif args.stats_file is not None:
+        stats = compute_stats(data_ref, data_sys, args.workers, pretokenized, meteor_args, not args.python)
+        stats.save(args.stats_file)
+        print_scores(stats.scores(meteor_args), args.table, args.header, args.sys_file)
+    elif args.sampled:
+        print_scores(sampled_scores(data_src, data_ref, data_sys, pretokenized, not args.python, args.ci_width,
+                                    args.time_budget, args.seed),
+                     args.table, args.header, args.sys_file, ['BLEU', 'NIST', 'ROUGE_L', 'CIDEr'])
     else:
-        evaluate(data_src, data_ref, data_sys, args.table, args.header, args.sys_file, args.python)
+        evaluate(data_src, data_ref, data_sys, args.table, args.header, args.sys_file, args.python,
+                 args.workers, pretokenized, meteor_args, args.perl)
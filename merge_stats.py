@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Merge sufficient statistics files written by measure_scores.py -S (e.g. for parts of a large
+data set evaluated on different machines) and print out the global scores, which are the
+same as when evaluating all the data at once. The merged statistics can be saved and merged
+further (merging is associative, so it can be done in a tree), the files just need to be given
+in the order of the data.
+"""
+
+from __future__ import print_function
+from argparse import ArgumentParser
+import sys
+
+from measure_scores import print_scores
+from metrics.suff_stats import SufficientStats, merge_stats
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='E2E Challenge evaluation -- merge sufficient statistics files')
+    ap.add_argument('-o', '--output', type=str, default=None,
+                    help='Write the merged statistics to the given file (JSON, gzipped if it ends with .gz)')
+    ap.add_argument('-n', '--no-scores', action='store_true',
+                    help='Do not compute the scores, just merge the statistics')
+    ap.add_argument('--meteor-mem', type=str, default='2G',
+                    help='Maximum Java heap size for the METEOR process (default: 2G)')
+    ap.add_argument('--meteor-cache', type=str, default=None,
+                    help='Persistent cache file for METEOR scores (optional)')
+    ap.add_argument('-t', '--table', action='store_true', help='Print out results as a line in a TSV table?')
+    ap.add_argument('-H', '--header', action='store_true', help='Print TSV table header?')
+    ap.add_argument('stats_files', type=str, nargs='+',
+                    help='Statistics files to merge, in the order of the data')
+    args = ap.parse_args()
+    if args.no_scores and args.output is None:
+        ap.error('Nothing to do: -n/--no-scores without -o/--output')
+
+    stats = merge_stats([SufficientStats.load(fname) for fname in args.stats_files])
+    print('Merged %d segments from %d files' % (len(stats), len(args.stats_files)), file=sys.stderr)
+    if args.output is not None:
+        stats.save(args.output)
+    if not args.no_scores:
+        print_scores(stats.scores({'mem': args.meteor_mem, 'cache_file': args.meteor_cache}),
+                     args.table, args.header, ','.join(args.stats_files))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shared tokenize-once corpus representation for the n-gram based metrics.
+
+Tokens are interned into integer IDs and n-grams are packed into integer keys, so that BLEU
+(both implementations), NIST and CIDEr can count and match n-grams without building tuples
+of strings. Each distinct sentence is tokenized, encoded and counted only once per corpus,
+regardless of how many scorers use it.
+
+An n-gram key holds the IDs of its tokens, ID_BITS bits each, the first token in the highest
+bits. Token IDs start at 1, so keys of different orders never collide, the (n-1)-gram prefix
+of a key is ``key >> ID_BITS`` and the key of the empty 0-gram is 0.
+
+Each corpus has its own vocabulary unless one is passed to it, so the memory used for encoding
+is freed with the scorer that owns the corpus. N-gram keys are only comparable between corpora
+that share a vocabulary.
+"""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+from builtins import object
+from collections import Counter
+from array import array
+import multiprocessing
+
+ID_BITS = 32
+# the largest token ID that fits into ID_BITS bits
+MAX_TOKEN_ID = (1 << ID_BITS) - 1
+
+# lowercasing of A-Z only (mteval-v13a.pl's tr/[A-Z]/[a-z]/)
+ASCII_LOWERCASE = {code: code + 32 for code in range(ord('A'), ord('Z') + 1)}
+
+
+def whitespace_tokenize(sent):
+    """Default tokenization: split on whitespace."""
+    return sent.split()
+
+
+def ngram_order(key):
+    """Return the order (the 'N') of the given integer n-gram key."""
+    return (key.bit_length() + ID_BITS - 1) // ID_BITS
+
+
+class Vocabulary(object):
+    """Interns tokens into integer IDs, starting from 1 (0 is reserved for the empty n-gram)."""
+
+    def __init__(self):
+        self.token_ids = {}
+        self.tokens = [None]
+
+    def __len__(self):
+        return len(self.tokens) - 1
+
+    def intern(self, token):
+        """Return the ID of the given token, assigning a new one if it hasn't been seen yet."""
+        tok_id = self.token_ids.get(token)
+        if tok_id is None:
+            tok_id = len(self.tokens)
+            if tok_id > MAX_TOKEN_ID:
+                raise ValueError('Vocabulary is full (%d tokens), use a new corpus' % MAX_TOKEN_ID)
+            self.token_ids[token] = tok_id
+            self.tokens.append(token)
+        return tok_id
+
+    def encode(self, tokens):
+        """Convert a list of tokens into an array of token IDs."""
+        return array('l', [self.intern(token) for token in tokens])
+
+    def lookup(self, tokens):
+        """Convert a list of tokens into an array of token IDs without interning new tokens:
+        unseen tokens get temporary IDs above the current vocabulary (the same ID for the same
+        token within the call), so they match no n-gram of already encoded sentences."""
+        token_ids = self.token_ids
+        unseen = {}
+        return array('l', [token_ids.get(token) or unseen.setdefault(token, len(self.tokens) + len(unseen))
+                           for token in tokens])
+
+    def encode_ngram(self, tokens):
+        """Convert a sequence of tokens into an integer n-gram key (the inverse of decode)."""
+        key = 0
+        for token in tokens:
+            key = (key << ID_BITS) | self.intern(token)
+        return key
+
+    def decode(self, key):
+        """Convert an integer n-gram key back into a tuple of tokens."""
+        mask = (1 << ID_BITS) - 1
+        tokens = []
+        while key:
+            tokens.append(self.tokens[key & mask])
+            key >>= ID_BITS
+        return tuple(reversed(tokens))
+
+
+class Sentence(object):
+    """A single encoded sentence: its tokens, token IDs, and lazily computed n-gram keys
+    and counts for each order."""
+
+    __slots__ = ('tokens', 'ids', '_keys', '_counts')
+
+    def __init__(self, tokens, ids):
+        self.tokens = tokens
+        self.ids = ids
+        self._keys = [list(ids)]
+        self._counts = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys(self, n):
+        """Return the integer keys of all n-grams of the given order, in sentence order."""
+        keys = self._keys
+        ids = self.ids
+        while len(keys) < n:
+            order = len(keys)
+            keys.append([(key << ID_BITS) | tok_id for key, tok_id in zip(keys[-1], ids[order:])])
+        return keys[n - 1]
+
+    def counts(self, n):
+        """Return a dictionary (ngram key: count) for all n-grams of the given order.
+        The returned dictionary is cached and must not be modified."""
+        counts = self._counts.get(n)
+        if counts is None:
+            counts = Counter(self.keys(n))
+            self._counts[n] = counts
+        return counts
+
+
+class Corpus(object):
+    """A store of encoded sentences, each distinct sentence is tokenized and encoded just once."""
+
+    def __init__(self, lowercase=False, tokenize=None, vocab=None):
+        """Create the corpus.
+        @param lowercase: lowercase tokens before encoding them (default: no); 'ascii' \
+            lowercases only A-Z, as mteval-v13a.pl does
+        @param tokenize: tokenization function applied to sentences given as strings \
+            (default: split on whitespace); must be picklable for parallel tokenization
+        @param vocab: the vocabulary to use (default: a new one, used by this corpus only)
+        """
+        self.lowercase = lowercase
+        self.tokenize = tokenize if tokenize is not None else whitespace_tokenize
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.sents = {}
+
+    def __len__(self):
+        return len(self.sents)
+
+    def sentence(self, sent):
+        """Return the encoded sentence object for the given sentence.
+        @param sent: the sentence, as a string (to be tokenized) or a list of tokens
+        @return: a Sentence object, shared by all calls with the same sentence
+        """
+        is_str = isinstance(sent, str)
+        cache_key = sent if is_str else tuple(sent)
+        encoded = self.sents.get(cache_key)
+        if encoded is None:
+            encoded = self._add(cache_key, self.tokenize(sent) if is_str else list(sent))
+        return encoded
+
+    def lookup(self, sent):
+        """Return an encoded sentence object like sentence(), but without storing it or adding
+        its unseen tokens to the vocabulary (see Vocabulary.lookup), e.g. to score any number of
+        outputs against a fixed set of references without the memory use growing.
+        @param sent: the sentence, as a string (to be tokenized) or a list of tokens
+        @return: a new Sentence object
+        """
+        tokens = self.tokenize(sent) if isinstance(sent, str) else list(sent)
+        return Sentence(tokens, self.vocab.lookup(self._normalize(tokens)))
+
+    def encode_all(self, sents, workers=1, chunk_size=1000):
+        """Encode the given sentences in advance, tokenizing the strings in parallel.
+        Results are the same as when encoding them one-by-one via sentence().
+        @param sents: an iterable of sentences (strings or lists of tokens)
+        @param workers: number of tokenization processes (default: 1 = tokenize in this process)
+        @param chunk_size: number of sentences sent to a tokenization process at a time
+        """
+        # distinct strings not tokenized yet, in the order of their first occurrence
+        todo = [sent for sent in dict.fromkeys(sent for sent in sents if isinstance(sent, str))
+                if sent not in self.sents]
+        if workers > 1 and len(todo) > chunk_size:
+            pool = multiprocessing.Pool(workers)
+            try:
+                tokenized = pool.map(self.tokenize, todo, chunksize=chunk_size)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            tokenized = [self.tokenize(sent) for sent in todo]
+        # encoding happens here, in order, so the token IDs do not depend on the worker count
+        for sent, tokens in zip(todo, tokenized):
+            self._add(sent, tokens)
+
+    def _normalize(self, tokens):
+        if self.lowercase == 'ascii':
+            return [tok.translate(ASCII_LOWERCASE) for tok in tokens]
+        return [tok.lower() for tok in tokens] if self.lowercase else tokens
+
+    def _add(self, cache_key, tokens):
+        encoded = Sentence(tokens, self.vocab.encode(self._normalize(tokens)))
+        self.sents[cache_key] = encoded
+        return encoded
+
+    def clear(self):
+        """Forget all encoded sentences (the vocabulary is kept)."""
+        self.sents = {}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Leave-one-out scoring of the human references, as an upper bound for system scores: each
+reference is scored against the remaining references of its segment (segments with a single
+reference are skipped). The corpus-level scores are the same as evaluating all the held-out
+references as one system output, with one segment per reference.
+
+All references are tokenized and their n-grams counted only once, and the statistics of the
+remaining references are derived from those of all references of the segment instead of being
+collected again: BLEU & NIST clipping counts from the two highest counts of each n-gram, NIST
+reference n-gram counts and CIDEr document frequencies from each segment's totals. ROUGE-L
+computes the LCS of each pair of references once and CIDEr reuses the references' vectors, and
+METEOR scores all held-out references in a single batch. This takes about as long as a single
+evaluation.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from builtins import range
+
+import numpy as np
+
+from metrics.corpus import Corpus
+from metrics.pymteval import BLEUNISTScore, BLEUScore, References
+from metrics.significance import SegmentStats
+from pycocoevalcap.cider.cider_scorer import CiderReferences, DocumentFrequency, cook_refs
+from pycocoevalcap.rouge.rouge import Rouge
+
+
+def held_out_stats(data_ref, coco_ref, meteor, mteval_corpus=None, perl_compat=True, cider_sigma=6.0):
+    """Compute per-segment statistics (see metrics.significance.SegmentStats) of all references
+    held out in turn, each scored against the remaining references of its segment.
+    @param data_ref: references for BLEU & NIST -- list of lists of strings, one list per segment
+    @param coco_ref: PTB-tokenized references for METEOR, ROUGE-L & CIDEr (same shape as data_ref)
+    @param meteor: METEOR scorer (Meteor or MeteorApprox)
+    @param mteval_corpus: corpus for BLEU & NIST (default: the Py-MTEval scorers' own)
+    @param perl_compat: Perl-compatible BLEU & NIST (default: yes)
+    @param cider_sigma: standard deviation of the CIDEr-D length penalty (default: 6.0)
+    @return: a SegmentStats object with one row per held-out reference, and a list of \
+        corresponding (segment number, reference number) pairs
+    """
+    groups = [inst_no for inst_no, refs in enumerate(data_ref) if len(refs) > 1]
+    held_out = [(inst_no, ref_no) for inst_no in groups for ref_no in range(len(data_ref[inst_no]))]
+
+    # BLEU & NIST: NIST reference counts are the totals of each segment's references, multiplied
+    # by the number of remaining references; clipped hits come from each segment's top counts
+    bleu_nist = BLEUNISTScore(corpus=mteval_corpus, perl_compat=perl_compat)
+    nist = bleu_nist.nist
+    ref_sents = {inst_no: bleu_nist.prepare_refs(data_ref[inst_no]) for inst_no in groups}
+    for inst_no in groups:
+        nist.append_held_out_refs(ref_sents[inst_no])
+    seg_bleu = BLEUScore(bleu_nist.bleu.max_ngram, corpus=bleu_nist.corpus, perl_compat=perl_compat)
+    rows = []
+    for inst_no, ref_no in held_out:
+        refs = ref_sents[inst_no]
+        others = References(refs.sents[:ref_no] + refs.sents[ref_no + 1:])
+        hit_ngrams = [refs.held_out_hits(ref_no, n + 1) for n in range(bleu_nist.max_ngram)]
+        rows.append(SegmentStats.mteval_stats(seg_bleu, nist, refs.sents[ref_no], others, hit_ngrams))
+
+    # METEOR: all held-out references in one batch
+    gts = {seg_no: coco_ref[inst_no][:ref_no] + coco_ref[inst_no][ref_no + 1:]
+           for seg_no, (inst_no, ref_no) in enumerate(held_out)}
+    res = {seg_no: [coco_ref[inst_no][ref_no]] for seg_no, (inst_no, ref_no) in enumerate(held_out)}
+    meteor_stats = np.array(meteor.compute_stats(gts, res), dtype=float).reshape((len(rows), -1))
+
+    # ROUGE-L & CIDEr: pairwise comparisons of each segment's references
+    rouge = Rouge()
+    rouge_scores = [score for inst_no in groups for score in rouge.held_out_scores(coco_ref[inst_no])]
+    corpus = Corpus()
+    crefs = [cook_refs(coco_ref[inst_no], corpus=corpus) for inst_no in groups]
+    document_frequency = DocumentFrequency()
+    for refs in crefs:
+        document_frequency.add_held_out(refs)
+    cider_refs = CiderReferences(crefs, document_frequency=document_frequency)
+    cider_scores = [cider_refs.held_out_score(group_no, ref_no, cider_sigma)
+                    for group_no, refs in enumerate(crefs) for ref_no in range(len(refs))]
+
+    values = np.hstack([np.array(rows, dtype=float).reshape((len(rows), -1)), meteor_stats,
+                        np.array(rouge_scores, dtype=float)[:, None], np.array(cider_scores, dtype=float)[:, None]])
+    stats = SegmentStats(values, meteor_stats.shape[1], bleu_nist.bleu.max_ngram, nist.max_ngram, perl_compat)
+    return stats, held_out
+
+
+def human_scores(data_ref, coco_ref, meteor, mteval_corpus=None, perl_compat=True, cider_sigma=6.0):
+    """Compute corpus-level leave-one-out scores of the references (see held_out_stats for
+    parameters).
+    @return: dictionary metric name -> score
+    """
+    stats, _ = held_out_stats(data_ref, coco_ref, meteor, mteval_corpus, perl_compat, cider_sigma)
+    scores = stats.scores(stats.values.sum(axis=0)[None, :], meteor)
+    return {metric: float(metric_scores[0]) for metric, metric_scores in scores.items()}
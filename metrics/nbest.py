@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+N-best list reranking & minimum Bayes risk (MBR) scoring.
+
+References are tokenized, encoded and prepared once, then whole blocks of candidates
+(segments x k) are scored with sentence-level BLEU, NIST, ROUGE-L and CIDEr, giving one score
+matrix per metric. N-grams of each candidate are counted once and matched against the
+references, collecting hit & length arrays for the whole block (see SegmentScores), from which
+the BLEU & NIST matrices are computed with array operations. In MBR mode, candidates are scored
+against the other candidates for the same segment instead of references, each candidate serving
+both as candidate and as reference; the LCS for ROUGE-L is computed once for each pair and CIDEr
+uses the candidates' precomputed tf-idf vectors.
+
+NIST is undefined (NaN) for candidates shorter than 5 tokens and for empty references.
+BLEU and NIST use MT-Eval tokenization (same as measure_scores.py -p). ROUGE-L and CIDEr split
+on whitespace, so their inputs should be PTB-tokenized and lowercased as in COCOEvalCap.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from builtins import zip
+from builtins import range
+from builtins import object
+
+import numpy as np
+
+from metrics.corpus import Corpus
+from metrics.pymteval import SegmentScores
+from pycocoevalcap.rouge.rouge import Rouge
+from pycocoevalcap.cider.cider_scorer import CiderReferences, cook_refs
+
+METRICS = ['BLEU', 'NIST', 'ROUGE_L', 'CIDEr']
+
+
+class NBestScorer(object):
+    """Batch scoring of k-best candidate lists against prepared references, or against
+    each other (MBR)."""
+
+    def __init__(self, data_ref=None, metrics=METRICS, bleu_smoothing=1.0, cider_sigma=6.0):
+        """Create the scorer.
+        @param data_ref: references -- list of lists of reference strings, one list per segment \
+            (optional, needed for score(), not for mbr())
+        @param metrics: list of metrics to compute (default: BLEU, NIST, ROUGE_L, CIDEr)
+        @param bleu_smoothing: smoothing constant for sentence-level BLEU (default: 1.0, as sentBLEU)
+        @param cider_sigma: standard deviation of the CIDEr-D length penalty (default: 6.0)
+        """
+        for metric in metrics:
+            if metric not in METRICS:
+                raise ValueError('Unknown metric: %s' % metric)
+        self.metrics = list(metrics)
+        self.mteval = SegmentScores()
+        self.bleu_smoothing = bleu_smoothing
+        self.rouge = Rouge()
+        self.cider_corpus = Corpus()
+        self.cider_sigma = cider_sigma
+        self.data_ref = None
+        if data_ref is not None:
+            self.set_references(data_ref)
+
+    def set_references(self, data_ref):
+        """Tokenize, encode & prepare the references for scoring.
+        @param data_ref: list of lists of reference strings, one list per segment
+        """
+        self.data_ref = data_ref
+        self.mteval_refs = [self.mteval.prepare_refs(refs) for refs in data_ref]
+        self.cider_refs = None
+        if 'CIDEr' in self.metrics:
+            # document frequencies are taken from the references of all segments
+            self.cider_refs = CiderReferences([cook_refs(refs, corpus=self.cider_corpus) for refs in data_ref],
+                                              corpus=self.cider_corpus)
+
+    def _mteval_scores(self, scores, pairs, shape):
+        """Compute sentence-level BLEU & NIST (if requested) for a block of candidates at once.
+        @param scores: dictionary metric -> score array, BLEU & NIST arrays are replaced
+        @param pairs: iterable of (candidate, References) pairs, in the order of the block
+        @param shape: shape of the resulting score arrays
+        """
+        if 'BLEU' not in scores and 'NIST' not in scores:
+            return
+        self.mteval.reset()
+        for cand, refs in pairs:
+            self.mteval.append(cand, refs)
+        if 'BLEU' in scores:
+            scores['BLEU'] = self.mteval.bleu(self.bleu_smoothing).reshape(shape)
+        if 'NIST' in scores:
+            scores['NIST'] = self.mteval.nist().reshape(shape)
+        self.mteval.reset()
+
+    def _check_block(self, candidates, num_segs=None):
+        if num_segs is not None and len(candidates) != num_segs:
+            raise ValueError('Expected candidates for %d segments, got %d' % (num_segs, len(candidates)))
+        k = len(candidates[0]) if candidates else 0
+        if any(len(cands) != k for cands in candidates):
+            raise ValueError('All segments must have the same number of candidates')
+        return k
+
+    def score(self, candidates):
+        """Score k candidates for each segment against the prepared references.
+        @param candidates: list (segments) of lists (k candidates) of strings
+        @return: dictionary metric -> numpy array of scores (segments x k)
+        """
+        if self.data_ref is None:
+            raise ValueError('No references to score against, use set_references() first')
+        k = self._check_block(candidates, len(self.data_ref))
+        scores = {metric: np.zeros((len(candidates), k)) for metric in self.metrics}
+
+        self._mteval_scores(scores, ((cand, refs) for cands, refs in zip(candidates, self.mteval_refs)
+                                     for cand in cands), (len(candidates), k))
+        for seg_no, (cands, refs) in enumerate(zip(candidates, self.data_ref)):
+            for cand_no, cand in enumerate(cands):
+                if 'ROUGE_L' in scores:
+                    scores['ROUGE_L'][seg_no, cand_no] = self.rouge.calc_score([cand], refs)
+                if 'CIDEr' in scores:
+                    scores['CIDEr'][seg_no, cand_no] = self.cider_refs.score(self.cider_refs.cook(cand), seg_no,
+                                                                             self.cider_sigma)
+        return scores
+
+    def mbr(self, candidates):
+        """Minimum Bayes risk scoring: score each candidate against each other candidate for the
+        same segment (as a single reference) and average the scores. References are not used.
+        For CIDEr, document frequencies are taken from the candidate lists of all segments.
+        @param candidates: list (segments) of lists (k >= 2 candidates) of strings
+        @return: dictionary metric -> numpy array of expected scores (segments x k)
+        """
+        k = self._check_block(candidates)
+        if candidates and k < 2:
+            raise ValueError('MBR needs at least 2 candidates per segment')
+        scores = {metric: np.zeros((len(candidates), k)) for metric in self.metrics}
+        if not candidates:
+            return scores
+        cider_refs = None
+        if 'CIDEr' in scores:
+            cider_refs = CiderReferences([cook_refs(cands, corpus=self.cider_corpus) for cands in candidates])
+
+        # each candidate is encoded once (its n-grams counted once), serving both as candidate and as reference
+        mteval_refs = [[self.mteval.prepare_refs([cand]) for cand in cands] for cands in candidates]
+        self._mteval_scores(scores, ((refs[cand_no].sents[0], refs[other_no])
+                                     for refs in mteval_refs for cand_no in range(k)
+                                     for other_no in range(k) if other_no != cand_no),
+                            (len(candidates), k, max(k - 1, 0)))
+        for metric in ['BLEU', 'NIST']:
+            if metric in scores:
+                scores[metric] = scores[metric].mean(axis=2)
+        for seg_no, cands in enumerate(candidates):
+            if 'ROUGE_L' in scores:
+                scores['ROUGE_L'][seg_no] = np.mean(self.rouge.pair_scores(cands), axis=1)
+            if 'CIDEr' in scores:
+                scores['CIDEr'][seg_no] = np.mean(cider_refs.pair_scores(seg_no, self.cider_sigma), axis=1)
+        return scores
@@ -6,8 +6,17 @@ BLEU & NIST measurements -- should be compatible with mteval-v13a.pl (basic toke
 Also provides BLEU +1 smoothing (if set to work like that).
 
 TODO: International tokenization
-TODO: NIST with variable number of references is not the same as the edited mteval-v13a.pl,
-but this should be the proper way to compute it. Should be fixed there.
+
+NIST with variable number of references is not the same as the edited mteval-v13a.pl by
+default, but this should be the proper way to compute it. With perl_compat=True, BLEU & NIST
+follow the Perl script's arithmetic instead (see check_mteval_parity.py):
+- the average reference length for the NIST length penalty is the total reference length
+  divided by the average number of (non-empty) references per segment,
+- n-gram counts of outputs shorter than N are 0 instead of negative,
+- BLEU uses the script's smoothing (1/2^k for the k-th zero n-gram match count),
+- tokens are lowercased in A-Z only, empty sentences have no tokens,
+- NIST information values are computed the same way, including the script's quirk of taking
+  the total reference length as the count of the 1-gram "0" (it's false in Perl).
 """
 
 from __future__ import unicode_literals
@@ -20,18 +29,113 @@ from collections import defaultdict
 import math
 import re
 
+import numpy as np
+
+from metrics.corpus import Corpus, Sentence, ID_BITS, ngram_order
+
+
+class References(object):
+    """Encoded reference sentences for a single segment, with their n-gram counts merged
+    (computed on demand and cached), so that any number of candidates can be matched against
+    them without recounting."""
+
+    def __init__(self, sents):
+        """@param sents: list of encoded reference sentences (metrics.corpus.Sentence)"""
+        self.sents = sents
+        self._max_counts = {}
+        self._total_counts = {}
+        self._top_counts = {}
+
+    def __len__(self):
+        return len(self.sents)
+
+    def __iter__(self):
+        return iter(self.sents)
+
+    def max_counts(self, n):
+        """Return a dictionary (ngram key: count) with maximum counts of n-grams attested
+        in any of the sentences. The dictionary is cached and must not be modified."""
+        counts = self._max_counts.get(n)
+        if counts is None:
+            if len(self.sents) == 1:
+                counts = self.sents[0].counts(n)
+            else:
+                counts = {}
+                for sent in self.sents:
+                    for ngram, cnt in sent.counts(n).items():
+                        if cnt > counts.get(ngram, 0):
+                            counts[ngram] = cnt
+            self._max_counts[n] = counts
+        return counts
+
+    def total_counts(self, n):
+        """Return a dictionary (ngram key: count) with total counts of n-grams in all the
+        sentences. The dictionary is cached and must not be modified."""
+        counts = self._total_counts.get(n)
+        if counts is None:
+            counts = defaultdict(int)
+            for sent in self.sents:
+                for ngram, cnt in sent.counts(n).items():
+                    counts[ngram] += cnt
+            counts = dict(counts)
+            self._total_counts[n] = counts
+        return counts
+
+    def held_out_hits(self, index, n):
+        """Return n-gram matches of one of the sentences against the others (leave-one-out),
+        clipped by the others' maximum counts. These are derived from the two highest counts of
+        each n-gram in all the sentences (computed once and cached), so holding out each of the
+        sentences in turn doesn't need the others' counts merged again.
+        @param index: position of the held-out sentence
+        @param n: n-gram 'N' (1 for unigrams, 2 for bigrams etc.)
+        @return: a dictionary (ngram key: number of hits), only n-grams with non-zero hits
+        """
+        top_counts = self._top_counts.get(n)
+        if top_counts is None:
+            top_counts = {}
+            for sent in self.sents:
+                for ngram, cnt in sent.counts(n).items():
+                    first, second = top_counts.get(ngram, (0, 0))
+                    if cnt > first:
+                        top_counts[ngram] = (cnt, first)
+                    elif cnt > second:
+                        top_counts[ngram] = (first, cnt)
+            self._top_counts[n] = top_counts
+        hit_ngrams = {}
+        for ngram, cnt in self.sents[index].counts(n).items():
+            first, second = top_counts[ngram]
+            # if the held-out sentence has the highest count, the others' maximum is the second one
+            hits = min(cnt, second if cnt == first else first)
+            if hits:
+                hit_ngrams[ngram] = hits
+        return hit_ngrams
+
 
 class NGramScore(object):
     """Base class for BLEU & NIST, providing tokenization and some basic n-gram matching
     functions."""
 
-    def __init__(self, max_ngram, case_sensitive):
+    def __init__(self, max_ngram, case_sensitive, corpus=None, perl_compat=False):
         """Create the scoring object.
         @param max_ngram: the n-gram level to compute the score for
         @param case_sensitive: use case-sensitive matching?
+        @param corpus: encoded sentence store to use, may be shared with other scorers \
+            (default: create a new one)
+        @param perl_compat: reproduce mteval-v13a-sig.pl's results (see module docstring)?
         """
         self.max_ngram = max_ngram
         self.case_sensitive = case_sensitive
+        self.perl_compat = perl_compat
+        if corpus is None:
+            if perl_compat:
+                corpus = Corpus(lowercase=False if case_sensitive else 'ascii', tokenize=self.tokenize_mteval)
+            else:
+                corpus = Corpus(lowercase=not case_sensitive, tokenize=self.tokenize)
+        elif bool(corpus.lowercase) == case_sensitive:
+            raise ValueError('Corpus lowercasing does not match the case sensitivity setting')
+        elif perl_compat and corpus.lowercase is True:
+            raise ValueError('Perl-compatible scoring needs a corpus lowercasing A-Z only')
+        self.corpus = corpus
 
     def reset(self):
         """Reset the object, zero all counters."""
@@ -49,16 +153,16 @@ class NGramScore(object):
         raise NotImplementedError()
 
     def ngrams(self, n, sent):
-        """Given a sentence, return n-grams of nodes for the given N. Lowercases
-        everything if the measure should not be case-sensitive.
+        """Given a sentence, return its n-grams for the given N, as integer n-gram keys
+        (see metrics.corpus). Lowercases everything if the measure should not be case-sensitive.
 
         @param n: n-gram 'N' (1 for unigrams, 2 for bigrams etc.)
-        @param sent: the sent in question
-        @return: n-grams of nodes, as tuples of tuples (t-lemma & formeme)
+        @param sent: the sent in question (string/list of tokens/encoded sentence)
+        @return: list of n-gram keys
         """
-        if not self.case_sensitive:
-            return list(zip(*[[tok.lower() for tok in sent[i:]] for i in range(n)]))
-        return list(zip(*[sent[i:] for i in range(n)]))
+        if not isinstance(sent, Sentence):
+            sent = self.corpus.sentence(sent)
+        return sent.keys(n)
 
     def check_tokenized(self, pred_sent, ref_sents):
         """Tokenize the predicted sentence and reference sentences, if they are not tokenized.
@@ -72,24 +176,62 @@ class NGramScore(object):
                      for ref_sent in ref_sents]
         return pred_sent, ref_sents
 
+    def encode(self, pred_sent, ref_sents):
+        """Tokenize (if needed) and encode the predicted sentence and reference sentences,
+        reusing sentences already encoded in the corpus.
+        @param pred_sent: system output / predicted sentence
+        @param ref_sent: a list of corresponding reference sentences, or References
+        @return: a tuple of (pred_sent, ref_sents) where pred_sent is a metrics.corpus.Sentence \
+            and ref_sents is a References object
+        """
+        if not isinstance(pred_sent, Sentence):
+            pred_sent = self.corpus.sentence(pred_sent)
+        return pred_sent, self.prepare_refs(ref_sents)
+
+    def prepare_refs(self, ref_sents):
+        """Tokenize (if needed) and encode reference sentences for a single segment, so they can
+        be used for any number of calls to append().
+        @param ref_sents: a list of reference sentences (strings/lists of tokens/encoded sentences)
+        @return: a References object
+        """
+        if isinstance(ref_sents, References):
+            return ref_sents
+        return References([ref_sent if isinstance(ref_sent, Sentence) else self.corpus.sentence(ref_sent)
+                           for ref_sent in ref_sents])
+
     def get_ngram_counts(self, n, sents):
         """Returns a dictionary with counts of all n-grams in the given sentences.
         @param n: the "n" in n-grams (how long the n-grams should be)
-        @param sents: list of sentences for n-gram counting
-        @return: a dictionary (ngram: count) listing counts of n-grams attested in any of the sentences
+        @param sents: list of encoded sentences for n-gram counting
+        @return: a dictionary (ngram key: count) listing maximum counts of n-grams attested \
+            in any of the sentences
         """
+        if len(sents) == 1:
+            return sents[0].counts(n)
         merged_ngrams = {}
-
         for sent in sents:
-            ngrams = defaultdict(int)
-
-            for ngram in self.ngrams(n, sent):
-                ngrams[ngram] += 1
-            for ngram, cnt in ngrams.items():
-                merged_ngrams[ngram] = max((merged_ngrams.get(ngram, 0), cnt))
+            for ngram, cnt in sent.counts(n).items():
+                if cnt > merged_ngrams.get(ngram, 0):
+                    merged_ngrams[ngram] = cnt
         return merged_ngrams
 
-    def tokenize(self, sent):
+    def clipped_hits(self, n, pred_sent, ref_sents):
+        """Return n-gram matches of the predicted sentence, clipped by maximum reference counts.
+        @param n: n-gram 'N' (1 for unigrams, 2 for bigrams etc.)
+        @param pred_sent: the system output sentence (encoded)
+        @param ref_sents: the corresponding reference sentences (References)
+        @return: a dictionary (ngram key: number of hits), only n-grams with non-zero hits
+        """
+        merged_ref_ngrams = ref_sents.max_counts(n)
+        hit_ngrams = {}
+        for ngram, cnt in pred_sent.counts(n).items():
+            hits = min(cnt, merged_ref_ngrams.get(ngram, 0))
+            if hits:
+                hit_ngrams[ngram] = hits
+        return hit_ngrams
+
+    @staticmethod
+    def tokenize(sent):
         """This tries to mimic multi-bleu-detok from Moses, and by extension mteval-v13b.
         Code taken directly from there and attempted rewrite into Python."""
         # language-independent part:
@@ -112,6 +254,21 @@ class NGramScore(object):
 
         return sent.split(' ')
 
+    @classmethod
+    def tokenize_mteval(cls, sent):
+        """Tokenize like mteval-v13a.pl does, i.e. as tokenize(), but with no empty token
+        for empty sentences."""
+        return [tok for tok in cls.tokenize(sent) if tok]
+
+    @classmethod
+    def is_tokenized(cls, sent):
+        """Check if the given sentence already looks tokenized the way this class would do it,
+        i.e., its tokenization wouldn't change anything apart from whitespace.
+        @param sent: the sentence in question (a string)
+        @return: True if the sentence looks tokenized, False otherwise
+        """
+        return cls.tokenize(sent) == sent.split()
+
 
 class BLEUScore(NGramScore):
     """An accumulator object capable of computing BLEU score using multiple references.
@@ -124,13 +281,18 @@ class BLEUScore(NGramScore):
     TINY = 1e-15
     SMALL = 1e-9
 
-    def __init__(self, max_ngram=4, case_sensitive=False, smoothing=0.0):
+    def __init__(self, max_ngram=4, case_sensitive=False, smoothing=0.0, corpus=None, perl_compat=False):
         """Create the scoring object.
         @param max_ngram: the n-gram level to compute the score for (default: 4)
         @param case_sensitive: use case-sensitive matching (default: no)
         @param smoothing: constant to add for smoothing (defaults to 0.0, sentBLEU uses 1.0)
+        @param corpus: encoded sentence store, may be shared with other scorers (default: new one)
+        @param perl_compat: reproduce mteval-v13a-sig.pl's results, including its own smoothing \
+            (default: no; cannot be combined with the smoothing constant)
         """
-        super(BLEUScore, self).__init__(max_ngram, case_sensitive)
+        if perl_compat and smoothing:
+            raise ValueError('Smoothing constant cannot be used in Perl-compatible mode')
+        super(BLEUScore, self).__init__(max_ngram, case_sensitive, corpus, perl_compat)
         self.smoothing = smoothing
         self.reset()
 
@@ -144,20 +306,49 @@ class BLEUScore(NGramScore):
         """Append a sentence for measurements, increase counters.
 
         @param pred_sent: the system output sentence (string/list of tokens)
-        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens)
+        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens, \
+            or References returned by prepare_refs)
         """
-        pred_sent, ref_sents = self.check_tokenized(pred_sent, ref_sents)
+        pred_sent, ref_sents = self.encode(pred_sent, ref_sents)
 
         # compute n-gram matches
+        self.append_hits(pred_sent, ref_sents,
+                         [self.compute_hits(i + 1, pred_sent, ref_sents) for i in range(self.max_ngram)])
+
+    def append_hits(self, pred_sent, ref_sents, hits):
+        """Increase counters with already computed n-gram matches for a sentence.
+
+        @param pred_sent: the system output sentence (encoded)
+        @param ref_sents: the corresponding reference sentences (References)
+        @param hits: numbers of clipped n-gram hits for n = 1 .. max_ngram (or dictionaries \
+            of hits per n-gram, as returned by clipped_hits)
+        """
         for i in range(self.max_ngram):
-            self.hits[i] += self.compute_hits(i + 1, pred_sent, ref_sents)
-            self.cand_lens[i] += len(pred_sent) - i
+            self.hits[i] += hits[i] if isinstance(hits[i], int) else sum(hits[i].values())
+            self.cand_lens[i] += max(len(pred_sent) - i, 0) if self.perl_compat else len(pred_sent) - i
 
+        if self.perl_compat:
+            self.ref_len += self.perl_closest_ref_len(len(pred_sent), ref_sents)
+            return
         # take the reference that is closest in length to the candidate
         # (if there are two of the same distance, take the shorter one)
         closest_ref = min(ref_sents, key=lambda ref_sent: (abs(len(ref_sent) - len(pred_sent)), len(ref_sent)))
         self.ref_len += len(closest_ref)
 
+    @staticmethod
+    def perl_closest_ref_len(pred_len, ref_sents):
+        """Return the closest reference length as mteval-v13a.pl computes it: starting from the
+        first reference, empty references are skipped, ties go to the shorter reference.
+        @param pred_len: length of the system output sentence
+        @param ref_sents: the corresponding reference sentences (encoded)
+        """
+        ref_lens = [len(ref_sent) for ref_sent in ref_sents]
+        closest = ref_lens[0]
+        for ref_len in ref_lens[1:]:
+            if ref_len and (abs(pred_len - ref_len), ref_len) < (abs(pred_len - closest), closest):
+                closest = ref_len
+        return closest
+
     def score(self):
         """Return the current BLEU score, according to the accumulated counts."""
         return self.bleu()
@@ -166,11 +357,11 @@ class BLEUScore(NGramScore):
         """Compute clipped n-gram hits for the given sentences and the given N
 
         @param n: n-gram 'N' (1 for unigrams, 2 for bigrams etc.)
-        @param pred_sent: the system output sentence (tree/tokens)
-        @param ref_sents: the corresponding reference sentences (list/tuple of trees/tokens)
+        @param pred_sent: the system output sentence (encoded)
+        @param ref_sents: the corresponding reference sentences (References or list of encoded sentences)
         """
-        merged_ref_ngrams = self.get_ngram_counts(n, ref_sents)
-        pred_ngrams = self.get_ngram_counts(n, [pred_sent])
+        merged_ref_ngrams = self.prepare_refs(ref_sents).max_counts(n)
+        pred_ngrams = pred_sent.counts(n)
 
         hits = 0
         for ngram, cnt in pred_ngrams.items():
@@ -180,6 +371,8 @@ class BLEUScore(NGramScore):
 
     def bleu(self):
         """Return the current BLEU score, according to the accumulated counts."""
+        if self.perl_compat:
+            return self.perl_bleu()
         # brevity penalty (smoothed a bit: if candidate length is 0, we change it to 1e-5
         # to avoid division by zero)
         bp = 1.0
@@ -202,68 +395,170 @@ class BLEUScore(NGramScore):
 
         return math.exp((1.0 / self.max_ngram) * prec_log_sum)
 
+    def perl_bleu(self):
+        """Return the current BLEU score computed as in mteval-v13a.pl's bleu_score (i.e., with
+        its default smoothing), according to the accumulated counts."""
+        bp = 0.0
+        if self.cand_lens[0] > 0:
+            bp = math.exp(min(0, 1 - self.ref_len / self.cand_lens[0]))
+        smooth = 1
+        prec_log_sum = 0.0
+        for n_hits, n_len in zip(self.hits, self.cand_lens):
+            if n_len == 0:
+                continue
+            elif n_hits == 0:
+                smooth *= 2
+                prec_log_sum += math.log(1 / (smooth * n_len))
+            else:
+                prec_log_sum += math.log(n_hits / n_len)
+        return math.exp(prec_log_sum / self.max_ngram) * bp
+
 
 class NISTScore(NGramScore):
     """An accumulator object capable of computing NIST score using multiple references."""
 
     # NIST beta parameter setting (copied from mteval-13a.pl)
     BETA = old_div(- math.log(0.5), math.log(1.5) ** 2)
+    # the same, rounded as in mteval-13a.pl
+    PERL_BETA = -math.log(0.5) / math.log(1.5) / math.log(1.5)
 
-    def __init__(self, max_ngram=5, case_sensitive=False):
+    def __init__(self, max_ngram=5, case_sensitive=False, corpus=None, perl_compat=False):
         """Create the scoring object.
         @param max_ngram: the n-gram level to compute the score for (default: 5)
         @param case_sensitive: use case-sensitive matching (default: no)
+        @param corpus: encoded sentence store, may be shared with other scorers (default: new one)
+        @param perl_compat: reproduce mteval-v13a-sig.pl's results (default: no)
         """
-        super(NISTScore, self).__init__(max_ngram, case_sensitive)
+        super(NISTScore, self).__init__(max_ngram, case_sensitive, corpus, perl_compat)
         self.reset()
 
     def reset(self):
         """Reset the object, zero all counters."""
         self.ref_ngrams = [defaultdict(int) for _ in range(self.max_ngram + 1)]  # has 0-grams
-        # these two don't have 0-grams
+        # these two don't have 0-grams: hits per n-gram for each segment & total output lengths for each N
         self.hit_ngrams = [[] for _ in range(self.max_ngram)]
-        self.cand_lens = [[] for _ in range(self.max_ngram)]
+        self.cand_lens = [0] * self.max_ngram
         self.avg_ref_len = 0.0
+        # numbers of segments & non-empty references (for the Perl-compatible length penalty)
+        self.num_segs = 0
+        self.num_refs = 0
+        # cached information values & n-grams whose reference counts changed since last used
+        self._info = {}
+        self._changed = set()
 
     def append(self, pred_sent, ref_sents):
         """Append a sentence for measurements, increase counters.
 
         @param pred_sent: the system output sentence (string/list of tokens)
-        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens)
+        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens, \
+            or References returned by prepare_refs)
+        """
+        pred_sent, ref_sents = self.encode(pred_sent, ref_sents)
+        self.append_hits(pred_sent, ref_sents,
+                         [self.clipped_hits(n + 1, pred_sent, ref_sents) for n in range(self.max_ngram)])
+
+    def append_hits(self, pred_sent, ref_sents, hit_ngrams):
+        """Increase counters with already computed n-gram matches for a sentence.
+
+        @param pred_sent: the system output sentence (encoded)
+        @param ref_sents: the corresponding reference sentences (References)
+        @param hit_ngrams: dictionaries of clipped hits per n-gram for n = 1 .. max_ngram \
+            (as returned by clipped_hits)
         """
-        pred_sent, ref_sents = self.check_tokenized(pred_sent, ref_sents)
         # collect ngram matches
         for n in range(self.max_ngram):
-            self.cand_lens[n].append(len(pred_sent) - n)  # keep track of output length
-            merged_ref_ngrams = self.get_ngram_counts(n + 1, ref_sents)
-            pred_ngrams = self.get_ngram_counts(n + 1, [pred_sent])
-            # collect ngram matches
-            hit_ngrams = {}
-            for ngram in pred_ngrams:
-                hits = min(pred_ngrams[ngram], merged_ref_ngrams.get(ngram, 0))
-                if hits:
-                    hit_ngrams[ngram] = hits
-            self.hit_ngrams[n].append(hit_ngrams)
+            # keep track of output length
+            self.cand_lens[n] += max(len(pred_sent) - n, 0) if self.perl_compat else len(pred_sent) - n
+            self.hit_ngrams[n].append(hit_ngrams[n])
+        self.append_refs(ref_sents)
+
+    def append_refs(self, ref_sents):
+        """Increase reference counters (n-gram counts for information values, lengths) with
+        the references of a segment, e.g. to get information values from more references than
+        those of the scored outputs.
+
+        @param ref_sents: the reference sentences of the segment (References)
+        """
+        for n in range(self.max_ngram):
             # collect total reference ngram counts
-            for ref_sent in ref_sents:
-                for ngram in self.ngrams(n + 1, ref_sent):
-                    self.ref_ngrams[n + 1][ngram] += 1
+            ref_ngrams = self.ref_ngrams[n + 1]
+            ref_counts = ref_sents.total_counts(n + 1)
+            for ngram, cnt in ref_counts.items():
+                ref_ngrams[ngram] += cnt
+            self._changed.update(ref_counts)
         # ref_ngrams: use 0-grams for information value as well
         ref_len_sum = sum(len(ref_sent) for ref_sent in ref_sents)
-        self.ref_ngrams[0][()] += ref_len_sum
+        self.ref_ngrams[0][0] += ref_len_sum
+        self._changed.add(0)
         # collect average reference length
         self.avg_ref_len += ref_len_sum / float(len(ref_sents))
+        self.num_segs += 1
+        self.num_refs += sum(1 for ref_sent in ref_sents if len(ref_sent))
+
+    def append_held_out_refs(self, ref_sents):
+        """Increase reference counters as if each reference of a segment was held out in turn,
+        i.e. for len(ref_sents) segments with the remaining references (as in leave-one-out
+        scoring of the references): the n-gram counts are the segment's total counts times the
+        number of remaining references.
+
+        @param ref_sents: the reference sentences of the segment (References, at least 2)
+        """
+        num_others = len(ref_sents) - 1
+        for n in range(self.max_ngram):
+            ref_ngrams = self.ref_ngrams[n + 1]
+            ref_counts = ref_sents.total_counts(n + 1)
+            for ngram, cnt in ref_counts.items():
+                ref_ngrams[ngram] += cnt * num_others
+            self._changed.update(ref_counts)
+        ref_len_sum = sum(len(ref_sent) for ref_sent in ref_sents)
+        self.ref_ngrams[0][0] += ref_len_sum * num_others
+        self._changed.add(0)
+        # average lengths of the remaining references add up to the total length
+        self.avg_ref_len += float(ref_len_sum)
+        self.num_segs += len(ref_sents)
+        self.num_refs += sum(1 for ref_sent in ref_sents if len(ref_sent)) * num_others
 
     def score(self):
         """Return the current NIST score, according to the accumulated counts."""
         return self.nist()
 
     def info(self, ngram):
-        """Return the NIST informativeness of an n-gram."""
-        if ngram not in self.ref_ngrams[len(ngram)]:
+        """Return the NIST informativeness of an n-gram (given as integer n-gram key)."""
+        self._invalidate_info()
+        info = self._info.get(ngram)
+        if info is None:
+            info = self._compute_info(ngram)
+            self._info[ngram] = info
+        return info
+
+    def _compute_info(self, ngram):
+        n = ngram_order(ngram)
+        if ngram not in self.ref_ngrams[n]:
             return 0.0
-        return math.log(self.ref_ngrams[len(ngram) - 1][ngram[:-1]] /
-                        float(self.ref_ngrams[len(ngram)][ngram]), 2)
+        prefix = ngram >> ID_BITS
+        prefix_count = self.ref_ngrams[n - 1][prefix]
+        if self.perl_compat:
+            # the prefix "0" is false in Perl, so the script takes the total length instead
+            if prefix and prefix == self._perl_zero_id():
+                prefix_count = self.ref_ngrams[0][0]
+            return - math.log(self.ref_ngrams[n][ngram] / prefix_count) / math.log(2)
+        return math.log(prefix_count / float(self.ref_ngrams[n][ngram]), 2)
+
+    def _perl_zero_id(self):
+        """Return the token ID of "0" (None if it hasn't been seen)."""
+        return self.corpus.vocab.token_ids.get('0')
+
+    def _invalidate_info(self):
+        """Drop cached information values of n-grams whose own or prefix's reference counts
+        changed since they were computed."""
+        if self._changed:
+            changed = self._changed
+            if self.perl_compat and 0 in changed:
+                # n-grams starting with "0" depend on the total length, too
+                changed.add(self._perl_zero_id())
+            self._info = {ngram: info for ngram, info in self._info.items()
+                          if ngram not in changed and (ngram >> ID_BITS) not in changed}
+            self._changed = set()
 
     def nist_length_penalty(self, lsys, avg_lref):
         """Compute the NIST length penalty, based on system output length & average reference length.
@@ -276,17 +571,206 @@ class NISTScore(NGramScore):
             return 1
         if ratio <= 0:
             return 0
+        if self.perl_compat:
+            return math.exp(-self.PERL_BETA * math.log(ratio) * math.log(ratio))
         return math.exp(-self.BETA * math.log(ratio) ** 2)
 
     def nist(self):
         """Return the current NIST score, according to the accumulated counts."""
-        # 1st NIST term
+        # 1st NIST term (summed up per segment, in the same order as the original implementation)
+        self._invalidate_info()
         hit_infos = [0.0 for _ in range(self.max_ngram)]
+        info, compute_info = self._info, self._compute_info
         for n in range(self.max_ngram):
-            for hit_ngrams in self.hit_ngrams[n]:
-                hit_infos[n] += sum(self.info(ngram) * hits for ngram, hits in hit_ngrams.items())
-        total_lens = [sum(self.cand_lens[n]) for n in range(self.max_ngram)]
-        nist_sum = sum(old_div(hit_info, total_len) for hit_info, total_len in zip(hit_infos, total_lens))
+            for seg_hit_ngrams in self.hit_ngrams[n]:
+                seg_hit_info = 0
+                for ngram, hits in seg_hit_ngrams.items():
+                    ngram_info = info.get(ngram)
+                    if ngram_info is None:
+                        ngram_info = info[ngram] = compute_info(ngram)
+                    seg_hit_info += ngram_info * hits
+                hit_infos[n] += seg_hit_info
+        if self.perl_compat:
+            nist_sum = sum(hit_info / max(total_len, 1) for hit_info, total_len in zip(hit_infos, self.cand_lens))
+            # length penalty term: total reference length over average number of references
+            bp = self.nist_length_penalty(self.cand_lens[0], self.ref_ngrams[0][0] / (self.num_refs / self.num_segs))
+            return nist_sum * bp
+        nist_sum = sum(old_div(hit_info, total_len) for hit_info, total_len in zip(hit_infos, self.cand_lens))
         # length penalty term
-        bp = self.nist_length_penalty(sum(self.cand_lens[0]), self.avg_ref_len)
+        bp = self.nist_length_penalty(self.cand_lens[0], self.avg_ref_len)
         return bp * nist_sum
+
+
+class BLEUNISTScore(object):
+    """A fused accumulator for BLEU & NIST: each sentence is encoded and its n-grams are
+    counted and matched against the references once (up to the higher of the two maximum
+    n-gram orders), updating the statistics of both. The scores are the same as with separate
+    BLEUScore and NISTScore objects."""
+
+    def __init__(self, bleu_max_ngram=4, nist_max_ngram=5, case_sensitive=False, smoothing=0.0,
+                 corpus=None, perl_compat=False):
+        """Create the scoring object.
+        @param bleu_max_ngram: the n-gram level for BLEU (default: 4)
+        @param nist_max_ngram: the n-gram level for NIST (default: 5)
+        @param case_sensitive: use case-sensitive matching (default: no)
+        @param smoothing: BLEU smoothing constant (default: 0.0, sentBLEU uses 1.0)
+        @param corpus: encoded sentence store, may be shared with other scorers (default: new one)
+        @param perl_compat: reproduce mteval-v13a-sig.pl's results (default: no)
+        """
+        self.nist = NISTScore(nist_max_ngram, case_sensitive, corpus, perl_compat)
+        self.bleu = BLEUScore(bleu_max_ngram, case_sensitive, smoothing, self.nist.corpus, perl_compat)
+        self.corpus = self.nist.corpus
+        self.max_ngram = max(bleu_max_ngram, nist_max_ngram)
+
+    def reset(self):
+        """Reset the object, zero all counters."""
+        self.bleu.reset()
+        self.nist.reset()
+
+    def append(self, pred_sent, ref_sents):
+        """Append a sentence for measurements, increase counters of both metrics.
+
+        @param pred_sent: the system output sentence (string/list of tokens)
+        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens, \
+            or References returned by prepare_refs)
+        """
+        pred_sent, ref_sents = self.nist.encode(pred_sent, ref_sents)
+        hit_ngrams = [self.nist.clipped_hits(n + 1, pred_sent, ref_sents) for n in range(self.max_ngram)]
+        self.bleu.append_hits(pred_sent, ref_sents, hit_ngrams)
+        self.nist.append_hits(pred_sent, ref_sents, hit_ngrams)
+
+    def prepare_refs(self, ref_sents):
+        """Encode reference sentences for a single segment (see NGramScore.prepare_refs)."""
+        return self.nist.prepare_refs(ref_sents)
+
+    def score(self):
+        """Return the current BLEU and NIST scores, according to the accumulated counts.
+        @return: a tuple (BLEU, NIST)
+        """
+        return self.bleu.score(), self.nist.score()
+
+
+def _map_math(func, values):
+    """Apply a scalar math function to all items of an array. Unlike NumPy's vectorized
+    log/exp, this gives exactly the same results as the per-sentence code."""
+    return np.fromiter(map(func, values.tolist()), dtype=float, count=len(values))
+
+
+class SegmentScores(object):
+    """Segment-level BLEU, sentBLEU & NIST for many segments at once: n-grams of each segment
+    are counted & matched just once, collecting per-segment hit and length arrays, from which
+    the scores of all segments are computed with array operations. The scores are the same as
+    with a BLEUScore/NISTScore object reset and appended to for each segment (except that
+    undefined NIST scores are NaN instead of raising a ZeroDivisionError)."""
+
+    def __init__(self, bleu_max_ngram=4, nist_max_ngram=5, case_sensitive=False, corpus=None):
+        """Create the scoring object.
+        @param bleu_max_ngram: the n-gram level for BLEU (default: 4)
+        @param nist_max_ngram: the n-gram level for NIST (default: 5)
+        @param case_sensitive: use case-sensitive matching (default: no)
+        @param corpus: encoded sentence store, may be shared with other scorers (default: new one)
+        """
+        self.nist_scorer = NISTScore(nist_max_ngram, case_sensitive, corpus)
+        self.corpus = self.nist_scorer.corpus
+        self.bleu_max_ngram = bleu_max_ngram
+        self.nist_max_ngram = nist_max_ngram
+        self.max_ngram = max(bleu_max_ngram, nist_max_ngram)
+        self.reset()
+
+    def __len__(self):
+        return len(self.pred_lens)
+
+    def reset(self):
+        """Reset the object, forget all segments."""
+        self.pred_lens = []
+        self.closest_ref_lens = []
+        self.avg_ref_lens = []
+        self.hits = []  # clipped n-gram hits for n = 1 .. max_ngram, for each segment
+        # NIST matches: (segment, N) index, hits, reference counts of the n-gram & its prefix
+        self.nist_index = []
+        self.nist_hits = []
+        self.nist_ref_counts = []
+        self.nist_prefix_counts = []
+
+    def append(self, pred_sent, ref_sents):
+        """Add a segment.
+
+        @param pred_sent: the system output sentence (string/list of tokens)
+        @param ref_sents: the corresponding reference sentences (list of strings/lists of tokens, \
+            or References returned by prepare_refs)
+        """
+        pred_sent, ref_sents = self.nist_scorer.encode(pred_sent, ref_sents)
+        seg_index = len(self.pred_lens) * self.nist_max_ngram
+        self.pred_lens.append(len(pred_sent))
+        # take the reference that is closest in length to the candidate
+        # (if there are two of the same distance, take the shorter one)
+        closest_ref = min(ref_sents, key=lambda ref_sent: (abs(len(ref_sent) - len(pred_sent)), len(ref_sent)))
+        self.closest_ref_lens.append(len(closest_ref))
+        ref_len_sum = sum(len(ref_sent) for ref_sent in ref_sents)
+        self.avg_ref_lens.append(ref_len_sum / float(len(ref_sents)))
+
+        seg_hits = []
+        for n in range(1, self.max_ngram + 1):
+            hit_ngrams = self.nist_scorer.clipped_hits(n, pred_sent, ref_sents)
+            seg_hits.append(sum(hit_ngrams.values()))
+            if n > self.nist_max_ngram or not hit_ngrams:
+                continue
+            # NIST information of the n-grams is computed from this segment's references only
+            ref_counts = ref_sents.total_counts(n)
+            prefix_counts = ref_sents.total_counts(n - 1) if n > 1 else None
+            for ngram, hits in hit_ngrams.items():
+                self.nist_index.append(seg_index + n - 1)
+                self.nist_hits.append(hits)
+                self.nist_ref_counts.append(ref_counts[ngram])
+                self.nist_prefix_counts.append(prefix_counts[ngram >> ID_BITS] if n > 1 else ref_len_sum)
+        self.hits.append(seg_hits)
+
+    def prepare_refs(self, ref_sents):
+        """Encode reference sentences for a single segment (see NGramScore.prepare_refs)."""
+        return self.nist_scorer.prepare_refs(ref_sents)
+
+    def bleu(self, smoothing=0.0):
+        """Return BLEU scores of all segments added so far.
+        @param smoothing: constant to add for smoothing (default: 0.0, sentBLEU uses 1.0)
+        @return: numpy array of scores
+        """
+        pred_lens = np.array(self.pred_lens, dtype=np.int64)
+        ref_lens = np.array(self.closest_ref_lens, dtype=np.int64)
+        hits = np.array(self.hits, dtype=np.int64).reshape((len(self), self.max_ngram))
+        # brevity penalty (candidate length 0 changed to 1e-5, as in BLEUScore)
+        bp = np.ones(len(self))
+        short = pred_lens <= ref_lens
+        bp_exps = 1.0 - ref_lens[short] / np.where(pred_lens[short] != 0, pred_lens[short], 1e-5)
+        bp[short] = _map_math(math.exp, bp_exps)
+        # n-gram precision
+        prec_log_sum = np.zeros(len(self))
+        for n in range(self.bleu_max_ngram):
+            n_hits = np.maximum(hits[:, n] + smoothing, BLEUScore.TINY)
+            n_lens = np.maximum((pred_lens - n) + smoothing, BLEUScore.SMALL)
+            prec_log_sum += _map_math(math.log, n_hits / n_lens)
+        return bp * _map_math(math.exp, (1.0 / self.bleu_max_ngram) * prec_log_sum)
+
+    def nist(self):
+        """Return NIST scores of all segments added so far (NaN where undefined, i.e.
+        for outputs not longer than nist_max_ngram - 1 tokens).
+        @return: numpy array of scores
+        """
+        max_ngram = self.nist_max_ngram
+        pred_lens = np.array(self.pred_lens, dtype=np.int64)
+        avg_ref_lens = np.array(self.avg_ref_lens)
+        # information values, summed up for each segment & N in the order of matching
+        infos = _map_math(math.log, np.array(self.nist_prefix_counts, dtype=float) /
+                          np.array(self.nist_ref_counts, dtype=float)) / math.log(2)
+        hit_infos = np.bincount(np.array(self.nist_index, dtype=np.int64),
+                                infos * np.array(self.nist_hits, dtype=float),
+                                minlength=len(self) * max_ngram).reshape((len(self), max_ngram))
+        nist_sums = np.zeros(len(self))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for n in range(max_ngram):
+                nist_sums += hit_infos[:, n] / (pred_lens - n)
+        # length penalty term
+        bp = np.full(len(self), np.nan)
+        defined = (pred_lens >= max_ngram) & (avg_ref_lens != 0)
+        bp[defined] = [self.nist_scorer.nist_length_penalty(lsys, avg_lref) for lsys, avg_lref
+                       in zip(pred_lens[defined].tolist(), avg_ref_lens[defined].tolist())]
+        return bp * nist_sums
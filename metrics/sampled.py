@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Approximate evaluation on a random sample of segments, e.g. for quick checks during training:
+corpus-level BLEU, NIST, ROUGE-L & CIDEr are estimated from a stratified random sample of the
+segments, with bootstrap confidence intervals. The sample is grown (doubled) until the intervals
+are narrow enough or the time budget is used up, so the cost depends on the required precision
+rather than on the size of the data.
+
+References are prepared once for all evaluations: NIST information values and CIDEr document
+frequencies are taken from all references, so each sampled segment's statistics are the same
+as in a full evaluation. Segments are stratified by the size (number of attributes) of their
+MRs; strata are represented proportionally in the sample and weighted by their sizes in the
+estimates.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from builtins import zip
+from builtins import range
+from builtins import object
+import re
+import time
+
+import numpy as np
+
+from metrics.pymteval import BLEUNISTScore, BLEUScore
+from metrics.significance import SegmentStats
+from metrics.corpus import Corpus
+from pycocoevalcap.cider.cider_scorer import CiderReferences, cook_refs, cook_test
+from pycocoevalcap.rouge.rouge import Rouge
+from pycocoevalcap.tokenizer.ptbtokenizer import PTBTokenizer
+
+METRICS = ['BLEU', 'NIST', 'ROUGE_L', 'CIDEr']
+
+
+def mr_stratum(mr):
+    """Stratum of a segment given its MR: the number of attributes (E2E MRs look like
+    `name[The Eagle], eatType[coffee shop], ...`; other sources are all in the same stratum)."""
+    return len(re.findall(r'\[[^\]]*\]', mr or ''))
+
+
+def ptb_tokenize(sents):
+    """PTB-tokenize sentences for ROUGE-L & CIDEr (as COCOEvalCap does)."""
+    tokenized = PTBTokenizer().tokenize({sent_no: [{'caption': sent}] for sent_no, sent in enumerate(sents)})
+    return [tokenized[sent_no][0] for sent_no in range(len(sents))]
+
+
+def whitespace_normalize(sents):
+    """Normalize whitespace in already PTB-tokenized sentences."""
+    return [' '.join(sent.split()) for sent in sents]
+
+
+def stratified_order(strata, rng):
+    """Order segments randomly so that every prefix is a stratified sample, with all strata
+    represented (about) proportionally to their sizes.
+    @param strata: array of stratum numbers, one per segment
+    @param rng: numpy RandomState
+    @return: array of segment indexes
+    """
+    keys = np.empty(len(strata))
+    for stratum in np.unique(strata):
+        members = rng.permutation(np.flatnonzero(strata == stratum))
+        # members are spread evenly over (0, 1), starting at a random offset
+        keys[members] = (np.arange(len(members)) + rng.random_sample()) / len(members)
+    return np.argsort(keys, kind='mergesort')
+
+
+class SampledEvaluator(object):
+    """Estimates corpus-level scores from growing stratified random samples of segments."""
+
+    def __init__(self, data_ref, data_src=None, strata=None, mteval_corpus=None, perl_compat=True,
+                 coco_tokenize=ptb_tokenize, cider_sigma=6.0):
+        """Prepare the references.
+        @param data_ref: references -- list of lists of strings, one list per segment
+        @param data_src: MRs, one per segment, used for stratification (optional)
+        @param strata: stratum labels, one per segment (default: by MR size, see mr_stratum)
+        @param mteval_corpus: corpus for BLEU & NIST (default: the Py-MTEval scorers' own)
+        @param perl_compat: Perl-compatible BLEU & NIST (default: yes)
+        @param coco_tokenize: tokenization of sentences for ROUGE-L & CIDEr -- function taking and \
+            returning a list of strings (default: PTB tokenizer; use whitespace_normalize for \
+            pre-tokenized data)
+        @param cider_sigma: standard deviation of the CIDEr-D length penalty (default: 6.0)
+        """
+        if strata is None:
+            strata = [mr_stratum(mr) for mr in data_src] if data_src is not None else [0] * len(data_ref)
+        if len(strata) != len(data_ref):
+            raise ValueError('Expected stratum labels for %d segments, got %d' % (len(data_ref), len(strata)))
+        # stratum numbers & sizes
+        labels = {}
+        self.strata = np.array([labels.setdefault(label, len(labels)) for label in strata], dtype=np.int64)
+        self.stratum_sizes = np.bincount(self.strata)
+        self.perl_compat = perl_compat
+        self.coco_tokenize = coco_tokenize
+        self.cider_sigma = cider_sigma
+
+        # BLEU & NIST: information values from all references
+        bleu_nist = BLEUNISTScore(corpus=mteval_corpus, perl_compat=perl_compat)
+        self.ref_sents = [bleu_nist.prepare_refs(sents_ref) for sents_ref in data_ref]
+        for refs in self.ref_sents:
+            bleu_nist.nist.append_refs(refs)
+        self.nist = bleu_nist.nist
+        self.seg_bleu = BLEUScore(bleu_nist.bleu.max_ngram, corpus=bleu_nist.corpus, perl_compat=perl_compat)
+        # ROUGE-L & CIDEr: document frequencies from all references
+        ref_lens = [len(refs) for refs in data_ref]
+        flat_refs = coco_tokenize([ref for refs in data_ref for ref in refs])
+        bounds = np.cumsum([0] + ref_lens)
+        self.coco_ref = [flat_refs[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        self.rouge = Rouge(prune=True)
+        self.cider_corpus = Corpus()
+        self.cider_refs = CiderReferences([cook_refs(refs, corpus=self.cider_corpus) for refs in self.coco_ref])
+
+    def __len__(self):
+        return len(self.ref_sents)
+
+    def segment_stats(self, inst_no, sent_sys, coco_sys):
+        """Compute the statistics of a single segment (see SegmentStats; no METEOR).
+        @param inst_no: the segment number
+        @param sent_sys: the system output
+        @param coco_sys: the system output, tokenized for ROUGE-L & CIDEr
+        @return: list of statistics
+        """
+        stats = SegmentStats.mteval_stats(self.seg_bleu, self.nist, sent_sys, self.ref_sents[inst_no])
+        stats.append(self.rouge.calc_score([coco_sys], self.coco_ref[inst_no]))
+        stats.append(float(self.cider_refs.score(cook_test(coco_sys, corpus=self.cider_corpus), inst_no,
+                                                 self.cider_sigma)))
+        return stats
+
+    def estimate(self, sample, values, num_samples=1000, alpha=0.05, rng=None):
+        """Estimate corpus-level scores from the statistics of a sample of segments.
+        @param sample: array of sampled segment numbers
+        @param values: numpy array of their statistics (segments x statistics)
+        @param num_samples: number of bootstrap resamples (default: 1000)
+        @param alpha: significance level (default: 0.05 = 95% confidence intervals)
+        @param rng: numpy RandomState (optional)
+        @return: dictionary metric name -> estimate, metric name + '_CI' -> (lower, upper) bound
+        """
+        rng = rng or np.random.RandomState()
+        stats = SegmentStats(values, 0, self.seg_bleu.max_ngram, self.nist.max_ngram, self.perl_compat)
+        # each segment stands for all unsampled segments of its stratum
+        sample_strata = self.strata[sample]
+        weights = (self.stratum_sizes / np.maximum(np.bincount(sample_strata, minlength=len(self.stratum_sizes)), 1))
+        weights = weights[sample_strata]
+        scores = stats.scores(weights.dot(values)[None, :], None)
+        result = {metric: float(scores[metric][0]) for metric in METRICS}
+        if len(sample) == len(self):
+            # no sampling error
+            result.update({metric + '_CI': (result[metric], result[metric]) for metric in METRICS})
+            return result
+
+        # stratified bootstrap: resampling within each stratum
+        draws = np.empty((num_samples, len(sample)), dtype=np.int64)
+        for stratum in np.unique(sample_strata):
+            positions = np.flatnonzero(sample_strata == stratum)
+            draws[:, positions] = positions[rng.randint(0, len(positions), (num_samples, len(positions)))]
+        draws += len(sample) * np.arange(num_samples)[:, None]
+        counts = np.bincount(draws.ravel(), minlength=num_samples * len(sample)).reshape((num_samples, len(sample)))
+        sample_scores = stats.scores((counts * weights).dot(values), None)
+        for metric in METRICS:
+            result[metric + '_CI'] = tuple(float(bound) for bound in np.percentile(sample_scores[metric],
+                                                                                   [50.0 * alpha, 100.0 - 50.0 * alpha]))
+        return result
+
+    def evaluate(self, outputs, ci_width=0.05, time_budget=None, initial_size=100, num_samples=1000,
+                 alpha=0.05, seed=None):
+        """Estimate corpus-level scores of the given outputs, growing the sample until all
+        confidence intervals are narrow enough, the time budget is used up, or all segments
+        have been scored.
+        @param outputs: system outputs -- a list of strings (one per segment), or a function \
+            returning the outputs for a given list of segment numbers (called for each batch \
+            of newly sampled segments, so that outputs are only generated for those)
+        @param ci_width: maximum width of the confidence intervals, relative to the estimated \
+            scores (default: 0.05; None = only use the time budget)
+        @param time_budget: maximum time in seconds to start scoring a next, larger sample (optional)
+        @param initial_size: initial sample size (default: 100)
+        @param num_samples: number of bootstrap resamples (default: 1000)
+        @param alpha: significance level (default: 0.05 = 95% confidence intervals)
+        @param seed: random seed (optional)
+        @return: dictionary metric name -> estimate, metric name + '_CI' -> (lower, upper) bound, \
+            'sample_size' -> number of segments scored
+        """
+        start_time = time.time()
+        rng = np.random.RandomState(seed)
+        order = stratified_order(self.strata, rng)
+        rows = []
+        size = min(max(initial_size, 1), len(self))
+        while True:
+            new = order[len(rows):size].tolist()
+            new_outputs = outputs(new) if callable(outputs) else [outputs[inst_no] for inst_no in new]
+            for inst_no, sent_sys, coco_sys in zip(new, new_outputs, self.coco_tokenize(new_outputs)):
+                rows.append(self.segment_stats(inst_no, sent_sys, coco_sys))
+            result = self.estimate(order[:size], np.array(rows, dtype=float), num_samples, alpha, rng)
+            result['sample_size'] = size
+            if size == len(self):
+                break
+            if ci_width is not None and all(result[metric + '_CI'][1] - result[metric + '_CI'][0] <=
+                                            ci_width * abs(result[metric]) for metric in METRICS):
+                break
+            if time_budget is not None and time.time() - start_time >= time_budget:
+                break
+            size = min(2 * size, len(self))
+        return result
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Segment-level BLEU, sentBLEU, NIST, ROUGE-L & CIDEr for large data sets, computed in chunks
+of segments, optionally by a pool of worker processes.
+
+All sentences are tokenized & encoded once, and CIDEr document frequencies are collected over
+all references, before the chunks are scored; the workers get the prepared data and score their
+chunks independently. Chunks are returned in the original order as soon as they are finished,
+so the results can be written out while the rest is still being computed. Scores are the same
+as computed by SegmentScores and by the COCO evaluator on the whole data, regardless of the
+number of workers & the chunk size.
+
+BLEU and NIST inputs are raw sentences (tokenized by the MT-Eval corpus), ROUGE-L and CIDEr
+inputs should be PTB-tokenized and lowercased as in COCOEvalCap.
+"""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+from builtins import object
+import multiprocessing
+
+from metrics.corpus import Corpus
+from metrics.pymteval import SegmentScores
+from pycocoevalcap.rouge.rouge import Rouge
+from pycocoevalcap.cider.cider_scorer import CiderReferences, DocumentFrequency, cook_refs, cook_test
+
+METRICS = ['BLEU', 'sentBLEU', 'NIST', 'ROUGE_L', 'CIDEr']
+
+# the scorer used by the current worker process (set by the pool initializer)
+_WORKER_SCORER = None
+
+
+def _init_worker(scorer):
+    global _WORKER_SCORER
+    _WORKER_SCORER = scorer
+
+
+def _score_chunk(bounds):
+    return _WORKER_SCORER.score_chunk(*bounds)
+
+
+class SegLevelScorer(object):
+    """Chunked segment-level scoring of a whole data set (see module docstring)."""
+
+    def __init__(self, data_ref, data_sys, coco_ref, coco_sys, mteval_corpus=None, workers=1,
+                 cider_sigma=6.0):
+        """Tokenize & encode all sentences, prepare CIDEr document frequencies.
+        @param data_ref: references for BLEU & NIST -- list of lists of strings, one list per segment
+        @param data_sys: system outputs for BLEU & NIST -- list of strings
+        @param coco_ref: PTB-tokenized references for ROUGE-L & CIDEr (same shape as data_ref)
+        @param coco_sys: PTB-tokenized system outputs for ROUGE-L & CIDEr
+        @param mteval_corpus: corpus for BLEU & NIST (default: the Py-MTEval scorers' own)
+        @param workers: number of parallel tokenization processes (default: 1)
+        @param cider_sigma: standard deviation of the CIDEr-D length penalty (default: 6.0)
+        """
+        if not len(data_ref) == len(data_sys) == len(coco_ref) == len(coco_sys):
+            raise ValueError('References & outputs must have the same number of segments')
+        self.data_ref = data_ref
+        self.data_sys = data_sys
+        self.coco_ref = coco_ref
+        self.coco_sys = coco_sys
+        self.cider_sigma = cider_sigma
+        self.mteval_corpus = SegmentScores(corpus=mteval_corpus).corpus
+        self.mteval_corpus.encode_all([ref for refs in data_ref for ref in refs] + list(data_sys), workers)
+        # CIDEr n-gram counts; document frequencies are taken from all segments, not just a chunk
+        cider_corpus = Corpus()
+        self.cider_refs = [cook_refs(refs, corpus=cider_corpus) for refs in coco_ref]
+        self.cider_test = [cook_test(sent, corpus=cider_corpus) for sent in coco_sys]
+        self.cider_df = DocumentFrequency(self.cider_refs)
+
+    def __len__(self):
+        return len(self.data_sys)
+
+    def score_chunk(self, start, end):
+        """Score the segments start..end-1.
+        @return: list of tuples of scores (BLEU, sentBLEU, NIST, ROUGE_L, CIDEr), one per segment
+        """
+        seg_scores = SegmentScores(corpus=self.mteval_corpus)
+        for inst_no in range(start, end):
+            seg_scores.append(self.data_sys[inst_no], self.data_ref[inst_no])
+        rouge = Rouge(prune=True)
+        rouge_scores = [rouge.calc_score([self.coco_sys[inst_no]], self.coco_ref[inst_no])
+                        for inst_no in range(start, end)]
+        cider_refs = CiderReferences(self.cider_refs[start:end], document_frequency=self.cider_df)
+        cider_scores = [float(cider_refs.score(self.cider_test[inst_no], inst_no - start, self.cider_sigma))
+                        for inst_no in range(start, end)]
+        return list(zip(seg_scores.bleu().tolist(), seg_scores.bleu(smoothing=1.0).tolist(),
+                        seg_scores.nist().tolist(), rouge_scores, cider_scores))
+
+    def iter_scores(self, workers=1, chunk_size=1000):
+        """Score all segments, chunk by chunk, in parallel if more workers are requested.
+        @param workers: number of scoring processes (default: 1 = score in this process)
+        @param chunk_size: number of segments scored at a time (default: 1000)
+        @return: generator of tuples of scores (see score_chunk()), in the original order
+        """
+        if chunk_size < 1:
+            raise ValueError('Chunk size must be positive')
+        bounds = [(start, min(start + chunk_size, len(self))) for start in range(0, len(self), chunk_size)]
+        if workers > 1 and len(bounds) > 1:
+            pool = multiprocessing.Pool(min(workers, len(bounds)), initializer=_init_worker, initargs=(self,))
+            try:
+                # imap keeps the order, chunks finished early wait for the preceding ones
+                for chunk in pool.imap(_score_chunk, bounds):
+                    for scores in chunk:
+                        yield scores
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for start, end in bounds:
+                for scores in self.score_chunk(start, end):
+                    yield scores
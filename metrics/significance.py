@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Significance tests for comparing two or more systems on the same data: paired bootstrap
+resampling (Koehn, 2004) and approximate randomization (Riezler & Maxwell, 2005), for BLEU,
+NIST, METEOR, ROUGE-L & CIDEr.
+
+Each system's outputs are turned into per-segment sufficient statistics once (a matrix of
+segments x statistics), so corpus-level scores of a resampled corpus are computed from weighted
+column sums: a whole batch of resamples is a single matrix product, and all metrics are then
+computed from the sums with array operations (METEOR with batched EVAL lines). The same
+resamples are used for all systems. Batches of resamples are processed by a pool of worker
+processes; results don't depend on the number of workers.
+
+As in mteval-v13a-sig.pl's statistics, NIST information values are taken from the references
+of the whole data, and CIDEr document frequencies as well (so CIDEr, like ROUGE-L, is an average
+of fixed per-segment scores).
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from builtins import zip
+from builtins import range
+from builtins import object
+from itertools import combinations
+import multiprocessing
+
+import numpy as np
+
+from metrics.pymteval import BLEUNISTScore, BLEUScore, NISTScore
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.rouge.rouge import Rouge
+
+METRICS = ['BLEU', 'NIST', 'METEOR', 'ROUGE_L', 'CIDEr']
+
+
+class SegmentStats(object):
+    """Per-segment sufficient statistics of all metrics for one system's outputs, as columns of
+    a matrix (segments x statistics)."""
+
+    def __init__(self, values, meteor_size, bleu_max_ngram=4, nist_max_ngram=5, perl_compat=True):
+        """Create the object from already computed statistics (see compute()).
+        @param values: numpy array of statistics (segments x statistics)
+        @param meteor_size: length of the METEOR statistics vectors
+        @param bleu_max_ngram: the n-gram level for BLEU (default: 4)
+        @param nist_max_ngram: the n-gram level for NIST (default: 5)
+        @param perl_compat: compute BLEU & NIST in the Perl-compatible way (default: yes)
+        """
+        self.values = values
+        self.bleu_max_ngram = bleu_max_ngram
+        self.nist_max_ngram = nist_max_ngram
+        self.perl_compat = perl_compat
+        sizes = [('segs', 1), ('bleu_ref_len', 1), ('bleu_cand_lens', bleu_max_ngram), ('bleu_hits', bleu_max_ngram),
+                 ('nist_avg_ref_len', 1), ('nist_ref_len', 1), ('nist_num_refs', 1),
+                 ('nist_cand_lens', nist_max_ngram), ('nist_hit_info', nist_max_ngram),
+                 ('METEOR', meteor_size), ('ROUGE_L', 1), ('CIDEr', 1)]
+        self.columns = {}
+        pos = 0
+        for name, size in sizes:
+            self.columns[name] = slice(pos, pos + size)
+            pos += size
+        if values.shape[1] != pos:
+            raise ValueError('Expected %d statistics per segment, got %d' % (pos, values.shape[1]))
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def compute(cls, data_ref, data_sys, coco_ref, coco_sys, meteor, mteval_corpus=None, perl_compat=True,
+                cider_refs=None):
+        """Compute per-segment statistics for the given system outputs.
+        @param data_ref: references for BLEU & NIST -- list of lists of strings, one list per segment
+        @param data_sys: system outputs for BLEU & NIST -- list of strings
+        @param coco_ref: PTB-tokenized references for METEOR, ROUGE-L & CIDEr (same shape as data_ref)
+        @param coco_sys: PTB-tokenized system outputs for METEOR, ROUGE-L & CIDEr
+        @param meteor: METEOR scorer (Meteor or MeteorApprox)
+        @param mteval_corpus: corpus for BLEU & NIST (default: the Py-MTEval scorers' own)
+        @param perl_compat: Perl-compatible BLEU & NIST (default: yes)
+        @param cider_refs: CIDEr references prepared by Cider.prepare_references for coco_ref, \
+            to be shared for several systems with the same references (optional)
+        @return: a new SegmentStats object
+        """
+        # NIST information values are computed from all references
+        bleu_nist = BLEUNISTScore(corpus=mteval_corpus, perl_compat=perl_compat)
+        ref_sents = [bleu_nist.prepare_refs(sents_ref) for sents_ref in data_ref]
+        for refs, sent_sys in zip(ref_sents, data_sys):
+            bleu_nist.append(sent_sys, refs)
+        nist = bleu_nist.nist
+        seg_bleu = BLEUScore(bleu_nist.bleu.max_ngram, corpus=bleu_nist.corpus, perl_compat=perl_compat)
+        rows = [cls.mteval_stats(seg_bleu, nist, sent_sys, refs) for refs, sent_sys in zip(ref_sents, data_sys)]
+
+        gts = dict(enumerate(coco_ref))
+        res = {inst_no: [sent] for inst_no, sent in enumerate(coco_sys)}
+        meteor_stats = np.array(meteor.compute_stats(gts, res), dtype=float).reshape((len(rows), -1))
+        _, rouge_scores = Rouge(prune=True).compute_score(gts, res)
+        _, cider_scores = Cider().compute_score(gts, res, cider_refs)
+        values = np.hstack([np.array(rows, dtype=float).reshape((len(rows), -1)), meteor_stats,
+                            np.array(rouge_scores, dtype=float)[:, None], np.array(cider_scores, dtype=float)[:, None]])
+        return cls(values, meteor_stats.shape[1], bleu_nist.bleu.max_ngram, nist.max_ngram, perl_compat)
+
+    @staticmethod
+    def mteval_stats(seg_bleu, nist, sent_sys, ref_sents, hit_ngrams=None):
+        """Compute the BLEU & NIST statistics of a single segment (the first columns of the matrix).
+        @param seg_bleu: BLEUScore object (used as a scratch accumulator)
+        @param nist: NISTScore object providing information values (must have seen the references)
+        @param sent_sys: the system output (string/list of tokens)
+        @param ref_sents: the references (References or list of strings/lists of tokens)
+        @param hit_ngrams: clipped hits per n-gram for n = 1 .. max. n-gram order of both metrics, \
+            if already computed (default: compute them)
+        @return: list of statistics
+        """
+        pred_sent, refs = nist.encode(sent_sys, ref_sents)
+        if hit_ngrams is None:
+            hit_ngrams = [nist.clipped_hits(n + 1, pred_sent, refs)
+                          for n in range(max(seg_bleu.max_ngram, nist.max_ngram))]
+        seg_bleu.reset()
+        seg_bleu.append_hits(pred_sent, refs, hit_ngrams)
+        ref_len = sum(len(ref) for ref in refs)
+        nist_cand_lens = [max(len(pred_sent) - n, 0) if nist.perl_compat else len(pred_sent) - n
+                          for n in range(nist.max_ngram)]
+        return ([1, seg_bleu.ref_len] + seg_bleu.cand_lens + seg_bleu.hits +
+                [ref_len / float(len(refs)), ref_len, sum(1 for ref in refs if len(ref))] + nist_cand_lens +
+                [sum(nist.info(ngram) * hits for ngram, hits in hit_ngrams[n].items()) for n in range(nist.max_ngram)])
+
+    def _get(self, sums, name):
+        return sums[:, self.columns[name]]
+
+    def bleu(self, sums):
+        """Compute BLEU from summed statistics.
+        @param sums: numpy array of (weighted) column sums of the statistics, one row per corpus
+        @return: numpy array of scores, one per row
+        """
+        ref_len = self._get(sums, 'bleu_ref_len')[:, 0]
+        cand_lens = self._get(sums, 'bleu_cand_lens')
+        hits = self._get(sums, 'bleu_hits')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.perl_compat:
+                # mteval-v13a.pl's smoothing: 1/2^k for the k-th order with no hits
+                present = cand_lens > 0
+                no_hits = present & (hits == 0)
+                smooth = np.cumprod(np.where(no_hits, 2.0, 1.0), axis=1)
+                logs = np.where(no_hits, -np.log(smooth * cand_lens), np.log(hits / cand_lens))
+                prec_log_sum = np.where(present, logs, 0.0).sum(axis=1)
+                bp = np.where(cand_lens[:, 0] > 0, np.exp(np.minimum(0, 1 - ref_len / cand_lens[:, 0])), 0.0)
+                return np.exp(prec_log_sum / self.bleu_max_ngram) * bp
+            cand_len = np.where(cand_lens[:, 0] != 0, cand_lens[:, 0], 1e-5)
+            bp = np.where(cand_lens[:, 0] <= ref_len, np.exp(1.0 - ref_len / cand_len), 1.0)
+            prec_log_sum = np.log(np.maximum(hits, BLEUScore.TINY) / np.maximum(cand_lens, BLEUScore.SMALL)).sum(axis=1)
+        return bp * np.exp(prec_log_sum / self.bleu_max_ngram)
+
+    def nist(self, sums):
+        """Compute NIST from summed statistics (see bleu())."""
+        cand_lens = self._get(sums, 'nist_cand_lens')
+        hit_info = self._get(sums, 'nist_hit_info')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.perl_compat:
+                nist_sum = (hit_info / np.maximum(cand_lens, 1)).sum(axis=1)
+                avg_ref_len = (self._get(sums, 'nist_ref_len')[:, 0] /
+                               (self._get(sums, 'nist_num_refs')[:, 0] / self._get(sums, 'segs')[:, 0]))
+                beta = NISTScore.PERL_BETA
+            else:
+                nist_sum = (hit_info / cand_lens).sum(axis=1)
+                avg_ref_len = self._get(sums, 'nist_avg_ref_len')[:, 0]
+                beta = NISTScore.BETA
+            # length penalty
+            ratio = cand_lens[:, 0] / avg_ref_len
+            bp = np.exp(-beta * np.log(np.clip(ratio, 1e-300, 1.0)) ** 2)
+        bp[ratio >= 1] = 1.0
+        bp[ratio <= 0] = 0.0
+        return nist_sum * bp
+
+    def scores(self, sums, meteor):
+        """Compute all metrics from summed statistics.
+        @param sums: numpy array of (weighted) column sums of the statistics, one row per corpus
+        @param meteor: METEOR scorer (must be the same kind as used in compute(); None = skip METEOR)
+        @return: dictionary metric name -> numpy array of scores, one per row
+        """
+        segs = self._get(sums, 'segs')[:, 0]
+        scores = {'BLEU': self.bleu(sums), 'NIST': self.nist(sums),
+                  'ROUGE_L': self._get(sums, 'ROUGE_L')[:, 0] / segs,
+                  'CIDEr': self._get(sums, 'CIDEr')[:, 0] / segs}
+        if meteor is not None:
+            scores['METEOR'] = meteor.eval_stats(self._get(sums, 'METEOR').tolist())
+        return scores
+
+
+class _Resampler(object):
+    """Computes statistics sums for batches of resamples (in worker processes)."""
+
+    def __init__(self, values, diffs):
+        # statistics of all systems side by side; their differences for each pair of systems
+        self.values = values
+        self.diffs = diffs
+
+    def sums(self, method, seed, size):
+        rng = np.random.RandomState(seed)
+        num_segs = len(self.values)
+        if method == 'bootstrap':
+            # number of times each segment is drawn in each resample
+            draws = rng.randint(0, num_segs, (size, num_segs)) + num_segs * np.arange(size)[:, None]
+            counts = np.bincount(draws.ravel(), minlength=size * num_segs).reshape((size, num_segs))
+            return counts.astype(float).dot(self.values)
+        # approximate randomization: outputs of each segment are swapped with probability 0.5
+        swaps = rng.randint(0, 2, (size, num_segs)).astype(float)
+        return swaps.dot(self.diffs)
+
+
+# the resampler used by the current worker process (set by the pool initializer)
+_WORKER_RESAMPLER = None
+
+
+def _init_worker(resampler):
+    global _WORKER_RESAMPLER
+    _WORKER_RESAMPLER = resampler
+
+
+def _resample(task):
+    return _WORKER_RESAMPLER.sums(*task)
+
+
+class SignificanceTester(object):
+    """Paired bootstrap & approximate randomization tests for two or more systems."""
+
+    def __init__(self, system_stats, meteor, workers=1, batch_size=1000):
+        """Prepare the tests.
+        @param system_stats: list of SegmentStats, one per system (computed on the same references)
+        @param meteor: METEOR scorer (the same kind as used to compute the statistics)
+        @param workers: number of resampling processes (default: 1)
+        @param batch_size: number of resamples in a batch (default: 1000)
+        """
+        if len(system_stats) < 2:
+            raise ValueError('Need at least two systems to compare')
+        for stats in system_stats[1:]:
+            if stats.values.shape != system_stats[0].values.shape:
+                raise ValueError('All systems must have statistics for the same segments')
+        self.system_stats = system_stats
+        self.meteor = meteor
+        self.workers = workers
+        self.batch_size = batch_size
+        self.pairs = list(combinations(range(len(system_stats)), 2))
+        self.num_stats = system_stats[0].values.shape[1]
+        self.totals = [stats.values.sum(axis=0) for stats in system_stats]
+
+    def observed(self):
+        """Corpus-level scores of all systems on the full data.
+        @return: dictionary metric name -> numpy array of scores, one per system
+        """
+        scores = [stats.scores(total[None, :], self.meteor) for stats, total in zip(self.system_stats, self.totals)]
+        return {metric: np.array([sys_scores[metric][0] for sys_scores in scores]) for metric in METRICS}
+
+    def _run(self, method, num_samples, seed):
+        """Compute statistics sums for all resamples, batch by batch, in parallel if more
+        workers are requested."""
+        resampler = _Resampler(np.hstack([stats.values for stats in self.system_stats]),
+                               np.hstack([self.system_stats[j].values - self.system_stats[i].values
+                                          for i, j in self.pairs]))
+        sizes = [min(self.batch_size, num_samples - start) for start in range(0, num_samples, self.batch_size)]
+        seeds = np.random.RandomState(seed).randint(0, 2 ** 31 - 1, len(sizes))
+        tasks = [(method, batch_seed, size) for batch_seed, size in zip(seeds.tolist(), sizes)]
+        if self.workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(self.workers, len(tasks)), initializer=_init_worker,
+                                        initargs=(resampler,))
+            try:
+                sums = pool.map(_resample, tasks)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            sums = [resampler.sums(*task) for task in tasks]
+        return np.vstack(sums) if sums else np.zeros((0, resampler.values.shape[1]))
+
+    def bootstrap(self, num_samples=10000, seed=None):
+        """Paired bootstrap resampling: the same resamples of segments for all systems.
+        @param num_samples: number of resamples (default: 10000)
+        @param seed: random seed (optional)
+        @return: dictionary metric name -> numpy array of scores (resamples x systems)
+        """
+        sums = self._run('bootstrap', num_samples, seed)
+        scores = [stats.scores(sums[:, sys_no * self.num_stats:(sys_no + 1) * self.num_stats], self.meteor)
+                  for sys_no, stats in enumerate(self.system_stats)]
+        return {metric: np.stack([sys_scores[metric] for sys_scores in scores], axis=1) for metric in METRICS}
+
+    def approx_randomization(self, num_trials=10000, seed=None):
+        """Approximate randomization: for each pair of systems, outputs are swapped at random
+        (the same swaps for all pairs) and it is counted how often the absolute score difference
+        is at least as large as the observed one.
+        @param num_trials: number of random trials (default: 10000)
+        @param seed: random seed (optional)
+        @return: dictionary metric name -> dictionary (system no., system no.) -> p-value
+        """
+        observed = self.observed()
+        diffs = self._run('randomization', num_trials, seed)
+        p_values = {metric: {} for metric in METRICS}
+        for pair_no, (i, j) in enumerate(self.pairs):
+            # swapped statistics move from system i to j and back
+            pair_diffs = diffs[:, pair_no * self.num_stats:(pair_no + 1) * self.num_stats]
+            scores_i = self.system_stats[i].scores(self.totals[i] + pair_diffs, self.meteor)
+            scores_j = self.system_stats[j].scores(self.totals[j] - pair_diffs, self.meteor)
+            for metric in METRICS:
+                observed_diff = abs(observed[metric][i] - observed[metric][j])
+                hits = np.sum(np.abs(scores_i[metric] - scores_j[metric]) >= observed_diff)
+                p_values[metric][(i, j)] = (hits + 1.0) / (num_trials + 1.0)
+        return p_values
+
+
+def bootstrap_p_values(observed, samples):
+    """Paired bootstrap p-values: for each pair of systems, the proportion of resamples in which
+    the system that is better on the full data doesn't win.
+    @param observed: observed scores of all systems (see SignificanceTester.observed)
+    @param samples: scores for all resamples (see SignificanceTester.bootstrap)
+    @return: dictionary metric name -> dictionary (system no., system no.) -> p-value
+    """
+    p_values = {}
+    for metric in METRICS:
+        num_systems = len(observed[metric])
+        p_values[metric] = {}
+        for i, j in combinations(range(num_systems), 2):
+            sign = 1.0 if observed[metric][i] >= observed[metric][j] else -1.0
+            wins = np.sum(sign * (samples[metric][:, i] - samples[metric][:, j]) > 0)
+            p_values[metric][(i, j)] = 1.0 - wins / float(len(samples[metric]))
+    return p_values
+
+
+def confidence_intervals(samples, alpha=0.05):
+    """Bootstrap percentile confidence intervals.
+    @param samples: scores for all resamples (see SignificanceTester.bootstrap)
+    @param alpha: significance level (default: 0.05 = 95% CI)
+    @return: dictionary metric name -> numpy array of (lower, upper) bounds for each system
+    """
+    return {metric: np.percentile(scores, [50.0 * alpha, 100.0 - 50.0 * alpha], axis=0).T
+            for metric, scores in samples.items()}
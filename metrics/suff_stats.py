@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Sufficient statistics for all metrics, which can be stored in files and merged, e.g. to
+evaluate a large data set in shards on several machines and get the global scores afterwards:
+
+- BLEU: closest reference length, output lengths & clipped hits for each N,
+- NIST: output lengths, reference n-gram counts, per-segment hit counts per n-gram & average
+  reference lengths, number of non-empty references,
+- METEOR: per-segment statistics vectors (summed up for the corpus-level score),
+- ROUGE-L: per-segment scores (averaged),
+- CIDEr: reference document frequencies & the PTB-tokenized references and outputs of each
+  segment (scores depend on the document frequencies of all data, so they're computed after
+  merging; the n-gram counts are recomputed from the sentences, which is cheaper than storing them).
+
+N-grams are stored as space-separated tokens, so the files don't depend on the token IDs of the
+process that wrote them. Merging is associative (counts are summed, per-segment values
+concatenated in order) and scores computed from merged statistics are exactly the same as
+from a single run on all the data.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from builtins import zip
+from builtins import range
+from builtins import object
+from collections import defaultdict
+import gzip
+import io
+import json
+
+import numpy as np
+
+from metrics.corpus import Corpus, Vocabulary
+from metrics.pymteval import BLEUNISTScore
+from pycocoevalcap.cider.cider_scorer import CiderReferences, DocumentFrequency, cook_refs, cook_test
+from pycocoevalcap.eval import create_meteor
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox
+from pycocoevalcap.rouge.rouge import Rouge
+
+STATS_VERSION = 3
+
+
+def _decode_counts(counts, vocab):
+    """Convert a dictionary keyed by integer n-gram keys into one keyed by n-gram strings."""
+    return {' '.join(vocab.decode(ngram)): cnt for ngram, cnt in counts.items()}
+
+
+def _encode_counts(counts, vocab, value_type=int):
+    """Convert a dictionary keyed by n-gram strings into one keyed by integer n-gram keys
+    (keeping the order of the items)."""
+    return {vocab.encode_ngram(ngram.split(' ')): value_type(cnt) for ngram, cnt in counts.items()}
+
+
+def _merge_counts(counts, other):
+    """Sum two dictionaries of counts (items of the first one come first)."""
+    merged = dict(counts)
+    for ngram, cnt in other.items():
+        merged[ngram] = merged.get(ngram, 0) + cnt
+    return merged
+
+
+def _open(fname, mode):
+    if fname.endswith('.gz'):
+        return gzip.open(fname, mode + 't', encoding='UTF-8')
+    return io.open(fname, mode, encoding='UTF-8')
+
+
+class SufficientStats(object):
+    """Sufficient statistics of BLEU, NIST, METEOR, ROUGE-L & CIDEr for a set of segments."""
+
+    def __init__(self, data):
+        """Create the object from already computed statistics (as returned by compute()
+        or loaded by load()).
+        @param data: the statistics (a JSON-serializable dictionary)
+        """
+        if data.get('version') != STATS_VERSION:
+            raise ValueError('Unsupported statistics version: %s' % data.get('version'))
+        self.data = data
+
+    def __len__(self):
+        return self.data['num_segs']
+
+    @classmethod
+    def compute(cls, data_ref, data_sys, coco_ref, coco_sys, meteor, mteval_corpus=None, perl_compat=True,
+                workers=1, cider_sigma=6.0):
+        """Compute the statistics for the given data.
+        @param data_ref: references for BLEU & NIST -- list of lists of strings, one list per segment
+        @param data_sys: system outputs for BLEU & NIST -- list of strings
+        @param coco_ref: PTB-tokenized references for METEOR, ROUGE-L & CIDEr (same shape as data_ref)
+        @param coco_sys: PTB-tokenized system outputs for METEOR, ROUGE-L & CIDEr
+        @param meteor: METEOR scorer (Meteor or MeteorApprox)
+        @param mteval_corpus: corpus for BLEU & NIST (default: the Py-MTEval scorers' own)
+        @param perl_compat: Perl-compatible BLEU & NIST (default: yes)
+        @param workers: number of parallel tokenization processes for BLEU & NIST (default: 1)
+        @param cider_sigma: standard deviation of the CIDEr-D length penalty (default: 6.0)
+        @return: a new SufficientStats object
+        """
+        # BLEU & NIST
+        bleu_nist = BLEUNISTScore(corpus=mteval_corpus, perl_compat=perl_compat)
+        bleu_nist.corpus.encode_all([ref for refs in data_ref for ref in refs] + list(data_sys), workers)
+        avg_ref_lens = []
+        for sents_ref, sent_sys in zip(data_ref, data_sys):
+            refs = bleu_nist.prepare_refs(sents_ref)
+            avg_ref_lens.append(sum(len(ref) for ref in refs) / float(len(refs)))
+            bleu_nist.append(sent_sys, refs)
+        bleu, nist = bleu_nist.bleu, bleu_nist.nist
+        vocab = bleu_nist.corpus.vocab
+        data = {'version': STATS_VERSION, 'num_segs': len(data_sys)}
+        data['BLEU'] = {'max_ngram': bleu.max_ngram, 'perl_compat': perl_compat, 'ref_len': bleu.ref_len,
+                        'cand_lens': bleu.cand_lens, 'hits': bleu.hits}
+        data['NIST'] = {'max_ngram': nist.max_ngram, 'perl_compat': perl_compat, 'cand_lens': nist.cand_lens,
+                        'ref_len': nist.ref_ngrams[0][0], 'avg_ref_lens': avg_ref_lens, 'num_refs': nist.num_refs,
+                        'ref_ngrams': [_decode_counts(counts, vocab) for counts in nist.ref_ngrams[1:]],
+                        'hit_ngrams': [[_decode_counts(counts, vocab) for counts in seg_counts]
+                                       for seg_counts in nist.hit_ngrams]}
+
+        # METEOR & ROUGE-L
+        gts = dict(enumerate(coco_ref))
+        res = {inst_no: [sent] for inst_no, sent in enumerate(coco_sys)}
+        data['METEOR'] = {'approx': isinstance(meteor, MeteorApprox), 'stats': meteor.compute_stats(gts, res)}
+        rouge = Rouge(prune=True)
+        data['ROUGE_L'] = {'scores': [float(rouge.calc_score([sent_sys], sents_ref))
+                                      for sents_ref, sent_sys in zip(coco_ref, coco_sys)]}
+
+        # CIDEr
+        corpus = Corpus()
+        crefs = [cook_refs(refs, corpus=corpus) for refs in coco_ref]
+        df = DocumentFrequency(crefs)
+        vocab = corpus.vocab
+        data['CIDEr'] = {'n': 4, 'sigma': cider_sigma, 'num_groups': df.num_groups,
+                         'df': {ngram: int(cnt) for ngram, cnt in _decode_counts(df.counts, vocab).items()},
+                         'refs': [list(refs) for refs in coco_ref], 'test': list(coco_sys)}
+        return cls(data)
+
+    def merge(self, other):
+        """Merge with statistics of another set of segments (which come after this object's).
+        @return: a new SufficientStats object
+        """
+        data, other_data = self.data, other.data
+        for metric, params in [('BLEU', ['max_ngram', 'perl_compat']), ('NIST', ['max_ngram', 'perl_compat']),
+                               ('METEOR', ['approx']), ('CIDEr', ['n', 'sigma'])]:
+            for param in params:
+                if data[metric][param] != other_data[metric][param]:
+                    raise ValueError('Cannot merge statistics with different %s settings (%s: %s vs. %s)'
+                                     % (metric, param, data[metric][param], other_data[metric][param]))
+        merged = {'version': STATS_VERSION, 'num_segs': data['num_segs'] + other_data['num_segs']}
+        bleu, other_bleu = data['BLEU'], other_data['BLEU']
+        merged['BLEU'] = {'max_ngram': bleu['max_ngram'], 'perl_compat': bleu['perl_compat'],
+                          'ref_len': bleu['ref_len'] + other_bleu['ref_len'],
+                          'cand_lens': [a + b for a, b in zip(bleu['cand_lens'], other_bleu['cand_lens'])],
+                          'hits': [a + b for a, b in zip(bleu['hits'], other_bleu['hits'])]}
+        nist, other_nist = data['NIST'], other_data['NIST']
+        merged['NIST'] = {'max_ngram': nist['max_ngram'], 'perl_compat': nist['perl_compat'],
+                          'cand_lens': [a + b for a, b in zip(nist['cand_lens'], other_nist['cand_lens'])],
+                          'ref_len': nist['ref_len'] + other_nist['ref_len'],
+                          'avg_ref_lens': nist['avg_ref_lens'] + other_nist['avg_ref_lens'],
+                          'num_refs': nist['num_refs'] + other_nist['num_refs'],
+                          'ref_ngrams': [_merge_counts(a, b) for a, b in zip(nist['ref_ngrams'], other_nist['ref_ngrams'])],
+                          'hit_ngrams': [a + b for a, b in zip(nist['hit_ngrams'], other_nist['hit_ngrams'])]}
+        merged['METEOR'] = {'approx': data['METEOR']['approx'],
+                            'stats': data['METEOR']['stats'] + other_data['METEOR']['stats']}
+        merged['ROUGE_L'] = {'scores': data['ROUGE_L']['scores'] + other_data['ROUGE_L']['scores']}
+        cider, other_cider = data['CIDEr'], other_data['CIDEr']
+        merged['CIDEr'] = {'n': cider['n'], 'sigma': cider['sigma'],
+                           'num_groups': cider['num_groups'] + other_cider['num_groups'],
+                           'df': _merge_counts(cider['df'], other_cider['df']),
+                           'refs': cider['refs'] + other_cider['refs'],
+                           'test': cider['test'] + other_cider['test']}
+        return SufficientStats(merged)
+
+    def bleu_nist(self):
+        """Rebuild the BLEU & NIST accumulators from the statistics.
+        @return: a BLEUNISTScore object with counters set (encoded in a new vocabulary)
+        """
+        bleu_data, nist_data = self.data['BLEU'], self.data['NIST']
+        perl_compat = nist_data['perl_compat']
+        corpus = Corpus(lowercase='ascii' if perl_compat else True, vocab=Vocabulary())
+        bleu_nist = BLEUNISTScore(bleu_data['max_ngram'], nist_data['max_ngram'], corpus=corpus,
+                                  perl_compat=perl_compat)
+        bleu = bleu_nist.bleu
+        bleu.ref_len = bleu_data['ref_len']
+        bleu.cand_lens = list(bleu_data['cand_lens'])
+        bleu.hits = list(bleu_data['hits'])
+        nist = bleu_nist.nist
+        nist.cand_lens = list(nist_data['cand_lens'])
+        nist.ref_ngrams = [defaultdict(int, {0: nist_data['ref_len']})]
+        nist.ref_ngrams.extend(defaultdict(int, _encode_counts(counts, corpus.vocab))
+                               for counts in nist_data['ref_ngrams'])
+        nist.hit_ngrams = [[_encode_counts(counts, corpus.vocab) for counts in seg_counts]
+                           for seg_counts in nist_data['hit_ngrams']]
+        # summed up in the original order, as NISTScore does
+        nist.avg_ref_len = sum(nist_data['avg_ref_lens'], 0.0)
+        nist.num_segs = len(nist_data['avg_ref_lens'])
+        nist.num_refs = nist_data['num_refs']
+        return bleu_nist
+
+    def cider_scores(self):
+        """Compute per-segment CIDEr scores from the statistics.
+        @return: numpy array of scores
+        """
+        cider = self.data['CIDEr']
+        corpus = Corpus()
+        df = DocumentFrequency()
+        df.counts = _encode_counts(cider['df'], corpus.vocab, float)
+        df.num_groups = cider['num_groups']
+        references = CiderReferences([cook_refs(refs, cider['n'], corpus=corpus) for refs in cider['refs']],
+                                     cider['n'], df)
+        return np.array([references.score(cook_test(sent, cider['n'], corpus=corpus), index, cider['sigma'])
+                         for index, sent in enumerate(cider['test'])])
+
+    def scores(self, meteor_args=None):
+        """Compute corpus-level scores of all metrics from the statistics.
+        @param meteor_args: METEOR settings (see pycocoevalcap.eval.create_meteor); the \
+            approximation is used if the statistics were computed by it
+        @return: dictionary metric name -> score
+        """
+        if self.data['METEOR']['approx']:
+            meteor_args = {'approx': True}
+        elif meteor_args and meteor_args.get('approx'):
+            raise ValueError('METEOR statistics were not computed by the approximation')
+        bleu, nist = self.bleu_nist().score()
+        return {'BLEU': bleu, 'NIST': nist,
+                'METEOR': create_meteor(meteor_args).score_stats(self.data['METEOR']['stats']),
+                'ROUGE_L': np.mean(np.array(self.data['ROUGE_L']['scores'])),
+                'CIDEr': np.mean(self.cider_scores())}
+
+    def save(self, fname):
+        """Write the statistics to a JSON file (gzipped if the name ends with .gz)."""
+        with _open(fname, 'w') as fh:
+            fh.write(json.dumps(self.data, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, fname):
+        """Load statistics from a JSON file (gzipped if the name ends with .gz)."""
+        with _open(fname, 'r') as fh:
+            return cls(json.load(fh))
+
+
+def merge_stats(stats_list):
+    """Merge a list of statistics, in the given order.
+    @return: a new SufficientStats object
+    """
+    merged = stats_list[0]
+    for stats in stats_list[1:]:
+        merged = merged.merge(stats)
+    return merged
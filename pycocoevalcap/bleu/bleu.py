@@ -14,9 +14,11 @@ from .bleu_scorer import BleuScorer
 
 
 class Bleu(object):
-    def __init__(self, n=4):
+    def __init__(self, n=4, corpus=None):
         # default compute Blue score up to 4
         self._n = n
+        # encoded sentence store, may be shared with other scorers
+        self._corpus = corpus
         self._hypo_for_image = {}
         self.ref_for_image = {}
 
@@ -25,7 +27,7 @@ class Bleu(object):
         assert(list(gts.keys()) == list(res.keys()))
         imgIds = list(gts.keys())
 
-        bleu_scorer = BleuScorer(n=self._n)
+        bleu_scorer = BleuScorer(n=self._n, corpus=self._corpus)
         for id in imgIds:
             hypo = res[id]
             ref = gts[id]
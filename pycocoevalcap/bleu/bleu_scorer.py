@@ -25,31 +25,39 @@ from past.utils import old_div
 import copy
 import sys, math, re
 from collections import defaultdict
+from itertools import chain
+import numpy as np
 
-def precook(s, n=4, out=False):
+from metrics.corpus import Corpus
+from metrics.pymteval import _map_math
+
+def precook(s, n=4, out=False, corpus=None):
     """Takes a string as input and returns an object that can be given to
     either cook_refs or cook_test. This is optional: cook_refs and cook_test
-    can take string arguments as well."""
-    words = s.split()
-    counts = defaultdict(int)
-    for k in range(1,n+1):
-        for i in range(len(words)-k+1):
-            ngram = tuple(words[i:i+k])
-            counts[ngram] += 1
-    return (len(words), counts)
-
-def cook_refs(refs, eff=None, n=4): ## lhuang: oracle will call with "average"
+    can take string arguments as well.
+    The n-gram counts are a list of dicts (one per order) keyed by integer
+    n-gram keys, shared through the corpus by all scorers that see the sentence;
+    all sentences that are compared must use the same corpus."""
+    if corpus is None:
+        raise ValueError('A corpus is needed, n-gram keys are only comparable within one vocabulary')
+    sent = corpus.sentence(s)
+    return (len(sent), [sent.counts(k) for k in range(1,n+1)])
+
+def cook_refs(refs, eff=None, n=4, corpus=None): ## lhuang: oracle will call with "average"
     '''Takes a list of reference sentences for a single segment
     and returns an object that encapsulates everything that BLEU
     needs to know about them.'''
 
     reflen = []
-    maxcounts = {}
+    maxcounts = [{} for _ in range(n)]
     for ref in refs:
-        rl, counts = precook(ref, n)
+        rl, counts = precook(ref, n, corpus=corpus)
         reflen.append(rl)
-        for (ngram,count) in counts.items():
-            maxcounts[ngram] = max(maxcounts.get(ngram,0), count)
+        for k in range(n):
+            k_maxcounts = maxcounts[k]
+            for (ngram,count) in counts[k].items():
+                if count > k_maxcounts.get(ngram,0):
+                    k_maxcounts[ngram] = count
 
     # Calculate effective reference sentence length.
     if eff == "shortest":
@@ -63,11 +71,11 @@ def cook_refs(refs, eff=None, n=4): ## lhuang: oracle will call with "average"
 
     return (reflen, maxcounts)
 
-def cook_test(test, xxx_todo_changeme, eff=None, n=4):
+def cook_test(test, xxx_todo_changeme, eff=None, n=4, corpus=None):
     '''Takes a test sentence and returns an object that
     encapsulates everything that BLEU needs to know about it.'''
     (reflen, refmaxcounts) = xxx_todo_changeme
-    testlen, counts = precook(test, n, True)
+    testlen, counts = precook(test, n, True, corpus)
 
     result = {}
 
@@ -83,30 +91,73 @@ def cook_test(test, xxx_todo_changeme, eff=None, n=4):
     result["guess"] = [max(0,testlen-k+1) for k in range(1,n+1)]
 
     result['correct'] = [0]*n
-    for (ngram, count) in counts.items():
-        result["correct"][len(ngram)-1] += min(refmaxcounts.get(ngram,0), count)
+    for k in range(n):
+        k_refmaxcounts = refmaxcounts[k]
+        result["correct"][k] = sum(min(k_refmaxcounts.get(ngram,0), count) for (ngram, count) in counts[k].items())
 
     return result
 
+class BleuStats(object):
+    """Cooked statistics of all test sentences in contiguous arrays: test lengths (segments),
+    n-gram guesses and correct n-grams (segments x n) and effective reference lengths
+    (segments) for each reflen option."""
+
+    OPTIONS = ("closest", "shortest", "average")
+
+    def __init__(self, ctest, n=4):
+        '''Collect the statistics from a list of cook_test outputs.'''
+        num_segs = len(ctest)
+        self.testlen = np.array([comps['testlen'] for comps in ctest], dtype=np.int64)
+        self.guess = np.array([comps['guess'] for comps in ctest], dtype=np.int64).reshape(num_segs, n)
+        self.correct = np.array([comps['correct'] for comps in ctest], dtype=np.int64).reshape(num_segs, n)
+
+        # reference lengths, padded into a (segments x max. references) array
+        num_refs = np.array([len(comps['reflen']) for comps in ctest], dtype=np.int64)
+        rows = np.repeat(np.arange(num_segs), num_refs)
+        cols = np.arange(len(rows)) - np.repeat(np.cumsum(num_refs) - num_refs, num_refs)
+        reflens = np.full((num_segs, max(num_refs.max() if num_segs else 0, 1)), np.inf)
+        reflens[rows, cols] = np.fromiter(chain.from_iterable(comps['reflen'] for comps in ctest),
+                                          dtype=float, count=len(rows))
+        # closest: smallest difference to the test length, shorter one on ties
+        diffs = np.abs(reflens - self.testlen[:, np.newaxis])
+        closest = np.where(diffs == diffs.min(axis=1)[:, np.newaxis], reflens, np.inf).min(axis=1)
+        self.reflen = {
+            "closest": closest.astype(np.int64),
+            "shortest": reflens.min(axis=1).astype(np.int64),
+            "average": np.where(np.isinf(reflens), 0, reflens).sum(axis=1) / np.maximum(num_refs, 1),
+        }
+
+    def __len__(self):
+        return len(self.testlen)
+
+def _total(values):
+    '''Sum of an array as a Python number; floats are added up in order, like a loop would.'''
+    if values.dtype.kind == 'f':
+        return np.cumsum(values)[-1].item() if len(values) else 0
+    return values.sum().item()
+
 class BleuScorer(object):
     """Bleu scorer.
     """
 
-    __slots__ = "n", "crefs", "ctest", "_score", "_ratio", "_testlen", "_reflen", "special_reflen"
+    __slots__ = "n", "crefs", "ctest", "_score", "_ratio", "_testlen", "_reflen", "special_reflen", "corpus", "_stats"
     # special_reflen is used in oracle (proportional effective ref len for a node).
 
     def copy(self):
         ''' copy the refs.'''
-        new = BleuScorer(n=self.n)
+        new = BleuScorer(n=self.n, corpus=self.corpus)
         new.ctest = copy.copy(self.ctest)
         new.crefs = copy.copy(self.crefs)
         new._score = None
+        new._stats = self._stats
         return new
 
-    def __init__(self, test=None, refs=None, n=4, special_reflen=None):
+    def __init__(self, test=None, refs=None, n=4, special_reflen=None, corpus=None):
         ''' singular instance '''
 
         self.n = n
+        # encoded sentences are shared with any other scorer using the same corpus
+        self.corpus = corpus if corpus is not None else Corpus()
         self.crefs = []
         self.ctest = []
         self.cook_append(test, refs)
@@ -116,14 +167,15 @@ class BleuScorer(object):
         '''called by constructor and __iadd__ to avoid creating new instances.'''
         
         if refs is not None:
-            self.crefs.append(cook_refs(refs))
+            self.crefs.append(cook_refs(refs, n=self.n, corpus=self.corpus))
             if test is not None:
-                cooked_test = cook_test(test, self.crefs[-1])
+                cooked_test = cook_test(test, self.crefs[-1], n=self.n, corpus=self.corpus)
                 self.ctest.append(cooked_test) ## N.B.: -1
             else:
                 self.ctest.append(None) # lens of crefs and ctest have to match
 
         self._score = None ## need to recompute
+        self._stats = None
 
     def ratio(self, option=None):
         self.compute_score(option=option)
@@ -150,8 +202,9 @@ class BleuScorer(object):
         assert len(new_test) == len(self.crefs), new_test
         self.ctest = []
         for t, rs in zip(new_test, self.crefs):
-            self.ctest.append(cook_test(t, rs))
+            self.ctest.append(cook_test(t, rs, n=self.n, corpus=self.corpus))
         self._score = None
+        self._stats = None
 
         return self
 
@@ -175,6 +228,7 @@ class BleuScorer(object):
             self.ctest.extend(other.ctest)
             self.crefs.extend(other.crefs)
             self._score = None ## need to recompute
+            self._stats = None
 
         return self        
 
@@ -201,68 +255,83 @@ class BleuScorer(object):
         self._score = None
         return self.compute_score(option, verbose)
         
-    def compute_score(self, option=None, verbose=0):
-        n = self.n
-        small = 1e-9
-        tiny = 1e-15 ## so that if guess is 0 still return 0
-        bleu_list = [[] for _ in range(n)]
+    def stats(self):
+        '''Return the cooked statistics of all test sentences as arrays (BleuStats).'''
+        if self._stats is None:
+            self._stats = BleuStats(self.ctest, self.n)
+        return self._stats
 
+    def compute_score(self, option=None, verbose=0):
         if self._score is not None:
             return self._score
 
         if option is None:
             option = "average" if len(self.crefs) == 1 else "closest"
 
-        self._testlen = 0
-        self._reflen = 0
-        totalcomps = {'testlen':0, 'reflen':0, 'guess':[0]*n, 'correct':[0]*n}
-
-        # for each sentence
-        for comps in self.ctest:            
-            testlen = comps['testlen']
-            self._testlen += testlen
+        return self.compute_scores([option], verbose)[option]
 
+    def compute_scores(self, options=BleuStats.OPTIONS, verbose=0):
+        '''Compute corpus-level and per-segment BLEU-1..n for several reflen options at once.
+        :param options: list of reflen options ("closest", "shortest", "average")
+        :return: dict option -> (corpus-level BLEU-1..n, per-segment BLEU-1..n (n lists)), \
+            same as compute_score(option)
+        '''
+        n = self.n
+        small = 1e-9
+        tiny = 1e-15 ## so that if guess is 0 still return 0
+        stats = self.stats()
+        testlen = stats.testlen
+
+        # per image bleu scores, for all images & n at once: the products of precisions are
+        # accumulated in the same order as in a per-image loop, roots & brevity penalties are
+        # computed with Python's scalar math (NumPy's vectorized pow & exp may differ in the last digit)
+        precisions = (stats.correct + tiny) / (stats.guess + small)
+        products = np.cumprod(precisions, axis=1)
+        seg_bleus = [_map_math(lambda bleu, k=k: bleu ** (1./(k+1)), products[:, k]) for k in range(n)]
+
+        # corpus-level counts
+        self._testlen = _total(testlen)
+        guess = [_total(col) for col in stats.guess.T]
+        correct = [_total(col) for col in stats.correct.T]
+
+        results = {}
+        for option in options:
             if self.special_reflen is None: ## need computation
-                reflen = self._single_reflen(comps['reflen'], option, testlen)
+                assert option in stats.reflen, "unsupported reflen option %s" % option
+                reflen = stats.reflen[option]
             else:
-                reflen = self.special_reflen
-
-            self._reflen += reflen
-                
-            for key in ['guess','correct']:
-                for k in range(n):
-                    totalcomps[key][k] += comps[key][k]
-
-            # append per image bleu score
-            bleu = 1.
+                reflen = np.full(len(stats), self.special_reflen)
+            ratio = (testlen + tiny) / (reflen + small) ## N.B.: avoid zero division
+            short = ratio < 1
+            brevity = _map_math(math.exp, 1 - 1 / ratio[short])
+            bleu_list = []
             for k in range(n):
-                bleu *= old_div((float(comps['correct'][k]) + tiny),(float(comps['guess'][k]) + small)) 
-                bleu_list[k].append(bleu ** (1./(k+1)))
-            ratio = old_div((testlen + tiny), (reflen + small)) ## N.B.: avoid zero division
-            if ratio < 1:
-                for k in range(n):
-                    bleu_list[k][-1] *= math.exp(1 - old_div(1,ratio))
+                bleu_k = seg_bleus[k].copy()
+                bleu_k[short] *= brevity
+                bleu_list.append(bleu_k.tolist())
 
             if verbose > 1:
-                print(comps, reflen)
+                for comps, ref in zip(self.ctest, reflen.tolist()):
+                    print(comps, ref)
 
-        totalcomps['reflen'] = self._reflen
-        totalcomps['testlen'] = self._testlen
+            self._reflen = _total(reflen)
+            totalcomps = {'testlen': self._testlen, 'reflen': self._reflen, 'guess': guess, 'correct': correct}
 
-        bleus = []
-        bleu = 1.
-        for k in range(n):
-            bleu *= float(totalcomps['correct'][k] + tiny) \
-                    / (totalcomps['guess'][k] + small)
-            bleus.append(bleu ** (1./(k+1)))
-        ratio = old_div((self._testlen + tiny), (self._reflen + small)) ## N.B.: avoid zero division
-        if ratio < 1:
+            bleus = []
+            bleu = 1.
             for k in range(n):
-                bleus[k] *= math.exp(1 - old_div(1,ratio))
+                bleu *= float(totalcomps['correct'][k] + tiny) \
+                        / (totalcomps['guess'][k] + small)
+                bleus.append(bleu ** (1./(k+1)))
+            ratio = old_div((self._testlen + tiny), (self._reflen + small)) ## N.B.: avoid zero division
+            if ratio < 1:
+                for k in range(n):
+                    bleus[k] *= math.exp(1 - old_div(1,ratio))
 
-        if verbose > 0:
-            print(totalcomps)
-            print("ratio:", ratio)
+            if verbose > 0:
+                print(totalcomps)
+                print("ratio:", ratio)
 
-        self._score = bleus
-        return self._score, bleu_list
+            self._score = bleus
+            results[option] = (bleus, bleu_list)
+        return results
@@ -9,7 +9,10 @@ from __future__ import absolute_import
 # Authors: Ramakrishna Vedantam <vrama91@vt.edu> and Tsung-Yi Lin <tl483@cornell.edu>
 
 from builtins import object
-from .cider_scorer import CiderScorer
+import numpy as np
+from .cider_scorer import CiderScorer, CiderReferences, cook_refs
+from .cider_matrix import CiderMatrixScorer
+from metrics.corpus import Corpus
 import pdb
 
 class Cider(object):
@@ -17,24 +20,60 @@ class Cider(object):
     Main Class to compute the CIDEr metric 
 
     """
-    def __init__(self, test=None, refs=None, n=4, sigma=6.0):
+    def __init__(self, test=None, refs=None, n=4, sigma=6.0, corpus=None, vectorized=False):
         # set cider to sum over 1 to 4-grams
         self._n = n
         # set the standard deviation parameter for gaussian penalty
         self._sigma = sigma
+        # encoded sentence store, may be shared with other scorers
+        self._corpus = corpus
+        # use the NumPy scorer (faster on large data, same scores up to floating-point rounding)
+        self._scorer_class = CiderMatrixScorer if vectorized else CiderScorer
 
-    def compute_score(self, gts, res):
+    def prepare_references(self, gts):
+        """
+        Compute document frequencies and reference vectors once, to score any number of systems
+        against the same references (see compute_score)
+        :param  ref_for_image (dict)  : dictionary with key <image> and value <tokenized reference sentence>
+        :return: CiderReferences
+        """
+        corpus = self._corpus if self._corpus is not None else Corpus()
+        crefs = []
+        for id in gts:
+            ref = gts[id]
+            # Sanity check.
+            assert(type(ref) is list)
+            assert(len(ref) > 0)
+            crefs.append(cook_refs(ref, self._n, corpus))
+        return CiderReferences(crefs, self._n, corpus=corpus)
+
+    def compute_score(self, gts, res, references=None):
         """
         Main function to compute CIDEr score
         :param  hypo_for_image (dict) : dictionary with key <image> and value <tokenized hypothesis / candidate sentence>
                 ref_for_image (dict)  : dictionary with key <image> and value <tokenized reference sentence>
+                references (CiderReferences) : references prepared by prepare_references(gts) (optional); \
+                    hypotheses are then scored against them (as by CiderScorer) without cooking the \
+                    references again
         :return: cider (float) : computed CIDEr score for the corpus 
         """
 
         assert(list(gts.keys()) == list(res.keys()))
         imgIds = list(gts.keys())
 
-        cider_scorer = CiderScorer(n=self._n, sigma=self._sigma)
+        if references is not None:
+            if len(references) != len(imgIds):
+                raise ValueError('Prepared references are for %d images, got %d' % (len(references), len(imgIds)))
+            score = []
+            for index, id in enumerate(imgIds):
+                hypo = res[id]
+                # Sanity check.
+                assert(type(hypo) is list)
+                assert(len(hypo) == 1)
+                score.append(references.score(references.cook(hypo[0]), index, self._sigma))
+            return np.mean(np.array(score)), np.array(score)
+
+        cider_scorer = self._scorer_class(n=self._n, sigma=self._sigma, corpus=self._corpus)
 
         for id in imgIds:
             hypo = res[id]
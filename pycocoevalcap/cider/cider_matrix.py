@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Vectorized CIDEr: hypotheses and references are turned into sparse n-gram count matrices
+# (coordinate format, one per n-gram order, over an n-gram vocabulary shared by hypotheses and
+# references), and tf-idf weights, norms, clipped dot products and length penalties are computed
+# with NumPy array operations for all segments at once. N-grams are also extracted and counted
+# with array operations, directly from the token IDs of the encoded sentences.
+# Results are the same as CiderScorer's up to floating-point rounding (the order of summation
+# differs).
+
+from __future__ import division
+from builtins import range
+from itertools import chain
+import numpy as np
+
+from .cider_scorer import CiderScorer
+
+def dense_ranks(values):
+    """
+    Number the distinct values in an integer array 0..k-1, in ascending order.
+    :return: array of numbers for each value, k (number of distinct values)
+    """
+    order = np.argsort(values)
+    sorted_values = values[order]
+    is_new = np.empty(len(values), dtype=bool)
+    is_new[:1] = True
+    is_new[1:] = sorted_values[1:] != sorted_values[:-1]
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = np.cumsum(is_new) - 1
+    return ranks, int(is_new.sum())
+
+def unique_counts(values):
+    """
+    Sort-based equivalent of np.unique(values, return_counts=True) for integer arrays
+    (faster than hashing for large arrays).
+    :return: array of sorted distinct values, array of their counts
+    """
+    sorted_values = np.sort(values)
+    is_new = np.empty(len(values), dtype=bool)
+    is_new[:1] = True
+    is_new[1:] = sorted_values[1:] != sorted_values[:-1]
+    starts = np.flatnonzero(is_new)
+    return sorted_values[starts], np.diff(np.append(starts, len(values)))
+
+def sparse_counts(sents, n):
+    """
+    Count n-grams of orders 1..n in the given sentences.
+    :param sents: list of Sentence : encoded sentences
+    :param n: int : maximum n-gram order
+    :return: list (one item per order) of triples: rows (sentence indexes), columns (n-gram indexes, \
+        shared by all sentences) and counts, as arrays sorted by row and column
+    """
+    lengths = np.array([len(sent) for sent in sents], dtype=np.int64)
+    tokens = np.fromiter(chain.from_iterable(sent.ids for sent in sents), dtype=np.int64, count=lengths.sum())
+    # n-grams are identified by their starting positions in the token array
+    sent_index = np.repeat(np.arange(len(sents)), lengths)
+    starts = np.arange(len(tokens))
+    ends = np.cumsum(lengths)[sent_index]
+    codes = np.zeros(len(tokens), dtype=np.int64)
+    num_tokens = tokens.max() + 1 if len(tokens) else 1
+    matrices = []
+    for k in range(n):
+        # extend (k)-grams by one token, keep those that fit in the sentence
+        keep = starts + k < ends
+        starts, ends, sent_index, codes = starts[keep], ends[keep], sent_index[keep], codes[keep]
+        # number the distinct (k+1)-grams: (k)-gram number + next token -> (k+1)-gram number
+        codes, num_codes = dense_ranks(codes * num_tokens + tokens[starts + k])
+        num_codes = max(num_codes, 1)
+        entries, counts = unique_counts(sent_index * num_codes + codes)
+        matrices.append((entries // num_codes, entries % num_codes, counts.astype(float)))
+    return matrices
+
+class CiderMatrixScorer(CiderScorer):
+    """CIDEr scorer computing all scores at once with NumPy array operations instead of
+    per-n-gram Python loops. Same interface as CiderScorer, but ctest and crefs hold encoded
+    sentences (metrics.corpus.Sentence) instead of n-gram counts.
+    """
+
+    def cook_append(self, test, refs):
+        '''called by constructor and __iadd__ to avoid creating new instances.'''
+
+        if refs is not None:
+            self.crefs.append([self.corpus.sentence(ref) for ref in refs])
+            if test is not None:
+                self.ctest.append(self.corpus.sentence(test))
+            else:
+                self.ctest.append(None) # lens of crefs and ctest have to match
+
+    def _add_doc_freq(self, refs):
+        # document frequencies are computed along with the scores
+        pass
+
+    def _remove_doc_freq(self, refs):
+        pass
+
+    def compute_cider(self):
+        refs = [ref for group in self.crefs for ref in group]
+        num_hyps = len(self.ctest)
+        num_groups = len(self.crefs)
+        num_refs = np.array([len(group) for group in self.crefs])
+        # reference -> segment (reference group) index
+        ref_group = np.repeat(np.arange(num_groups), num_refs)
+        # compute log reference length
+        self.ref_len = np.log(float(num_groups))
+
+        # vrama91: added a length based gaussian penalty
+        # (length = number of bigrams, as in CiderScorer)
+        lengths = np.array([len(sent) for sent in chain(self.ctest, refs)], dtype=float)
+        lengths = np.maximum(lengths - 1, 0) if self.n > 1 else np.zeros(len(lengths))
+        delta = lengths[:num_hyps][ref_group] - lengths[num_hyps:]
+        penalty = np.e**(-(delta**2) / (2*self.sigma**2))
+
+        vals = np.zeros((len(refs), self.n))
+        # hypotheses & references share the n-gram numbering (matrix columns)
+        for n, (rows, cols, tfs) in enumerate(sparse_counts(self.ctest + refs, self.n)):
+            num_cols = cols.max() + 1 if len(cols) else 1
+            is_hyp = rows < num_hyps
+            hyp_rows, hyp_cols, hyp_tfs = rows[is_hyp], cols[is_hyp], tfs[is_hyp]
+            ref_rows, ref_cols, ref_tfs = rows[~is_hyp] - num_hyps, cols[~is_hyp], tfs[~is_hyp]
+
+            # document frequency = number of reference groups containing the n-gram
+            ref_index = ref_group[ref_rows] * num_cols + ref_cols
+            df = np.bincount(unique_counts(ref_index)[0] % num_cols, minlength=num_cols)
+            # give word count 1 if it doesn't appear in reference corpus
+            idf = self.ref_len - np.log(np.maximum(1.0, df))
+
+            # tf-idf vectors & their norms
+            ref_vals = ref_tfs * idf[ref_cols]
+            hyp_vals = hyp_tfs * idf[hyp_cols]
+            ref_norm = np.sqrt(np.bincount(ref_rows, ref_vals**2, minlength=len(refs)))
+            hyp_norm = np.sqrt(np.bincount(hyp_rows, hyp_vals**2, minlength=num_hyps))
+
+            # clipped dot products: find the hypothesis entry for each reference entry
+            # (same segment, same n-gram) by a binary search in the (sorted) hypothesis entries
+            hyp_index = hyp_rows * num_cols + hyp_cols
+            if len(hyp_index):
+                pos = np.minimum(np.searchsorted(hyp_index, ref_index), len(hyp_index) - 1)
+                matched = hyp_index[pos] == ref_index
+            else:
+                pos = matched = np.zeros(len(ref_index), dtype=bool)
+            matched_ref_vals = ref_vals[matched]
+            # vrama91 : added clipping
+            dot = np.bincount(ref_rows[matched],
+                              np.minimum(hyp_vals[pos[matched]], matched_ref_vals) * matched_ref_vals,
+                              minlength=len(refs)).astype(float)
+
+            norms = hyp_norm[ref_group] * ref_norm
+            nonzero = norms != 0
+            dot[nonzero] /= norms[nonzero]
+            assert(not np.isnan(dot).any())
+            vals[:, n] = dot * penalty
+
+        # change by vrama91 - mean of ngram scores, instead of sum; divide by number of references
+        scores = np.bincount(ref_group, vals.mean(axis=1), minlength=num_groups) / num_refs
+        # multiply score by 10
+        return scores * 10.0
+
+    def compute_score(self, option=None, verbose=0):
+        # compute cider score
+        score = self.compute_cider()
+        return np.mean(score), score
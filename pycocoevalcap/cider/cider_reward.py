@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# CIDEr-D as a reward function, e.g. for self-critical sequence training: the whole reference
+# corpus is loaded once, with fixed corpus-level document frequencies and precomputed reference
+# vectors, and any batch of (MR/image ID, hypothesis) pairs is then scored independently
+# of the other samples in the batch.
+
+from builtins import zip
+from builtins import object
+import numpy as np
+
+from metrics.corpus import Corpus
+from .cider_scorer import CiderReferences, cook_refs
+
+class CiderReward(object):
+    """
+    Per-sample CIDEr-D against a fixed reference corpus. Scores are the same as the per-image
+    scores of Cider.compute_score on the full corpus (the IDF does not depend on the batch).
+    """
+
+    def __init__(self, refs, n=4, sigma=6.0):
+        '''
+        Load the reference corpus and precompute document frequencies and reference vectors.
+        :param refs: dict : reference sentences (list of tokenized strings) for each MR/image ID
+        :param n: int : maximum n-gram order
+        :param sigma: float : standard deviation of the gaussian length penalty
+        '''
+        self.n = n
+        self.sigma = sigma
+        self.index = {}
+        crefs = []
+        corpus = Corpus()
+        for ref_id, ref_sents in refs.items():
+            assert(type(ref_sents) is list)
+            assert(len(ref_sents) > 0)
+            self.index[ref_id] = len(crefs)
+            crefs.append(cook_refs(ref_sents, n, corpus))
+        self.vocab = corpus.vocab
+        self.references = CiderReferences(crefs, n, corpus=corpus)
+
+    def cook(self, hyp):
+        '''
+        Count n-grams of a hypothesis; unlike Corpus.sentence(), nothing is kept in memory
+        (tokens unknown to the references can't match, so they aren't added to the vocabulary).
+        :param hyp: str or list of str : tokenized hypothesis (string or list of tokens)
+        :return: list of dict : n-gram counts for each order
+        '''
+        return self.references.cook(hyp)
+
+    def score(self, ref_id, hyp):
+        '''
+        Compute the CIDEr-D score of a single hypothesis.
+        :param ref_id: MR/image ID (key in the reference dict)
+        :param hyp: str or list of str : tokenized hypothesis
+        :return: score (float)
+        '''
+        return float(self.references.score(self.cook(hyp), self.index[ref_id], self.sigma))
+
+    def compute_scores(self, ref_ids, hyps):
+        '''
+        Compute CIDEr-D scores for a batch of hypotheses.
+        :param ref_ids: list : MR/image IDs, one for each hypothesis (may repeat)
+        :param hyps: list : tokenized hypotheses (strings or lists of tokens)
+        :return: numpy array of scores
+        '''
+        assert(len(ref_ids) == len(hyps))
+        return np.array([self.score(ref_id, hyp) for ref_id, hyp in zip(ref_ids, hyps)])
+
+    __call__ = compute_scores
+
+    def method(self):
+        return "CIDEr-D reward"
@@ -13,41 +13,295 @@ import numpy as np
 import pdb
 import math
 
-def precook(s, n=4, out=False):
+from metrics.corpus import Corpus
+
+def precook(s, n=4, out=False, corpus=None):
     """
     Takes a string as input and returns an object that can be given to
     either cook_refs or cook_test. This is optional: cook_refs and cook_test
     can take string arguments as well.
     :param s: string : sentence to be converted into ngrams
     :param n: int    : number of ngrams for which representation is calculated
-    :return: term frequency vector for occuring ngrams
+    :param corpus: Corpus : encoded sentence store, the same for all sentences that are compared
+    :return: term frequency vector for occuring ngrams (list of dicts keyed by integer ngram keys, one per n)
     """
-    words = s.split()
-    counts = defaultdict(int)
-    for k in range(1,n+1):
-        for i in range(len(words)-k+1):
-            ngram = tuple(words[i:i+k])
-            counts[ngram] += 1
-    return counts
-
-def cook_refs(refs, n=4): ## lhuang: oracle will call with "average"
+    if corpus is None:
+        raise ValueError('A corpus is needed, n-gram keys are only comparable within one vocabulary')
+    sent = corpus.sentence(s)
+    return [sent.counts(k) for k in range(1,n+1)]
+
+def cook_refs(refs, n=4, corpus=None): ## lhuang: oracle will call with "average"
     '''Takes a list of reference sentences for a single segment
     and returns an object that encapsulates everything that BLEU
     needs to know about them.
     :param refs: list of string : reference sentences for some image
     :param n: int : number of ngrams for which (ngram) representation is calculated
-    :return: result (list of dict)
+    :return: result (list of list of dict)
     '''
-    return [precook(ref, n) for ref in refs]
+    return [precook(ref, n, corpus=corpus) for ref in refs]
 
-def cook_test(test, n=4):
+def cook_test(test, n=4, corpus=None):
     '''Takes a test sentence and returns an object that
     encapsulates everything that BLEU needs to know about it.
     :param test: list of string : hypothesis sentence for some image
     :param n: int : number of ngrams for which (ngram) representation is calculated
-    :return: result (dict)
+    :return: result (list of dict)
     '''
-    return precook(test, n, True)
+    return precook(test, n, True, corpus)
+
+class DocumentFrequency(object):
+    """
+    Document frequencies of n-grams over reference groups (number of groups that contain each
+    n-gram), maintained incrementally: adding or removing a reference group takes time
+    proportional to the size of the group.
+    """
+
+    def __init__(self, crefs=()):
+        '''
+        :param crefs: list of list of list of dict : cooked reference groups to start with (see cook_refs)
+        '''
+        self.counts = {}
+        self.num_groups = 0
+        for refs in crefs:
+            self.add(refs)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, ngram):
+        return self.counts.get(ngram, 0.0)
+
+    def get(self, ngram, default=0.0):
+        return self.counts.get(ngram, default)
+
+    def values(self):
+        return self.counts.values()
+
+    def copy(self):
+        new = DocumentFrequency()
+        new.counts = dict(self.counts)
+        new.num_groups = self.num_groups
+        return new
+
+    @staticmethod
+    def _ngrams(refs):
+        # refs, k ref captions of one image
+        return set([ngram for ref in refs for counts in ref for ngram in counts])
+
+    def add(self, refs):
+        '''Add a reference group (cooked references of one segment).'''
+        counts = self.counts
+        for ngram in self._ngrams(refs):
+            counts[ngram] = counts.get(ngram, 0.0) + 1
+        self.num_groups += 1
+
+    def add_held_out(self, refs):
+        '''Add the reference groups obtained by holding out each reference of a group in turn
+        (len(refs) groups of the remaining references, e.g. for leave-one-out scoring): n-grams
+        of two or more references are in all of them, n-grams of just one reference in all
+        but one.'''
+        num_refs = {}
+        for ref in refs:
+            for ngram in self._ngrams([ref]):
+                num_refs[ngram] = num_refs.get(ngram, 0) + 1
+        counts = self.counts
+        for ngram, num in num_refs.items():
+            counts[ngram] = counts.get(ngram, 0.0) + (len(refs) if num > 1 else len(refs) - 1)
+        self.num_groups += len(refs)
+
+    def remove(self, refs):
+        '''Remove a reference group that was added before.'''
+        counts = self.counts
+        for ngram in self._ngrams(refs):
+            if counts[ngram] > 1:
+                counts[ngram] -= 1
+            else:
+                del counts[ngram]
+        self.num_groups -= 1
+
+class CiderReferences(object):
+    """
+    Reference side of CIDEr, prepared once: document frequencies over all reference groups
+    and tf-idf vectors, norms and lengths of all references. Scoring does not modify it, so the
+    same object can be used to score any number of hypothesis sets (e.g. different systems).
+    """
+
+    def __init__(self, crefs, n=4, document_frequency=None, corpus=None):
+        '''
+        :param crefs: list of list of list of dict : cooked reference groups (see cook_refs)
+        :param n: int : number of ngrams for which (ngram) representation is calculated
+        :param document_frequency: DocumentFrequency : document frequencies for crefs, if \
+            already computed, or for a larger set of reference groups that crefs is a part of \
+            (e.g. a chunk of the data); must not change while this object is used
+        :param corpus: Corpus : the corpus crefs were encoded with, needed to cook test sentences \
+            with the cook method (optional)
+        '''
+        self.n = n
+        self.crefs = crefs
+        self.corpus = corpus
+        # compute idf
+        if document_frequency is None:
+            document_frequency = DocumentFrequency(crefs)
+        self.document_frequency = document_frequency
+        # compute log reference length (number of groups the document frequencies come from)
+        self.ref_len = np.log(float(document_frequency.num_groups))
+        # idf weights (ref_len - log(df)) of reference n-grams seen so far
+        self._idf = {}
+        # (vec, norm, length) for each reference of each group
+        self.vecs = [tuple(self.counts2vec(ref) for ref in refs) for refs in crefs]
+
+    def __len__(self):
+        return len(self.crefs)
+
+    def cook(self, test):
+        '''
+        Count n-grams of a test sentence using the references' vocabulary. Unlike cook_test, this
+        keeps nothing in memory (tokens unknown to the references can't match, so they aren't added
+        to the vocabulary), so any number of test sentences can be scored.
+        :param test: str or list of str : tokenized test sentence (string or list of tokens)
+        :return: list of dict : n-gram counts for each order (see cook_test)
+        '''
+        sent = self.corpus.lookup(test)
+        return [sent.counts(k) for k in range(1, self.n + 1)]
+
+    def counts2vec(self, cnts):
+        """
+        Function maps counts of ngram to vector of tfidf weights.
+        The function returns vec, an array of dictionary that store mapping of n-gram and tf-idf weights.
+        The n-th entry of array denotes length of n-grams.
+        :param cnts:
+        :return: vec (tuple of dict), norm (tuple of float), length (int)
+        """
+        idf_cache = self._idf
+        vec = []
+        length = 0
+        norm = []
+        for n in range(self.n):
+            vec_n = {}
+            norm_n = 0.0
+            for (ngram,term_freq) in cnts[n].items():
+                idf = idf_cache.get(ngram)
+                if idf is None:
+                    df = self.document_frequency.get(ngram, None)
+                    if df is None:
+                        # give word count 1 if it doesn't appear in reference corpus (log(1) = 0);
+                        # not cached, so unseen test n-grams don't pile up
+                        idf = self.ref_len
+                    else:
+                        idf = self.ref_len - np.log(max(1.0, df))
+                        idf_cache[ngram] = idf
+                # tf (term_freq) * idf (precomputed idf) for n-grams
+                vec_n[ngram] = float(term_freq)*idf
+                # compute norm for the vector.  the norm will be used for computing similarity
+                norm_n += pow(vec_n[ngram], 2)
+
+                if n == 1:
+                    length += term_freq
+            vec.append(vec_n)
+            norm.append(np.sqrt(norm_n))
+        return tuple(vec), tuple(norm), length
+
+    def sim(self, vec_hyp, vec_ref, norm_hyp, norm_ref, length_hyp, length_ref, sigma=6.0):
+        '''
+        Compute the cosine similarity of two vectors.
+        :param vec_hyp: array of dictionary for vector corresponding to hypothesis
+        :param vec_ref: array of dictionary for vector corresponding to reference
+        :param norm_hyp: array of float for vector corresponding to hypothesis
+        :param norm_ref: array of float for vector corresponding to reference
+        :param length_hyp: int containing length of hypothesis
+        :param length_ref: int containing length of reference
+        :param sigma: float : standard deviation of the gaussian length penalty
+        :return: array of score for each n-grams cosine similarity
+        '''
+        delta = float(length_hyp - length_ref)
+        # vrama91: added a length based gaussian penalty
+        penalty = np.e**(old_div(-(delta**2),(2*sigma**2)))
+        # measure consine similarity (accumulated in plain floats, same arithmetic as float64 arrays)
+        val = [0.0 for _ in range(self.n)]
+        for n in range(self.n):
+            # ngram
+            vec_ref_n = vec_ref[n]
+            val_n = 0.0
+            for (ngram,value) in vec_hyp[n].items():
+                # n-grams missing from the reference have zero weight
+                value_ref = vec_ref_n.get(ngram)
+                if value_ref is not None:
+                    # vrama91 : added clipping
+                    val_n += min(value, value_ref) * value_ref
+
+            if (norm_hyp[n] != 0) and (norm_ref[n] != 0):
+                val_n /= (norm_hyp[n]*norm_ref[n])
+
+            assert(not math.isnan(val_n))
+            val[n] = val_n * penalty
+        return np.array(val)
+
+    def ref_sims(self, test, index, sigma=6.0):
+        '''
+        Compute the similarities of a test sentence to each reference of a group.
+        :param test: list of dict : cooked test sentence (see cook_test)
+        :param index: int : position of the reference group
+        :param sigma: float : standard deviation of the gaussian length penalty
+        :return: list of arrays of per-n-gram similarities, one per reference
+        '''
+        # compute vector for test captions
+        vec, norm, length = self.counts2vec(test)
+        # vectors for ref captions are precomputed
+        return [self.sim(vec, vec_ref, norm, norm_ref, length, length_ref, sigma)
+                for vec_ref, norm_ref, length_ref in self.vecs[index]]
+
+    def score(self, test, index, sigma=6.0):
+        '''
+        Compute the CIDEr-D score of a test sentence against a reference group.
+        :param test: list of dict : cooked test sentence (see cook_test)
+        :param index: int : position of the reference group
+        :param sigma: float : standard deviation of the gaussian length penalty
+        :return: score (float)
+        '''
+        score = np.array([0.0 for _ in range(self.n)])
+        for sim in self.ref_sims(test, index, sigma):
+            score += sim
+        # change by vrama91 - mean of ngram scores, instead of sum
+        score_avg = np.mean(score)
+        # divide by number of references
+        score_avg /= len(self.vecs[index])
+        # multiply score by 10
+        score_avg *= 10.0
+        return score_avg
+
+    def held_out_score(self, index, ref_index, sigma=6.0):
+        '''
+        Compute the CIDEr-D score of a reference against the other references of its group
+        (leave-one-out), using the reference's precomputed vector as the test vector.
+        :param index: int : position of the reference group
+        :param ref_index: int : position of the held-out reference in the group
+        :param sigma: float : standard deviation of the gaussian length penalty
+        :return: score (float)
+        '''
+        vec, norm, length = self.vecs[index][ref_index]
+        score = np.array([0.0 for _ in range(self.n)])
+        for other_index, (vec_ref, norm_ref, length_ref) in enumerate(self.vecs[index]):
+            if other_index != ref_index:
+                score += self.sim(vec, vec_ref, norm, norm_ref, length, length_ref, sigma)
+        score_avg = np.mean(score)
+        score_avg /= len(self.vecs[index]) - 1
+        score_avg *= 10.0
+        return score_avg
+
+    def pair_scores(self, index, sigma=6.0):
+        '''
+        Compute the CIDEr-D scores of each reference of a group against each other reference
+        of the group as a single reference (e.g. for minimum Bayes risk scoring), using the
+        precomputed vectors.
+        :param index: int : position of the reference group
+        :param sigma: float : standard deviation of the gaussian length penalty
+        :return: list of list of float (for each reference, scores against the others in order)
+        '''
+        vecs = self.vecs[index]
+        return [[np.mean(self.sim(vec, vec_ref, norm, norm_ref, length, length_ref, sigma)) * 10.0
+                 for other_index, (vec_ref, norm_ref, length_ref) in enumerate(vecs) if other_index != ref_index]
+                for ref_index, (vec, norm, length) in enumerate(vecs)]
+
 
 class CiderScorer(object):
     """CIDEr scorer.
@@ -55,18 +309,24 @@ class CiderScorer(object):
 
     def copy(self):
         ''' copy the refs.'''
-        new = CiderScorer(n=self.n)
+        new = self.__class__(n=self.n, sigma=self.sigma, corpus=self.corpus)
         new.ctest = copy.copy(self.ctest)
         new.crefs = copy.copy(self.crefs)
+        new.document_frequency = self.document_frequency.copy()
         return new
 
-    def __init__(self, test=None, refs=None, n=4, sigma=6.0):
+    def __init__(self, test=None, refs=None, n=4, sigma=6.0, corpus=None):
         ''' singular instance '''
         self.n = n
         self.sigma = sigma
+        # encoded sentences are shared with any other scorer using the same corpus
+        self.corpus = corpus if corpus is not None else Corpus()
         self.crefs = []
         self.ctest = []
-        self.document_frequency = defaultdict(float)
+        # prepared references (CiderReferences), rebuilt only after references change
+        self.references = None
+        # updated with each added/removed reference group
+        self.document_frequency = DocumentFrequency()
         self.cook_append(test, refs)
         self.ref_len = None
 
@@ -74,9 +334,10 @@ class CiderScorer(object):
         '''called by constructor and __iadd__ to avoid creating new instances.'''
 
         if refs is not None:
-            self.crefs.append(cook_refs(refs))
+            self.crefs.append(cook_refs(refs, self.n, self.corpus))
+            self._add_doc_freq(self.crefs[-1])
             if test is not None:
-                self.ctest.append(cook_test(test)) ## N.B.: -1
+                self.ctest.append(cook_test(test, self.n, self.corpus)) ## N.B.: -1
             else:
                 self.ctest.append(None) # lens of crefs and ctest have to match
 
@@ -93,96 +354,55 @@ class CiderScorer(object):
         else:
             self.ctest.extend(other.ctest)
             self.crefs.extend(other.crefs)
+            for refs in other.crefs:
+                self._add_doc_freq(refs)
 
         return self
+
+    def remove(self, index):
+        '''
+        Remove the segment (test sentence & its reference group) at the given position.
+        :param index: int : position of the segment
+        '''
+        self.ctest.pop(index)
+        self._remove_doc_freq(self.crefs.pop(index))
+
+    def _add_doc_freq(self, refs):
+        self.document_frequency.add(refs)
+        self.references = None
+
+    def _remove_doc_freq(self, refs):
+        self.document_frequency.remove(refs)
+        self.references = None
+
+    def prepare_references(self):
+        '''
+        Compute document frequencies and reference vectors, unless they're already computed
+        for the current references.
+        :return: CiderReferences
+        '''
+        if self.references is None:
+            self.references = CiderReferences(self.crefs, self.n, self.document_frequency)
+        return self.references
+
     def compute_doc_freq(self):
         '''
         Compute term frequency for reference data.
         This will be used to compute idf (inverse document frequency later)
-        The term frequency is stored in the object
+        The term frequency is stored in the object; it is updated as references are
+        added or removed, so there's nothing left to compute here.
         :return: None
         '''
-        for refs in self.crefs:
-            # refs, k ref captions of one image
-            for ngram in set([ngram for ref in refs for (ngram,count) in ref.items()]):
-                self.document_frequency[ngram] += 1
-            # maxcounts[ngram] = max(maxcounts.get(ngram,0), count)
+        pass
 
     def compute_cider(self):
-        def counts2vec(cnts):
-            """
-            Function maps counts of ngram to vector of tfidf weights.
-            The function returns vec, an array of dictionary that store mapping of n-gram and tf-idf weights.
-            The n-th entry of array denotes length of n-grams.
-            :param cnts:
-            :return: vec (array of dict), norm (array of float), length (int)
-            """
-            vec = [defaultdict(float) for _ in range(self.n)]
-            length = 0
-            norm = [0.0 for _ in range(self.n)]
-            for (ngram,term_freq) in cnts.items():
-                # give word count 1 if it doesn't appear in reference corpus
-                df = np.log(max(1.0, self.document_frequency[ngram]))
-                # ngram index
-                n = len(ngram)-1
-                # tf (term_freq) * idf (precomputed idf) for n-grams
-                vec[n][ngram] = float(term_freq)*(self.ref_len - df)
-                # compute norm for the vector.  the norm will be used for computing similarity
-                norm[n] += pow(vec[n][ngram], 2)
-
-                if n == 1:
-                    length += term_freq
-            norm = [np.sqrt(n) for n in norm]
-            return vec, norm, length
-
-        def sim(vec_hyp, vec_ref, norm_hyp, norm_ref, length_hyp, length_ref):
-            '''
-            Compute the cosine similarity of two vectors.
-            :param vec_hyp: array of dictionary for vector corresponding to hypothesis
-            :param vec_ref: array of dictionary for vector corresponding to reference
-            :param norm_hyp: array of float for vector corresponding to hypothesis
-            :param norm_ref: array of float for vector corresponding to reference
-            :param length_hyp: int containing length of hypothesis
-            :param length_ref: int containing length of reference
-            :return: array of score for each n-grams cosine similarity
-            '''
-            delta = float(length_hyp - length_ref)
-            # measure consine similarity
-            val = np.array([0.0 for _ in range(self.n)])
-            for n in range(self.n):
-                # ngram
-                for (ngram,count) in vec_hyp[n].items():
-                    # vrama91 : added clipping
-                    val[n] += min(vec_hyp[n][ngram], vec_ref[n][ngram]) * vec_ref[n][ngram]
-
-                if (norm_hyp[n] != 0) and (norm_ref[n] != 0):
-                    val[n] /= (norm_hyp[n]*norm_ref[n])
-
-                assert(not math.isnan(val[n]))
-                # vrama91: added a length based gaussian penalty
-                val[n] *= np.e**(old_div(-(delta**2),(2*self.sigma**2)))
-            return val
-
-        # compute log reference length
-        self.ref_len = np.log(float(len(self.crefs)))
+        references = self.prepare_references()
+        self.ref_len = references.ref_len
 
         scores = []
-        for test, refs in zip(self.ctest, self.crefs):
-            # compute vector for test captions
-            vec, norm, length = counts2vec(test)
-            # compute vector for ref captions
-            score = np.array([0.0 for _ in range(self.n)])
-            for ref in refs:
-                vec_ref, norm_ref, length_ref = counts2vec(ref)
-                score += sim(vec, vec_ref, norm, norm_ref, length, length_ref)
-            # change by vrama91 - mean of ngram scores, instead of sum
-            score_avg = np.mean(score)
-            # divide by number of references
-            score_avg /= len(refs)
-            # multiply score by 10
-            score_avg *= 10.0
+        for index, test in enumerate(self.ctest):
             # append score of an image to the score list
-            scores.append(score_avg)
+            scores.append(references.score(test, index, self.sigma))
         return scores
 
     def compute_score(self, option=None, verbose=0):
@@ -194,4 +414,4 @@ class CiderScorer(object):
         score = self.compute_cider()
         # debug
         # print score
-        return np.mean(np.array(score)), np.array(score)
\ No newline at end of file
+        return np.mean(np.array(score)), np.array(score)
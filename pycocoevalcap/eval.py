@@ -6,18 +6,37 @@ __author__ = 'tylin'
 from .tokenizer.ptbtokenizer import PTBTokenizer
 from .bleu.bleu import Bleu
 from .meteor.meteor import Meteor
+from .meteor.meteor_approx import MeteorApprox
 from .rouge.rouge import Rouge
 from .cider.cider import Cider
+from metrics.corpus import Corpus
 import sys
 
+def create_meteor(meteor_args=None):
+    '''
+    Create the METEOR scorer.
+    :param meteor_args: dict : keyword arguments for Meteor (workers, mem, cache_file, bootstrap, alpha); \
+        approx=True selects the in-process approximation instead (bootstrap & alpha only)
+    :return: Meteor or MeteorApprox
+    '''
+    meteor_args = dict(meteor_args or {})
+    return MeteorApprox(**meteor_args) if meteor_args.pop('approx', False) else Meteor(**meteor_args)
+
 class COCOEvalCap(object):
-    def __init__(self, coco, cocoRes):
+    def __init__(self, coco, cocoRes, workers=1, pretokenized=False, meteor_args=None):
         self.evalImgs = []
         self.eval = {}
         self.imgToEval = {}
         self.coco = coco
         self.cocoRes = cocoRes
         self.params = {'image_id': coco.getImgIds()}
+        # number of parallel tokenizer processes
+        self.workers = workers
+        # captions are already PTB-tokenized, lowercased and without punctuation
+        self.pretokenized = pretokenized
+        # METEOR settings (keyword arguments for Meteor: workers, mem, cache_file, bootstrap, alpha;
+        # approx=True selects the in-process approximation instead)
+        self.meteor_args = meteor_args or {}
 
     def evaluate(self):
         imgIds = self.params['image_id']
@@ -31,19 +50,26 @@ class COCOEvalCap(object):
         # =================================================
         # Set up scorers
         # =================================================
-        print('tokenization...', file=sys.stderr)
-        tokenizer = PTBTokenizer()
-        gts  = tokenizer.tokenize(gts)
-        res = tokenizer.tokenize(res)
+        if self.pretokenized:
+            gts = {imgId: [' '.join(ann['caption'].split()) for ann in anns] for imgId, anns in gts.items()}
+            res = {imgId: [' '.join(ann['caption'].split()) for ann in anns] for imgId, anns in res.items()}
+        else:
+            print('tokenization...', file=sys.stderr)
+            tokenizer = PTBTokenizer(workers=self.workers)
+            gts  = tokenizer.tokenize(gts)
+            res = tokenizer.tokenize(res)
 
         # =================================================
         # Set up scorers
         # =================================================
         print('setting up scorers...', file=sys.stderr)
+        meteor = create_meteor(self.meteor_args)
+        # n-gram based scorers share one encoded corpus, each sentence is counted only once
+        corpus = Corpus()
         scorers = [
-            (Meteor(),"METEOR"),
-            (Rouge(), "ROUGE_L"),
-            (Cider(), "CIDEr")
+            (meteor,"METEOR"),
+            (Rouge(prune=True), "ROUGE_L"),
+            (Cider(corpus=corpus), "CIDEr")
         ]
 
         # =================================================
@@ -61,6 +87,8 @@ class COCOEvalCap(object):
                 self.setEval(score, method)
                 self.setImgToEvalImgs(scores, list(gts.keys()), method)
                 print("%s: %0.3f"%(method, score), file=sys.stderr)
+            if getattr(scorer, 'confidence_interval', None):
+                self.setEval(scorer.confidence_interval, method + '_CI')
         self.setEvalImgs()
 
     def setEval(self, score, method):
@@ -3,62 +3,309 @@
 # Python wrapper for METEOR implementation, by Xinlei Chen
 # Acknowledge Michael Denkowski for the generous discussion and help
 
+from builtins import zip
 from builtins import range
 from builtins import object
 import os
 import sys
 import subprocess
 import threading
+import numpy as np
+
+from .meteor_cache import MeteorCache
 
 # Assumes meteor-1.5.jar is in the same directory as meteor.py.  Change as needed.
 METEOR_JAR = 'meteor-1.5.jar'
 # print METEOR_JAR
 
+# maximum number of segment statistics sent to METEOR in a single EVAL line
+EVAL_CHUNK_SIZE = 500
+
+def parse_stats(stats):
+    """Convert a METEOR statistics line into a list of numbers."""
+    return [float(val) for val in stats.split()]
+
+def format_stats(values):
+    """Convert a list of numbers into a METEOR statistics line."""
+    return ' '.join('%d' % val if val == int(val) else repr(val) for val in values)
+
+def sum_stats(stats_list):
+    """Sum METEOR segment statistics (lists of numbers) element-wise. All METEOR statistics
+    are additive, so EVAL on the sum gives the same result as aggregating over all segments."""
+    total = None
+    for values in stats_list:
+        if total is None:
+            total = list(values)
+        else:
+            for idx, val in enumerate(values):
+                total[idx] += val
+    return total
+
 class Meteor(object):
 
-    def __init__(self):
-        self.meteor_cmd = ['java', '-jar', '-Xmx2G', METEOR_JAR, \
+    def __init__(self, workers=1, mem='2G', cache_file=None, bootstrap=0, alpha=0.05):
+        """Set up the METEOR wrapper, the subprocesses are only started once they are needed.
+        :param workers: int : number of METEOR processes to shard the segments across
+        :param mem: str : maximum Java heap size for each process (-Xmx)
+        :param cache_file: str : path to a persistent cache of segment statistics & scores (optional)
+        :param bootstrap: int : number of bootstrap resamples for a confidence interval (0 = none)
+        :param alpha: float : confidence interval significance level (default: 0.05 = 95% CI)
+        """
+        self.bootstrap = bootstrap
+        self.alpha = alpha
+        # bootstrap confidence interval of the last computed score (if bootstrap is set)
+        self.confidence_interval = None
+        self.meteor_cmd = ['java', '-jar', '-Xmx%s' % mem, METEOR_JAR, \
                 '-', '-', '-stdio', '-l', 'en', '-norm']
-        self.meteor_p = subprocess.Popen(self.meteor_cmd, \
-                cwd=os.path.dirname(os.path.abspath(__file__)), \
-                stdin=subprocess.PIPE, \
-                stdout=subprocess.PIPE, \
-                stderr=subprocess.PIPE)
+        self.workers = max(1, workers)
+        self.meteor_ps = []
+        # cached replies depend on METEOR version & options, not on the heap size
+        self.cache = None
+        if cache_file:
+            self.cache = MeteorCache(cache_file, ' '.join(self.meteor_cmd[3:]))
         # Used to guarantee thread safety
         self.lock = threading.Lock()
 
-    def compute_score(self, gts, res):
+    @property
+    def meteor_p(self):
+        # single segments are scored by the first process
+        return self._processes()[0]
+
+    def _processes(self):
+        if not self.meteor_ps:
+            self.meteor_ps = [subprocess.Popen(self.meteor_cmd, \
+                    cwd=os.path.dirname(os.path.abspath(__file__)), \
+                    stdin=subprocess.PIPE, \
+                    stdout=subprocess.PIPE, \
+                    stderr=subprocess.PIPE) for _ in range(self.workers)]
+        return self.meteor_ps
+
+    def compute_stats(self, gts, res):
+        """Compute METEOR statistics of all segments, e.g. to be stored and merged with
+        statistics from other runs (see score_stats).
+        :return: list of segment statistics (lists of numbers), in the order of gts keys
+        """
         assert(list(gts.keys()) == list(res.keys()))
         imgIds = list(gts.keys())
-        scores = []
-
-        eval_line = 'EVAL'
-        self.lock.acquire()
         for i in imgIds:
             assert(len(res[i]) == 1)
-            stat = self._stat(res[i][0], gts[i])
-            eval_line += ' ||| {}'.format(stat)
 
-        self.meteor_p.stdin.write('{}\n'.format(eval_line).encode('UTF-8'))
-        self.meteor_p.stdin.flush()
-        for i in range(0,len(imgIds)):
-            scores.append(float(self.meteor_p.stdout.readline().decode('UTF-8').strip()))
-        score = float(self.meteor_p.stdout.readline().strip())
-        self.lock.release()
+        self.lock.acquire()
+        try:
+            stats = [parse_stats(stat) for stat in self._stats([res[i][0] for i in imgIds], [gts[i] for i in imgIds])]
+        finally:
+            self.lock.release()
+        return stats
+
+    def score_stats(self, stats_list):
+        """Compute the corpus-level score from segment statistics (lists of numbers), with
+        a single EVAL of their sum -- the same as compute_score's corpus-level score.
+        :return: corpus-level score (float)
+        """
+        if not stats_list:
+            return 0.0
+        total_line = 'EVAL ||| ' + format_stats(sum_stats(stats_list))
+        self.lock.acquire()
+        try:
+            scores = self.cache.get([total_line]) if self.cache else {}
+            if total_line not in scores:
+                scores[total_line] = self._run_sharded([(total_line, 2)])[0][-1]
+                if self.cache:
+                    self.cache.put(scores)
+        finally:
+            self.lock.release()
+        return float(scores[total_line])
+
+    def compute_score(self, gts, res):
+        stats = self.compute_stats(gts, res)
+
+        self.lock.acquire()
+        try:
+            scores, score = self._eval(stats)
+            if self.bootstrap:
+                sample_scores = self._bootstrap_scores(stats, self.bootstrap)
+                self.confidence_interval = tuple(np.percentile(sample_scores, [50.0 * self.alpha,
+                                                                               100.0 - 50.0 * self.alpha]))
+        finally:
+            self.lock.release()
 
         return score, scores
 
+    def bootstrap_scores(self, gts, res, num_samples=1000, seed=None):
+        """Compute corpus-level METEOR scores for bootstrap resamples of the segments.
+        Segment statistics are computed only once, each resample is aggregated by summing them
+        and all resampled corpus scores are obtained in batched EVAL lines.
+        :param num_samples: int : number of bootstrap resamples
+        :param seed: int : random seed for the resampling (optional)
+        :return: array of corpus-level scores, one per resample
+        """
+        assert(list(gts.keys()) == list(res.keys()))
+        imgIds = list(gts.keys())
+
+        self.lock.acquire()
+        try:
+            stats = [parse_stats(stat) for stat in self._stats([res[i][0] for i in imgIds], [gts[i] for i in imgIds])]
+            sample_scores = self._bootstrap_scores(stats, num_samples, seed)
+        finally:
+            self.lock.release()
+        return sample_scores
+
+    def _bootstrap_scores(self, stats_list, num_samples, seed=None):
+        rng = np.random.RandomState(seed)
+        stats = np.array(stats_list, dtype=float)
+        num_segs = len(stats)
+        # resample counts matrix is (batch x segments), keep it reasonably small
+        batch_size = max(1, min(EVAL_CHUNK_SIZE, 10000000 // max(1, num_segs)))
+        requests = []
+        for start in range(0, num_samples, batch_size):
+            size = min(batch_size, num_samples - start)
+            counts = np.array([np.bincount(rng.randint(0, num_segs, num_segs), minlength=num_segs)
+                               for _ in range(size)], dtype=float)
+            # each resample is scored like a single segment with the summed statistics
+            requests.extend(self._eval_requests(np.dot(counts, stats).tolist()))
+        replies = self._run_sharded(requests)
+        return np.array([float(reply) for batch_replies in replies for reply in batch_replies[:-1]])
+
+    def eval_stats(self, stats_list):
+        """Compute the scores of statistics vectors that are sums over whole sets of segments
+        (e.g. resampled corpora), in batched EVAL lines.
+        :param stats_list: list of statistics vectors (lists of numbers)
+        :return: array of scores, one per vector
+        """
+        self.lock.acquire()
+        try:
+            replies = self._run_sharded(self._eval_requests(stats_list))
+        finally:
+            self.lock.release()
+        return np.array([float(reply) for batch_replies in replies for reply in batch_replies[:-1]])
+
+    def _eval_requests(self, stats_list):
+        """Create EVAL requests for the given statistics vectors, at most EVAL_CHUNK_SIZE per line
+        (replies: a score for each vector + aggregate)."""
+        requests = []
+        for start in range(0, len(stats_list), EVAL_CHUNK_SIZE):
+            chunk = stats_list[start:start + EVAL_CHUNK_SIZE]
+            requests.append((' ||| '.join(['EVAL'] + [format_stats(values) for values in chunk]), len(chunk) + 1))
+        return requests
+
     def method(self):
         return "METEOR"
 
-    def _stat(self, hypothesis_str, reference_list):
+    def _score_line(self, hypothesis_str, reference_list):
         # SCORE ||| reference 1 words ||| reference n words ||| hypothesis words
         hypothesis_str = hypothesis_str.replace('|||','').replace('  ',' ')
-        score_line = ' ||| '.join(('SCORE', ' ||| '.join(reference_list), hypothesis_str))
-        self.meteor_p.stdin.write('{}\n'.format(score_line).encode('UTF-8'))
-        self.meteor_p.stdin.flush()
-        res = self.meteor_p.stdout.readline().decode('UTF-8').strip()
-        return res
+        return ' ||| '.join(('SCORE', ' ||| '.join(reference_list), hypothesis_str))
+
+    def _stat(self, hypothesis_str, reference_list):
+        return self._communicate(self.meteor_p, [self._score_line(hypothesis_str, reference_list)], 1)[0]
+
+    def _stats(self, hypotheses, reference_lists):
+        """Get statistics lines for all segments. Only segments not found in the cache are scored,
+        SCORE lines are sent in a pipelined fashion and sharded across all METEOR processes."""
+        lines = [self._score_line(hypo, refs) for hypo, refs in zip(hypotheses, reference_lists)]
+        stats = self.cache.get(lines) if self.cache else {}
+        todo = [line for line in dict.fromkeys(lines) if line not in stats]
+        if todo:
+            new_stats = {line: replies[0] for line, replies in zip(todo, self._run_sharded([(line, 1) for line in todo]))}
+            if self.cache:
+                self.cache.put(new_stats)
+            stats.update(new_stats)
+        return [stats[line] for line in lines]
+
+    def _eval(self, stats_list):
+        """Compute per-segment scores and the corpus-level score from segment statistics
+        (lists of numbers). Scores not found in the cache are obtained with EVAL lines of bounded
+        size, the corpus-level score with a single EVAL of the summed statistics.
+        @return: a tuple (list of per-segment scores, corpus-level score)
+        """
+        if not stats_list:
+            return [], 0.0
+        seg_lines = ['EVAL ||| ' + format_stats(values) for values in stats_list]
+        total_line = 'EVAL ||| ' + format_stats(sum_stats(stats_list))
+        scores = self.cache.get(seg_lines + [total_line]) if self.cache else {}
+
+        todo = [line for line in dict.fromkeys(seg_lines) if line not in scores]
+        chunks = [todo[start:start + EVAL_CHUNK_SIZE] for start in range(0, len(todo), EVAL_CHUNK_SIZE)]
+        # replies: scores for each segment + aggregate for the chunk
+        requests = [(' ||| '.join(['EVAL'] + [line[len('EVAL ||| '):] for line in chunk]), len(chunk) + 1)
+                    for chunk in chunks]
+        if total_line not in scores:
+            requests.append((total_line, 2))
+        if requests:
+            replies = self._run_sharded(requests)
+            new_scores = {}
+            for chunk, chunk_replies in zip(chunks, replies):
+                new_scores.update(zip(chunk, chunk_replies))
+            if total_line not in scores:
+                new_scores[total_line] = replies[-1][-1]
+            if self.cache:
+                self.cache.put(new_scores)
+            scores.update(new_scores)
+
+        return [float(scores[line]) for line in seg_lines], float(scores[total_line])
+
+    def _run_sharded(self, requests):
+        """Split the given requests (pairs of line & number of expected reply lines) into
+        contiguous shards, one per METEOR process, and run them in parallel.
+        @return: list of reply lines for each request, in the original order
+        """
+        processes = self._processes()
+        num_shards = min(len(processes), len(requests))
+        if num_shards <= 1:
+            return self._run_requests(processes[0], requests)
+        bounds = [len(requests) * i // num_shards for i in range(num_shards + 1)]
+        threads = []
+        results = [None] * num_shards
+        errors = []
+
+        def run(shard_no):
+            try:
+                shard = requests[bounds[shard_no]:bounds[shard_no + 1]]
+                results[shard_no] = self._run_requests(processes[shard_no], shard)
+            except Exception as e:
+                errors.append(e)
+
+        for shard_no in range(num_shards):
+            threads.append(threading.Thread(target=run, args=(shard_no,)))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return [replies for shard_results in results for replies in shard_results]
+
+    def _run_requests(self, meteor_p, requests):
+        """Run the given requests on a single METEOR process, return list of reply lines for each."""
+        replies = self._communicate(meteor_p, [line for line, _ in requests],
+                                    sum(num_replies for _, num_replies in requests))
+        grouped = []
+        pos = 0
+        for _, num_replies in requests:
+            grouped.append(replies[pos:pos + num_replies])
+            pos += num_replies
+        return grouped
+
+    def _communicate(self, meteor_p, lines, num_replies):
+        """Send the given lines to METEOR from a writer thread while collecting the given number
+        of reply lines in this thread, so that neither side blocks on a full pipe."""
+        errors = []
+
+        def write():
+            try:
+                for line in lines:
+                    meteor_p.stdin.write('{}\n'.format(line).encode('UTF-8'))
+                meteor_p.stdin.flush()
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write)
+        writer.daemon = True
+        writer.start()
+        replies = [meteor_p.stdout.readline().decode('UTF-8').strip() for _ in range(num_replies)]
+        writer.join()
+        if errors:
+            raise errors[0]
+        return replies
 
     def _score(self, hypothesis_str, reference_list):
         self.lock.acquire()
@@ -81,7 +328,10 @@ class Meteor(object):
 
     def __del__(self):
         self.lock.acquire()
-        self.meteor_p.stdin.close()
-        self.meteor_p.kill()
-        self.meteor_p.wait()
+        for meteor_p in self.meteor_ps:
+            meteor_p.stdin.close()
+            meteor_p.kill()
+            meteor_p.wait()
+        if self.cache:
+            self.cache.close()
         self.lock.release()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+# In-process approximation of METEOR 1.5 (exact + stem matching only), no Java needed.
+#
+# Uses the default English parameters of the jar (alpha=0.85, beta=0.2, gamma=0.6, delta=0.75,
+# module weights exact=1.0, stem=0.6). Differences to the jar: no synonym & paraphrase matching,
+# Porter instead of Snowball stemmer, a short built-in function word list and a greedy
+# alignment instead of METEOR's beam search. Use it for quick iterations only; see
+# benchmark_meteor.py for a comparison against the jar.
+
+from __future__ import division
+from builtins import zip
+from builtins import range
+from builtins import object
+import threading
+
+import numpy as np
+
+# default English parameters of METEOR 1.5
+ALPHA = 0.85
+BETA = 0.20
+GAMMA = 0.60
+DELTA = 0.75
+# weights of the matching stages (exact, stem)
+STAGE_WEIGHTS = [1.0, 0.60]
+
+FUNCTION_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves 's n't 'm 're 've 'd 'll
+""".split())
+
+# positions of the individual statistics in the stats vectors
+(HYP_CONTENT, HYP_FUNCTION, REF_CONTENT, REF_FUNCTION, HYP_MATCHES, REF_MATCHES, CHUNKS,
+ HYP_CONTENT_WMATCHES, HYP_FUNCTION_WMATCHES, REF_CONTENT_WMATCHES, REF_FUNCTION_WMATCHES) = range(11)
+NUM_STATS = 11
+
+
+def _cons(word, i):
+    if word[i] in 'aeiou':
+        return False
+    if word[i] == 'y':
+        return i == 0 or not _cons(word, i - 1)
+    return True
+
+def _measure(stem):
+    """Number of VC sequences in the stem ([C](VC)^m[V])."""
+    forms = ''.join('c' if _cons(stem, i) else 'v' for i in range(len(stem)))
+    return forms.replace('vc', '*').count('*') if forms else 0
+
+def _has_vowel(stem):
+    return any(not _cons(stem, i) for i in range(len(stem)))
+
+def _double_cons(word):
+    return len(word) >= 2 and word[-1] == word[-2] and _cons(word, len(word) - 1)
+
+def _cvc(word):
+    return (len(word) >= 3 and _cons(word, len(word) - 3) and not _cons(word, len(word) - 2)
+            and _cons(word, len(word) - 1) and word[-1] not in 'wxy')
+
+def _replace(word, rules, min_measure):
+    for suffix, repl in rules:
+        if word.endswith(suffix):
+            stem = word[:len(word) - len(suffix)]
+            return stem + repl if _measure(stem) > min_measure else word
+    return word
+
+STEP2_RULES = [('ational', 'ate'), ('tional', 'tion'), ('enci', 'ence'), ('anci', 'ance'), ('izer', 'ize'),
+               ('bli', 'ble'), ('alli', 'al'), ('entli', 'ent'), ('eli', 'e'), ('ousli', 'ous'),
+               ('ization', 'ize'), ('ation', 'ate'), ('ator', 'ate'), ('alism', 'al'), ('iveness', 'ive'),
+               ('fulness', 'ful'), ('ousness', 'ous'), ('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble')]
+STEP3_RULES = [('icate', 'ic'), ('ative', ''), ('alize', 'al'), ('iciti', 'ic'), ('ical', 'ic'),
+               ('ful', ''), ('ness', '')]
+# longest suffixes first
+STEP4_SUFFIXES = sorted(['al', 'ance', 'ence', 'er', 'ic', 'able', 'ible', 'ant', 'ement', 'ment', 'ent', 'ion',
+                         'ou', 'ism', 'ate', 'iti', 'ous', 'ive', 'ize'], key=len, reverse=True)
+
+def stem(word):
+    """Porter stemmer (M.F. Porter, 1980)."""
+    if len(word) <= 2:
+        return word
+    # step 1a
+    if word.endswith('sses') or word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    # step 1b
+    if word.endswith('eed'):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+    else:
+        for suffix in ('ed', 'ing'):
+            if word.endswith(suffix) and _has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith('at') or word.endswith('bl') or word.endswith('iz'):
+                    word += 'e'
+                elif _double_cons(word) and word[-1] not in 'lsz':
+                    word = word[:-1]
+                elif _measure(word) == 1 and _cvc(word):
+                    word += 'e'
+                break
+    # step 1c
+    if word.endswith('y') and _has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+    # steps 2 & 3
+    word = _replace(word, STEP2_RULES, 0)
+    word = _replace(word, STEP3_RULES, 0)
+    # step 4 (longest matching suffix)
+    for suffix in STEP4_SUFFIXES:
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if _measure(base) > 1 and (suffix != 'ion' or (base and base[-1] in 'st')):
+                word = base
+            break
+    # step 5
+    if word.endswith('e'):
+        base = word[:-1]
+        if _measure(base) > 1 or (_measure(base) == 1 and not _cvc(base)):
+            word = base
+    if _measure(word) > 1 and _double_cons(word) and word.endswith('l'):
+        word = word[:-1]
+    return word
+
+
+def align(hyp, ref, stems):
+    """Greedy monotonic-preferring alignment of hypothesis & reference tokens, using exact matches
+    first and stem matches on the remaining tokens.
+    @return: list of (hyp position, ref position, stage) triples
+    """
+    ref_used = [False] * len(ref)
+    hyp_used = [False] * len(hyp)
+    alignment = []
+    def stem_key(tok):
+        if tok not in stems:
+            stems[tok] = stem(tok)
+        return stems[tok]
+
+    for stage, key in enumerate([lambda tok: tok, stem_key]):
+        ref_positions = {}
+        for j, tok in enumerate(ref):
+            if not ref_used[j]:
+                ref_positions.setdefault(key(tok), []).append(j)
+        last_ref = -1
+        for i, tok in enumerate(hyp):
+            if hyp_used[i]:
+                continue
+            candidates = [j for j in ref_positions.get(key(tok), []) if not ref_used[j]]
+            if not candidates:
+                continue
+            # continue the current chunk if possible, else take the nearest position after it
+            following = [j for j in candidates if j > last_ref]
+            j = min(following) if following else candidates[0]
+            ref_used[j] = hyp_used[i] = True
+            alignment.append((i, j, stage))
+            last_ref = j
+    return sorted(alignment)
+
+
+def segment_stats(hyp, ref, stems):
+    """Compute the METEOR statistics vector for a hypothesis & a single reference (token lists)."""
+    stats = [0.0] * NUM_STATS
+    for tok in hyp:
+        stats[HYP_FUNCTION if tok in FUNCTION_WORDS else HYP_CONTENT] += 1
+    for tok in ref:
+        stats[REF_FUNCTION if tok in FUNCTION_WORDS else REF_CONTENT] += 1
+    alignment = align(hyp, ref, stems)
+    prev = None
+    for i, j, stage in alignment:
+        weight = STAGE_WEIGHTS[stage]
+        stats[HYP_FUNCTION_WMATCHES if hyp[i] in FUNCTION_WORDS else HYP_CONTENT_WMATCHES] += weight
+        stats[REF_FUNCTION_WMATCHES if ref[j] in FUNCTION_WORDS else REF_CONTENT_WMATCHES] += weight
+        if prev is None or i != prev[0] + 1 or j != prev[1] + 1:
+            stats[CHUNKS] += 1
+        prev = (i, j)
+    stats[HYP_MATCHES] = stats[REF_MATCHES] = len(alignment)
+    return stats
+
+
+def stats_score(stats):
+    """Compute the METEOR score from a (possibly aggregated) statistics vector."""
+    hyp_len = DELTA * stats[HYP_CONTENT] + (1 - DELTA) * stats[HYP_FUNCTION]
+    ref_len = DELTA * stats[REF_CONTENT] + (1 - DELTA) * stats[REF_FUNCTION]
+    if not stats[HYP_MATCHES] or not hyp_len or not ref_len:
+        return 0.0
+    prec = (DELTA * stats[HYP_CONTENT_WMATCHES] + (1 - DELTA) * stats[HYP_FUNCTION_WMATCHES]) / hyp_len
+    rec = (DELTA * stats[REF_CONTENT_WMATCHES] + (1 - DELTA) * stats[REF_FUNCTION_WMATCHES]) / ref_len
+    if not prec or not rec:
+        return 0.0
+    fmean = prec * rec / (ALPHA * prec + (1 - ALPHA) * rec)
+    matches = (stats[HYP_MATCHES] + stats[REF_MATCHES]) / 2.0
+    # no fragmentation penalty for a complete match in a single chunk
+    hyp_total = stats[HYP_CONTENT] + stats[HYP_FUNCTION]
+    ref_total = stats[REF_CONTENT] + stats[REF_FUNCTION]
+    if stats[CHUNKS] == 1 and stats[HYP_MATCHES] == hyp_total == ref_total:
+        frag = 0.0
+    else:
+        frag = stats[CHUNKS] / matches
+    return (1 - GAMMA * frag ** BETA) * fmean
+
+
+class MeteorApprox(object):
+    """Drop-in replacement for the Meteor class (same compute_score interface), computed
+    in-process without Java."""
+
+    def __init__(self, bootstrap=0, alpha=0.05):
+        """Set up the scorer.
+        :param bootstrap: int : number of bootstrap resamples for a confidence interval (0 = none)
+        :param alpha: float : confidence interval significance level (default: 0.05 = 95% CI)
+        """
+        self.bootstrap = bootstrap
+        self.alpha = alpha
+        # bootstrap confidence interval of the last computed score (if bootstrap is set)
+        self.confidence_interval = None
+        # stem cache
+        self.stems = {}
+        # Used to guarantee thread safety
+        self.lock = threading.Lock()
+
+    def compute_stats(self, gts, res):
+        """Compute the statistics vectors of all segments (in the order of gts keys)."""
+        assert(list(gts.keys()) == list(res.keys()))
+        imgIds = list(gts.keys())
+
+        self.lock.acquire()
+        try:
+            stats_list = []
+            for i in imgIds:
+                assert(len(res[i]) == 1)
+                hyp = res[i][0].split()
+                # take the best-scoring reference, like METEOR does
+                stats_list.append(max((segment_stats(hyp, ref.split(), self.stems) for ref in gts[i]),
+                                      key=stats_score))
+        finally:
+            self.lock.release()
+        return stats_list
+
+    def score_stats(self, stats_list):
+        """Compute the corpus-level score from segment statistics vectors."""
+        # statistics are additive, the corpus-level score is computed from their sums
+        return stats_score([sum(column) for column in zip(*stats_list)]) if stats_list else 0.0
+
+    def eval_stats(self, stats_list):
+        """Compute the scores of (summed) statistics vectors, one per vector."""
+        return np.array([stats_score(stats) for stats in stats_list])
+
+    def compute_score(self, gts, res):
+        stats_list = self.compute_stats(gts, res)
+        scores = [stats_score(stats) for stats in stats_list]
+        if self.bootstrap:
+            sample_scores = self._bootstrap_scores(stats_list, self.bootstrap)
+            self.confidence_interval = tuple(np.percentile(sample_scores, [50.0 * self.alpha,
+                                                                           100.0 - 50.0 * self.alpha]))
+        return self.score_stats(stats_list), scores
+
+    def bootstrap_scores(self, gts, res, num_samples=1000, seed=None):
+        """Compute corpus-level scores for bootstrap resamples of the segments (see
+        Meteor.bootstrap_scores); each resample's score is computed from summed statistics."""
+        return self._bootstrap_scores(self.compute_stats(gts, res), num_samples, seed)
+
+    def _bootstrap_scores(self, stats_list, num_samples, seed=None):
+        rng = np.random.RandomState(seed)
+        stats = np.array(stats_list, dtype=float)
+        num_segs = len(stats)
+        # resample counts matrix is (batch x segments), keep it reasonably small
+        batch_size = max(1, 10000000 // max(1, num_segs))
+        sample_scores = []
+        for start in range(0, num_samples, batch_size):
+            size = min(batch_size, num_samples - start)
+            counts = np.array([np.bincount(rng.randint(0, num_segs, num_segs), minlength=num_segs)
+                               for _ in range(size)], dtype=float)
+            sample_scores.extend(self.eval_stats(np.dot(counts, stats)))
+        return np.array(sample_scores)
+
+    def method(self):
+        return "METEOR (approx.)"
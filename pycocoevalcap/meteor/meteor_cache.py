@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+# Persistent cache of METEOR replies, so that segments seen before do not have to go
+# through the METEOR jar again.
+
+from builtins import range
+from builtins import object
+import hashlib
+import sqlite3
+
+class MeteorCache(object):
+    """Persistent cache of METEOR replies (statistics for SCORE lines, scores for EVAL lines),
+    stored in an SQLite database. Entries are keyed by the request line and METEOR options,
+    so one cache file can be shared by different METEOR settings."""
+
+    # number of keys queried in a single SELECT (SQLite limits the number of parameters)
+    BATCH_SIZE = 500
+
+    def __init__(self, path, options):
+        """Open (or create) the cache.
+        :param path: str : path to the cache file
+        :param options: str : METEOR version & options which the replies depend on
+        """
+        self.options = options
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, reply TEXT)')
+        self.db.commit()
+
+    def _key(self, line):
+        return hashlib.sha1(u'{}\n{}'.format(self.options, line).encode('UTF-8')).hexdigest()
+
+    def get(self, lines):
+        """Look up the given request lines.
+        :return: dict (line: reply) for those of the lines that are cached
+        """
+        line_for_key = {self._key(line): line for line in lines}
+        keys = list(line_for_key)
+        found = {}
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            batch = keys[start:start + self.BATCH_SIZE]
+            query = 'SELECT key, reply FROM replies WHERE key IN ({})'.format(','.join('?' * len(batch)))
+            for key, reply in self.db.execute(query, batch):
+                found[line_for_key[key]] = reply
+        return found
+
+    def put(self, replies):
+        """Store the given replies (dict line: reply) in the cache."""
+        self.db.executemany('INSERT OR REPLACE INTO replies VALUES (?, ?)',
+                            [(self._key(line), reply) for line, reply in replies.items()])
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -7,11 +7,14 @@
 # Creation Date : 2015-01-07 06:03
 # Author : Ramakrishna Vedantam <vrama91@vt.edu>
 
+from builtins import zip
 from builtins import range
 from builtins import object
 import numpy as np
 import pdb
 
+from metrics.corpus import Corpus
+
 def my_lcs(string, sub):
     """
     Calculates longest common subsequence for a pair of tokenized strings
@@ -35,14 +38,56 @@ def my_lcs(string, sub):
 
     return lengths[len(string)][len(sub)]
 
+def split_tokens(sent):
+    """ROUGE-L tokenization: split on single spaces."""
+    return sent.split(" ")
+
+def lcs_masks(seq):
+    """
+    Precomputes match bitmasks of a sequence for the bit-parallel LCS computation
+    :param seq : sequence of tokens (e.g. integer token IDs)
+    :returns: masks (dict): token -> bitmask of its positions in seq
+    """
+    masks = {}
+    for i, tok in enumerate(seq):
+        masks[tok] = masks.get(tok, 0) | (1 << i)
+    return masks
+
+def lcs_length(masks, length, other):
+    """
+    Calculates longest common subsequence length of a sequence (given by its match bitmasks and length)
+    and another sequence, using the bit-parallel algorithm of Hyyro (2004) on Python integers.
+    Gives the same results as my_lcs with O(len(other) * length/w) work and O(length) memory.
+    :param masks : dict : output of lcs_masks for the first sequence
+    :param length : int : length of the first sequence
+    :param other : sequence of tokens : the other sequence
+    :returns: length of the longest common subsequence (int)
+    """
+    full = (1 << length) - 1
+    v = full
+    for tok in other:
+        u = v & masks.get(tok, 0)
+        if u:
+            v = ((v + u) | (v - u)) & full
+    # each zero bit in v is one LCS position
+    return length - bin(v).count('1')
+
 class Rouge(object):
     '''
     Class for computing ROUGE-L score for a set of candidate sentences for the MS COCO test set
 
     '''
-    def __init__(self):
+    def __init__(self, prune=False):
         # vrama91: updated the value below based on discussion with Hovey
         self.beta = 1.2
+        # integer-encoded tokens, each distinct sentence is split & encoded only once
+        self.corpus = Corpus(tokenize=split_tokens)
+        # skip exact LCS for references whose upper bounds can't improve max precision or recall
+        self.prune = prune
+        # number of exact LCS computations done and avoided by pruning, for the caller to report
+        # (reset by each compute_score call)
+        self.lcs_computed = 0
+        self.lcs_pruned = 0
 
     def calc_score(self, candidate, refs):
         """
@@ -57,25 +102,92 @@ class Rouge(object):
         rec = []
 
         # split into tokens
-        token_c = candidate[0].split(" ")
+        sent_c = self.corpus.sentence(candidate[0])
+        token_c = sent_c.ids
+        masks_c = lcs_masks(token_c)
+        sents_r = [self.corpus.sentence(reference) for reference in refs]
+        bounds = None
+        if self.prune:
+            # bag-of-words overlap is an upper bound on the LCS length;
+            # references with the highest bounds go first, to raise the maxima early
+            counts_c = sent_c.counts(1)
+            bounds = [sum(min(cnt, sent_r.counts(1).get(tok, 0)) for tok, cnt in counts_c.items())
+                      for sent_r in sents_r]
+            sents_r = [sent_r for _, sent_r in sorted(zip(bounds, sents_r), key=lambda x: (-x[0], len(x[1])))]
+            bounds.sort(reverse=True)
     	
-        for reference in refs:
-            # split into tokens
-            token_r = reference.split(" ")
+        for ref_no, sent_r in enumerate(sents_r):
+            token_r = sent_r.ids
+            if bounds is not None and prec and (bounds[ref_no]/float(len(token_c)) <= max(prec) and
+                                                bounds[ref_no]/float(len(token_r)) <= max(rec)):
+                self.lcs_pruned += 1
+                continue
             # compute the longest common subsequence
-            lcs = my_lcs(token_r, token_c)
+            lcs = lcs_length(masks_c, len(token_c), token_r)
+            self.lcs_computed += 1
             prec.append(lcs/float(len(token_c)))
             rec.append(lcs/float(len(token_r)))
 
-        prec_max = max(prec)
-        rec_max = max(rec)
+        return self.f_score(max(prec), max(rec))
 
+    def f_score(self, prec_max, rec_max):
+        """
+        Combine the maximum LCS precision & recall over references into the ROUGE-L score
+        :param prec_max: float : maximum precision
+        :param rec_max: float : maximum recall
+        :returns score: float
+        """
         if(prec_max!=0 and rec_max !=0):
             score = ((1 + self.beta**2)*prec_max*rec_max)/float(rec_max + self.beta**2*prec_max)
         else:
             score = 0.0
         return score
 
+    def lcs_matrix(self, sents):
+        """
+        Compute LCS lengths of all pairs of sentences; LCS is symmetric, so it's computed only once for each pair
+        :param sents: list of str : tokenized sentences
+        :returns tokens, lcs: list of token ID sequences, list of list of int (LCS lengths, 0 on the diagonal)
+        """
+        tokens = [self.corpus.sentence(sent).ids for sent in sents]
+        lcs = [[0] * len(sents) for _ in sents]
+        for i, token_i in enumerate(tokens):
+            masks_i = lcs_masks(token_i)
+            for j in range(i + 1, len(sents)):
+                lcs[i][j] = lcs[j][i] = lcs_length(masks_i, len(token_i), tokens[j])
+                self.lcs_computed += 1
+        return tokens, lcs
+
+    def held_out_scores(self, refs):
+        """
+        Compute ROUGE-L scores of each reference against the other references of the image
+        (leave-one-out); LCS is symmetric, so it's computed only once for each pair of references
+        :param refs: list of str : COCO reference sentences for the image (at least 2)
+        :returns scores: list of float (ROUGE-L score of each reference)
+        """
+        assert(len(refs)>1)
+        tokens, lcs = self.lcs_matrix(refs)
+
+        scores = []
+        for i, token_i in enumerate(tokens):
+            others = [j for j in range(len(refs)) if j != i]
+            scores.append(self.f_score(max(lcs[i][j]/float(len(token_i)) for j in others),
+                                       max(lcs[i][j]/float(len(tokens[j])) for j in others)))
+        return scores
+
+    def pair_scores(self, sents):
+        """
+        Compute ROUGE-L scores of each sentence against each other sentence as a single reference
+        (e.g. for minimum Bayes risk scoring); LCS is computed only once for each pair
+        :param sents: list of str : tokenized sentences (at least 2)
+        :returns scores: list of list of float (for each sentence, scores against the others in order)
+        """
+        assert(len(sents)>1)
+        tokens, lcs = self.lcs_matrix(sents)
+        return [[self.f_score(lcs[i][j]/float(len(token_i)), lcs[i][j]/float(len(tokens[j])))
+                 for j in range(len(sents)) if j != i]
+                for i, token_i in enumerate(tokens)]
+
     def compute_score(self, gts, res):
         """
         Computes Rouge-L score given a set of reference and candidate sentences for the dataset
@@ -86,6 +198,8 @@ class Rouge(object):
         """
         assert(list(gts.keys()) == list(res.keys()))
         imgIds = list(gts.keys())
+        self.lcs_computed = 0
+        self.lcs_pruned = 0
 
         score = []
         for id in imgIds:
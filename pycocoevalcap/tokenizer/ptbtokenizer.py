@@ -16,6 +16,8 @@ import sys
 import subprocess
 import tempfile
 import itertools
+import re
+from concurrent.futures import ThreadPoolExecutor
 
 # path to the stanford corenlp jar
 STANFORD_CORENLP_3_4_1_JAR = 'stanford-corenlp-3.4.1.jar'
@@ -24,39 +26,43 @@ STANFORD_CORENLP_3_4_1_JAR = 'stanford-corenlp-3.4.1.jar'
 PUNCTUATIONS = ["''", "'", "``", "`", "-LRB-", "-RRB-", "-LCB-", "-RCB-", \
         ".", "?", "!", ",", ":", "-", "--", "...", ";"]
 
+# characters which PTBTokenizer treats as line breaks (one output line per input line is expected,
+# so these are replaced by spaces within captions)
+LINE_BREAKS = re.compile('[\n\r\x0b\x0c\u2028\u2029]')
+
+# characters which PTBTokenizer always splits off the end of a word
+TRAILING_PUNCTUATION = '.?!,:;\'"'
+
 class PTBTokenizer(object):
     """Python wrapper of Stanford PTBTokenizer"""
 
-    def tokenize(self, captions_for_image):
-        cmd = ['java', '-cp', STANFORD_CORENLP_3_4_1_JAR, \
-                'edu.stanford.nlp.process.PTBTokenizer', \
-                '-preserveLines', '-lowerCase']
+    def __init__(self, workers=1, min_shard_size=10000):
+        # number of tokenizer processes run in parallel on large inputs
+        self.workers = workers
+        # minimum number of sentences per process (starting a JVM is expensive)
+        self.min_shard_size = min_shard_size
 
+    def tokenize(self, captions_for_image):
         # ======================================================
         # prepare data for PTB Tokenizer
         # ======================================================
         final_tokenized_captions_for_image = {}
         image_id = [k for k, v in list(captions_for_image.items()) for _ in range(len(v))]
-        sentences = '\n'.join([c['caption'].replace('\n', ' ') for k, v in list(captions_for_image.items()) for c in v])
+        sentences = [LINE_BREAKS.sub(' ', c['caption']) for k, v in list(captions_for_image.items()) for c in v]
 
         # ======================================================
-        # save sentences to temporary file
+        # tokenize sentences, split into shards for parallel processing
         # ======================================================
-        path_to_jar_dirname=os.path.dirname(os.path.abspath(__file__))
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, dir=path_to_jar_dirname)
-        tmp_file.write(sentences.encode('UTF-8'))
-        tmp_file.close()
-
-        # ======================================================
-        # tokenize sentence
-        # ======================================================
-        cmd.append(os.path.basename(tmp_file.name))
-        p_tokenizer = subprocess.Popen(cmd, cwd=path_to_jar_dirname, \
-                stdout=subprocess.PIPE, encoding='UTF-8')
-        token_lines = p_tokenizer.communicate(input=sentences.rstrip())[0]
-        lines = token_lines.split('\n')
-        # remove temp file
-        os.remove(tmp_file.name)
+        num_shards = max(1, min(self.workers, len(sentences) // self.min_shard_size))
+        bounds = [len(sentences) * i // num_shards for i in range(num_shards + 1)]
+        shards = [sentences[start:end] for start, end in zip(bounds, bounds[1:])]
+        if num_shards == 1:
+            lines = self._tokenize_shard(shards[0])
+        else:
+            # each shard runs in its own JVM, threads just wait for them
+            with ThreadPoolExecutor(max_workers=num_shards) as pool:
+                lines = [line for shard_lines in pool.map(self._tokenize_shard, shards)
+                         for line in shard_lines]
 
         # ======================================================
         # create dictionary for tokenized captions
@@ -69,3 +75,52 @@ class PTBTokenizer(object):
             final_tokenized_captions_for_image[k].append(tokenized_caption)
 
         return final_tokenized_captions_for_image
+
+    @staticmethod
+    def is_tokenized(sentence):
+        """Quick check if a sentence looks like PTBTokenizer output (lowercased, tokens
+        separated by single spaces, no punctuation tokens or trailing punctuation)."""
+        if sentence != sentence.lower() or sentence != ' '.join(sentence.split()):
+            return False
+        return not any(w in PUNCTUATIONS or (len(w) > 1 and w[-1] in TRAILING_PUNCTUATION)
+                       for w in sentence.split(' '))
+
+    def _tokenize_shard(self, sentences):
+        """Run the PTB Tokenizer on a list of sentences, return a list of output lines
+        (exactly one per sentence, in the same order). Raises a RuntimeError if the tokenizer
+        fails or its output doesn't have one line per sentence."""
+        if not sentences:
+            return []
+        cmd = ['java', '-cp', STANFORD_CORENLP_3_4_1_JAR, \
+                'edu.stanford.nlp.process.PTBTokenizer', \
+                '-preserveLines', '-lowerCase']
+        num_sents = len(sentences)
+        sentences = '\n'.join(sentences)
+
+        # ======================================================
+        # save sentences to temporary file
+        # ======================================================
+        path_to_jar_dirname=os.path.dirname(os.path.abspath(__file__))
+        tmp_file = tempfile.NamedTemporaryFile(delete=False, dir=path_to_jar_dirname)
+        tmp_file.write(sentences.encode('UTF-8'))
+        tmp_file.close()
+
+        # ======================================================
+        # tokenize sentence
+        # ======================================================
+        cmd.append(os.path.basename(tmp_file.name))
+        try:
+            p_tokenizer = subprocess.Popen(cmd, cwd=path_to_jar_dirname, \
+                    stdout=subprocess.PIPE, encoding='UTF-8')
+            token_lines = p_tokenizer.communicate(input=sentences.rstrip())[0]
+        finally:
+            # remove temp file
+            os.remove(tmp_file.name)
+        if p_tokenizer.returncode != 0:
+            raise RuntimeError('PTBTokenizer failed with exit code %d' % p_tokenizer.returncode)
+
+        # the output has the same line breaks as the input (no trailing newline)
+        lines = token_lines.split('\n')
+        if len(lines) != num_sents:
+            raise RuntimeError('PTBTokenizer returned %d lines for %d sentences' % (len(lines), num_sents))
+        return lines
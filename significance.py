@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare two or more systems' outputs on the same references: corpus-level BLEU, NIST, METEOR,
+ROUGE-L & CIDEr with bootstrap confidence intervals, and pairwise significance tests (paired
+bootstrap resampling & approximate randomization), see metrics/significance.py.
+"""
+
+from __future__ import print_function
+from builtins import zip
+from argparse import ArgumentParser
+import sys
+import time
+
+from measure_scores import (load_data, tokenize_coco, create_mteval_corpus, add_pretokenized_args, get_pretokenized,
+                            add_meteor_args, get_meteor_args)
+from metrics.significance import (METRICS, SegmentStats, SignificanceTester, bootstrap_p_values,
+                                  confidence_intervals)
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.eval import create_meteor
+
+
+def compute_system_stats(data_ref, systems_data, workers=1, pretokenized=(), meteor=None, perl_compat=True):
+    """Compute per-segment statistics for all systems (all outputs are tokenized at once)."""
+    coco_ref, coco_sys = tokenize_coco(data_ref, [sent for data_sys in systems_data for sent in data_sys],
+                                       workers, 'ptb' in pretokenized)
+    cider_refs = Cider().prepare_references(dict(enumerate(coco_ref)))
+    system_stats = []
+    for sys_no, data_sys in enumerate(systems_data):
+        system_stats.append(SegmentStats.compute(data_ref, data_sys, coco_ref,
+                                                 coco_sys[sys_no * len(data_ref):(sys_no + 1) * len(data_ref)],
+                                                 meteor, create_mteval_corpus('mteval' in pretokenized, perl_compat),
+                                                 perl_compat, cider_refs))
+    return system_stats
+
+
+def print_results(sys_names, observed, intervals, p_boot, p_ar, alpha):
+    """Print out scores with confidence intervals & pairwise p-values."""
+    if intervals is not None:
+        print('Scores with %g%% bootstrap confidence intervals:' % (100 * (1 - alpha)))
+    for metric in METRICS:
+        print('%s:' % metric)
+        for sys_no, sys_name in enumerate(sys_names):
+            line = '  %-30s %.4f' % (sys_name, observed[metric][sys_no])
+            if intervals is not None:
+                line += ' (CI: %.4f-%.4f)' % tuple(intervals[metric][sys_no])
+            print(line)
+        for (i, j), _ in sorted((p_boot or p_ar)[metric].items()):
+            line = '  %s vs. %s: %+.4f' % (sys_names[i], sys_names[j], observed[metric][i] - observed[metric][j])
+            if p_boot is not None:
+                line += ', paired bootstrap p = %.4f' % p_boot[metric][(i, j)]
+            if p_ar is not None:
+                line += ', approx. randomization p = %.4f' % p_ar[metric][(i, j)]
+            print(line)
+        print()
+
+
+if __name__ == '__main__':
+    ap = ArgumentParser(description='E2E Challenge evaluation -- significance tests for 2+ systems')
+    ap.add_argument('-n', '--samples', type=int, default=10000,
+                    help='Number of bootstrap resamples / randomization trials (default: 10000)')
+    ap.add_argument('-m', '--method', type=str, default='bootstrap,ar',
+                    help='Comma-separated tests to run: bootstrap (paired bootstrap), ar (approximate ' +
+                    'randomization). Default: both')
+    ap.add_argument('-a', '--alpha', type=float, default=0.05,
+                    help='Significance level for confidence intervals (default: 0.05)')
+    ap.add_argument('--seed', type=int, default=None, help='Random seed (optional)')
+    ap.add_argument('-w', '--workers', type=int, default=1,
+                    help='Number of parallel resampling & tokenization processes')
+    ap.add_argument('-p', '--python', action='store_true',
+                    help='Use Python implementation of MTEval with proper NIST for variable numbers of ' +
+                    'references, instead of reproducing the Perl script\'s results')
+    add_pretokenized_args(ap)
+    add_meteor_args(ap, bootstrap=False)
+    ap.add_argument('ref_file', type=str, help='References file (see measure_scores.py)')
+    ap.add_argument('sys_files', type=str, nargs='+', help='System output files to compare (at least 2)')
+    args = ap.parse_args()
+    methods = [method for method in args.method.split(',') if method]
+    if not methods or any(method not in ['bootstrap', 'ar'] for method in methods):
+        ap.error('Unknown test method: %s' % args.method)
+    pretokenized = get_pretokenized(ap, args)
+    if len(args.sys_files) < 2:
+        ap.error('Need at least 2 system output files')
+
+    data_ref = None
+    systems_data = []
+    for sys_file in args.sys_files:
+        _, sys_ref, data_sys = load_data(args.ref_file, sys_file)
+        if data_ref is not None and sys_ref != data_ref:
+            ap.error('References for %s do not match the other systems\'' % sys_file)
+        data_ref = sys_ref
+        systems_data.append(data_sys)
+
+    meteor_args = get_meteor_args(ap, args)
+    meteor = create_meteor(meteor_args)
+    system_stats = compute_system_stats(data_ref, systems_data, args.workers, pretokenized, meteor,
+                                        not args.python)
+
+    start = time.time()
+    tester = SignificanceTester(system_stats, meteor, args.workers)
+    observed = tester.observed()
+    intervals = p_boot = p_ar = None
+    if 'bootstrap' in methods:
+        samples = tester.bootstrap(args.samples, args.seed)
+        intervals = confidence_intervals(samples, args.alpha)
+        p_boot = bootstrap_p_values(observed, samples)
+    if 'ar' in methods:
+        p_ar = tester.approx_randomization(args.samples, args.seed)
+    print('Significance tests took %.2f s' % (time.time() - start), file=sys.stderr)
+    print_results(args.sys_files, observed, intervals, p_boot, p_ar, args.alpha)
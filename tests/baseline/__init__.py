@@ -0,0 +1,5 @@
+"""
+Unmodified copies of the original scorer implementations (before the n-gram corpus, vectorization
+and incremental statistics were introduced), used as the reference the current implementations
+are compared with in the tests. Do not change these.
+"""
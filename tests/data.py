@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fixed test inputs: the E2E example inputs and randomized multi-reference data (1-6 references
+per segment, including empty outputs and repeated n-grams, which exercise clipping).
+"""
+
+from __future__ import unicode_literals
+from builtins import range
+import os
+import random
+
+from measure_scores import load_data
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example-inputs')
+EXAMPLE_REF = os.path.join(EXAMPLE_DIR, 'devel-conc.txt')
+EXAMPLE_SYS = os.path.join(EXAMPLE_DIR, 'baseline-output.txt')
+
+WORDS = 'a b c d e f g h The the of in near city centre , . Eagle eagle'.split()
+
+
+def example_data():
+    """E2E example inputs: (references, outputs), as in measure_scores."""
+    _, data_ref, data_sys = load_data(EXAMPLE_REF, EXAMPLE_SYS)
+    return data_ref, data_sys
+
+
+def random_sentence(rng, min_len=1, max_len=15):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_len, max_len)))
+
+
+def random_data(num_segs=200, seed=1, min_sys_len=0):
+    """Random data: (references, outputs), segments with 1-6 references."""
+    rng = random.Random(seed)
+    data_ref, data_sys = [], []
+    for _ in range(num_segs):
+        data_ref.append([random_sentence(rng) for _ in range(rng.randint(1, 6))])
+        data_sys.append(random_sentence(rng, min_sys_len))
+    return data_ref, data_sys
+
+
+def lowercase(data_ref, data_sys):
+    """Lowercased data, as the COCO scorers get it after PTB tokenization."""
+    return [[ref.lower() for ref in refs] for refs in data_ref], [sent.lower() for sent in data_sys]
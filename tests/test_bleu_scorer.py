@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the COCO BLEU scorer (pycocoevalcap.bleu.bleu_scorer) against the original
+dict-based implementation: all scores must be bit-identical."""
+
+from __future__ import unicode_literals
+from builtins import zip
+import unittest
+
+from pycocoevalcap.bleu.bleu_scorer import BleuScorer
+from tests.baseline import bleu_scorer as baseline_bleu_scorer
+from tests.data import example_data, random_data, lowercase
+
+OPTIONS = ['closest', 'shortest', 'average']
+
+
+def fill(scorer, data_ref, data_sys):
+    for refs, sent in zip(data_ref, data_sys):
+        scorer += (sent, refs)
+    return scorer
+
+
+class BleuScorerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = [lowercase(*example_data()), lowercase(*random_data(1000))]
+
+    def test_scores_match_baseline(self):
+        for data in self.datasets:
+            for option in OPTIONS:
+                score, scores = fill(baseline_bleu_scorer.BleuScorer(n=4), *data).compute_score(option=option)
+                new_score, new_scores = fill(BleuScorer(n=4), *data).compute_score(option=option)
+                self.assertEqual(new_score, score)
+                self.assertEqual(new_scores, scores)
+
+    def test_all_options_at_once(self):
+        for data in self.datasets:
+            results = fill(BleuScorer(n=4), *data).compute_scores()
+            for option in OPTIONS:
+                self.assertEqual(results[option],
+                                 fill(baseline_bleu_scorer.BleuScorer(n=4), *data).compute_score(option=option))
+
+    def test_special_reflen(self):
+        data_ref, data_sys = self.datasets[1]
+        for special_reflen in [5, 12.5]:
+            scorer = fill(BleuScorer(n=4, special_reflen=special_reflen), data_ref, data_sys)
+            baseline = fill(baseline_bleu_scorer.BleuScorer(n=4, special_reflen=special_reflen), data_ref, data_sys)
+            self.assertEqual(scorer.compute_score(), baseline.compute_score())
+
+
+if __name__ == '__main__':
+    unittest.main()
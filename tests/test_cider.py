@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for CIDEr-D (pycocoevalcap.cider) against the original implementation."""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+import unittest
+
+import numpy as np
+
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.cider.cider_scorer import CiderScorer
+from tests.baseline import cider_scorer as baseline_cider_scorer
+from tests.data import example_data, random_data, lowercase
+
+
+def coco_dicts(data_ref, data_sys):
+    """References & outputs as compute_score takes them."""
+    return dict(enumerate(data_ref)), {inst_no: [sent] for inst_no, sent in enumerate(data_sys)}
+
+
+def baseline_scores(gts, res):
+    scorer = baseline_cider_scorer.CiderScorer(n=4, sigma=6.0)
+    for inst_no in gts:
+        scorer += (res[inst_no][0], gts[inst_no])
+    return scorer.compute_score()
+
+
+class CiderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = [lowercase(*example_data()), lowercase(*random_data())]
+
+    def test_scores_match_baseline(self):
+        for data in self.datasets:
+            gts, res = coco_dicts(*data)
+            score, scores = baseline_scores(gts, res)
+            new_score, new_scores = Cider().compute_score(gts, res)
+            self.assertEqual(new_score, score)
+            self.assertEqual(new_scores.tolist(), scores.tolist())
+
+    def test_prepared_references(self):
+        data_ref, _ = self.datasets[1]
+        gts = dict(enumerate(data_ref))
+        cider = Cider()
+        references = cider.prepare_references(gts)
+        vocab_size = len(references.corpus.vocab)
+        # several systems, including outputs with words unseen in the references
+        for seed in range(2, 5):
+            _, data_sys = random_data(len(data_ref), seed)
+            _, res = coco_dicts(data_ref, [sent + ' unseen%d' % seed for sent in data_sys])
+            score, scores = baseline_scores(gts, res)
+            new_score, new_scores = cider.compute_score(gts, res, references)
+            self.assertEqual(new_score, score)
+            self.assertEqual(new_scores.tolist(), scores.tolist())
+        self.assertEqual(len(references.corpus.vocab), vocab_size)
+        self.assertRaises(ValueError, cider.compute_score, {0: data_ref[0]}, {0: ['a']}, references)
+
+    def test_incremental_document_frequency(self):
+        data_ref, data_sys = self.datasets[1]
+        scorer = CiderScorer(n=4, sigma=6.0)
+        for refs, sent in zip(data_ref, data_sys):
+            scorer += (sent, refs)
+        scorer.compute_score()
+        # remove every third segment, add some back at the end
+        removed = list(range(0, len(data_ref), 3))
+        for inst_no in reversed(removed):
+            scorer.remove(inst_no)
+        kept = [inst_no for inst_no in range(len(data_ref)) if inst_no not in removed] + removed[:10]
+        for inst_no in removed[:10]:
+            scorer += (data_sys[inst_no], data_ref[inst_no])
+        score, scores = baseline_scores({pos: data_ref[inst_no] for pos, inst_no in enumerate(kept)},
+                                        {pos: [data_sys[inst_no]] for pos, inst_no in enumerate(kept)})
+        new_score, new_scores = scorer.compute_score()
+        self.assertEqual(new_score, score)
+        self.assertEqual(new_scores.tolist(), scores.tolist())
+
+    def test_vectorized(self):
+        # the order of summation differs, so the scores are equal up to rounding
+        for data in self.datasets:
+            gts, res = coco_dicts(*data)
+            score, scores = baseline_scores(gts, res)
+            new_score, new_scores = Cider(vectorized=True).compute_score(gts, res)
+            np.testing.assert_allclose(new_score, score, rtol=1e-12)
+            np.testing.assert_allclose(new_scores, scores, rtol=1e-12, atol=1e-15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the CIDEr-D reward object (pycocoevalcap.cider.cider_reward) against the original
+CIDEr-D implementation scoring the whole corpus."""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+import random
+import unittest
+
+from pycocoevalcap.cider.cider_reward import CiderReward
+from tests.baseline import cider_scorer as baseline_cider_scorer
+from tests.data import random_data, random_sentence, lowercase
+
+
+def baseline_scores(gts, hyps):
+    """Per-segment scores of the original CIDEr-D (hypotheses given for each reference ID)."""
+    scorer = baseline_cider_scorer.CiderScorer(n=4, sigma=6.0)
+    for ref_id in gts:
+        scorer += (hyps[ref_id], gts[ref_id])
+    _, scores = scorer.compute_score()
+    return dict(zip(gts.keys(), scores.tolist()))
+
+
+class CiderRewardTest(unittest.TestCase):
+
+    def setUp(self):
+        data_ref, data_sys = lowercase(*random_data())
+        self.gts = {'mr%d' % inst_no: refs for inst_no, refs in enumerate(data_ref)}
+        self.hyps = {'mr%d' % inst_no: sent for inst_no, sent in enumerate(data_sys)}
+        self.reward = CiderReward(self.gts)
+
+    def test_batch_scores(self):
+        expected = baseline_scores(self.gts, self.hyps)
+        # batches in any order, with repeated IDs
+        rng = random.Random(1)
+        ref_ids = [rng.choice(list(self.gts.keys())) for _ in range(500)]
+        scores = self.reward(ref_ids, [self.hyps[ref_id] for ref_id in ref_ids])
+        self.assertEqual(scores.tolist(), [expected[ref_id] for ref_id in ref_ids])
+        self.assertEqual(self.reward.score('mr0', self.hyps['mr0'].split()), expected['mr0'])
+
+    def test_unseen_words(self):
+        rng = random.Random(2)
+        hyps = {ref_id: random_sentence(rng).lower() + ' unseen%d unseen' % hyp_no
+                for hyp_no, ref_id in enumerate(self.gts)}
+        expected = baseline_scores(self.gts, hyps)
+        cache_size, vocab_size = len(self.reference_idf()), len(self.reward.vocab)
+        scores = self.reward(list(hyps.keys()), list(hyps.values()))
+        self.assertEqual(scores.tolist(), [expected[ref_id] for ref_id in hyps])
+        # nothing is kept for the unseen words
+        self.assertEqual(len(self.reference_idf()), cache_size)
+        self.assertEqual(len(self.reward.vocab), vocab_size)
+
+    def reference_idf(self):
+        return self.reward.references._idf
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the shared integer-encoded corpus (metrics.corpus)."""
+
+from __future__ import unicode_literals
+import unittest
+from unittest import mock
+
+from metrics import corpus as corpus_module
+from metrics.corpus import Corpus, Vocabulary, ngram_order
+from pycocoevalcap.cider import cider_scorer
+from tests.baseline import cider_scorer as baseline_cider_scorer
+from tests.data import example_data, random_data
+
+
+class CorpusTest(unittest.TestCase):
+
+    def test_counts_match_baseline(self):
+        for data_ref, data_sys in [example_data(), random_data()]:
+            corpus = Corpus()
+            for sent in [ref for refs in data_ref for ref in refs] + data_sys:
+                counts = {}
+                for n, counts_n in enumerate(cider_scorer.precook(sent, corpus=corpus)):
+                    for key, cnt in counts_n.items():
+                        self.assertEqual(ngram_order(key), n + 1)
+                        counts[corpus.vocab.decode(key)] = cnt
+                self.assertEqual(counts, dict(baseline_cider_scorer.precook(sent)))
+
+    def test_own_vocabulary(self):
+        first, second = Corpus(), Corpus()
+        self.assertIsNot(first.vocab, second.vocab)
+        first.sentence('a b c')
+        self.assertEqual(len(first.vocab), 3)
+        self.assertEqual(len(second.vocab), 0)
+        # corpora sharing a vocabulary have comparable keys
+        third = Corpus(vocab=first.vocab)
+        self.assertEqual(list(third.sentence('c b').ids), [3, 2])
+
+    def test_vocabulary_full(self):
+        vocab = Vocabulary()
+        with mock.patch.object(corpus_module, 'MAX_TOKEN_ID', 2):
+            vocab.encode(['a', 'b', 'a'])
+            self.assertRaises(ValueError, vocab.intern, 'c')
+        self.assertEqual(len(vocab), 2)
+
+    def test_lookup_does_not_intern(self):
+        vocab = Vocabulary()
+        vocab.encode(['a', 'b'])
+        self.assertEqual(list(vocab.lookup(['b', 'x', 'y', 'x', 'a'])), [2, 3, 4, 3, 1])
+        self.assertEqual(len(vocab), 2)
+
+    def test_precook_needs_corpus(self):
+        self.assertRaises(ValueError, cider_scorer.precook, 'a b c')
+
+    def test_parallel_encoding(self):
+        data_ref, data_sys = random_data(500)
+        sents = [ref for refs in data_ref for ref in refs] + data_sys
+        serial, parallel = Corpus(), Corpus()
+        for sent in sents:
+            serial.sentence(sent)
+        parallel.encode_all(sents, workers=2, chunk_size=100)
+        self.assertEqual(serial.vocab.tokens, parallel.vocab.tokens)
+        for sent in sents:
+            self.assertEqual(list(serial.sentence(sent).ids), list(parallel.sentence(sent).ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
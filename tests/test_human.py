@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for leave-one-out scoring of references (metrics.human) against evaluating all
+held-out references as a system output in the usual way."""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+import unittest
+
+from metrics.human import held_out_stats, human_scores
+from metrics.pymteval import BLEUNISTScore
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox
+from pycocoevalcap.rouge.rouge import Rouge
+from tests.data import random_data, lowercase
+
+
+class HumanScoresTest(unittest.TestCase):
+
+    def setUp(self):
+        # segments with 1-6 references, the ones with a single reference are skipped
+        self.data_ref, _ = random_data(150)
+        self.coco_ref, _ = lowercase(self.data_ref, [])
+        self.meteor = MeteorApprox()
+
+    def naive_data(self, data_ref):
+        """Each reference held out in turn as an output, with the remaining ones as references."""
+        naive_ref, naive_sys = [], []
+        for refs in data_ref:
+            if len(refs) > 1:
+                for ref_no in range(len(refs)):
+                    naive_ref.append(refs[:ref_no] + refs[ref_no + 1:])
+                    naive_sys.append(refs[ref_no])
+        return naive_ref, naive_sys
+
+    def test_scores_match_naive(self):
+        for perl_compat in [True, False]:
+            scores = human_scores(self.data_ref, self.coco_ref, self.meteor, perl_compat=perl_compat)
+            naive_ref, naive_sys = self.naive_data(self.data_ref)
+            bleu_nist = BLEUNISTScore(perl_compat=perl_compat)
+            for refs, sent in zip(naive_ref, naive_sys):
+                bleu_nist.append(sent, refs)
+            coco_naive_ref, coco_naive_sys = self.naive_data(self.coco_ref)
+            gts = dict(enumerate(coco_naive_ref))
+            res = {seg_no: [sent] for seg_no, sent in enumerate(coco_naive_sys)}
+            expected = dict(zip(['BLEU', 'NIST'], bleu_nist.score()))
+            expected['METEOR'] = self.meteor.compute_score(gts, res)[0]
+            expected['ROUGE_L'] = Rouge().compute_score(gts, res)[0]
+            expected['CIDEr'] = Cider().compute_score(gts, res)[0]
+            self.assertEqual(sorted(scores.keys()), sorted(expected.keys()))
+            for metric in expected:
+                self.assertAlmostEqual(scores[metric], expected[metric], places=12)
+
+    def test_held_out_order(self):
+        stats, held_out = held_out_stats(self.data_ref, self.coco_ref, self.meteor)
+        self.assertEqual(held_out, [(inst_no, ref_no) for inst_no, refs in enumerate(self.data_ref)
+                                    if len(refs) > 1 for ref_no in range(len(refs))])
+        self.assertEqual(len(stats), len(held_out))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the pre-tokenized input passthrough (measure_scores -P): inputs tokenized beforehand
+must give the same scores as letting the scorers tokenize them."""
+
+from __future__ import unicode_literals
+from argparse import ArgumentParser
+import io
+import unittest
+from unittest import mock
+
+from measure_scores import (add_pretokenized_args, get_pretokenized, check_pretokenized,
+                            run_pymteval, tokenize_coco, TOKENIZATION_SCHEMES)
+from metrics.pymteval import NGramScore
+from tests.data import random_data
+
+
+def mteval_tokenize(sent):
+    return ' '.join(NGramScore.tokenize_mteval(sent))
+
+
+class PretokenizedTest(unittest.TestCase):
+
+    def setUp(self):
+        # non-empty outputs: without -P, the scorers' own tokenization counts an empty output as one token
+        self.data_ref, self.data_sys = random_data(200, min_sys_len=1)
+        self.tok_ref = [[mteval_tokenize(ref) for ref in refs] for refs in self.data_ref]
+        self.tok_sys = [mteval_tokenize(sent) for sent in self.data_sys]
+
+    def test_mteval_scores(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            for perl_compat in [True, False]:
+                self.assertEqual(run_pymteval(self.tok_ref, self.tok_sys, pretokenized=True, perl_compat=perl_compat),
+                                 run_pymteval(self.data_ref, self.data_sys, perl_compat=perl_compat))
+
+    def test_ptb_whitespace(self):
+        coco_ref, coco_sys = tokenize_coco([[' a  b ', 'c'], ['d']], ['e  f', ''], pretokenized=True)
+        self.assertEqual(coco_ref, [['a b', 'c'], ['d']])
+        self.assertEqual(coco_sys, ['e f', ''])
+
+    def test_options(self):
+        ap = ArgumentParser()
+        add_pretokenized_args(ap)
+        self.assertEqual(get_pretokenized(ap, ap.parse_args([])), [])
+        self.assertEqual(get_pretokenized(ap, ap.parse_args(['-P'])), sorted(TOKENIZATION_SCHEMES))
+        self.assertEqual(get_pretokenized(ap, ap.parse_args(['--pretokenized-schemes', 'mteval'])), ['mteval'])
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            self.assertRaises(SystemExit, get_pretokenized, ap, ap.parse_args(['--pretokenized-schemes', 'ptb,moses']))
+
+    def test_check(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            check_pretokenized(self.tok_ref, self.tok_sys, ['mteval'])
+        self.assertEqual(stderr.getvalue(), '')
+        data_ref = [['the eagle is near the city centre']]
+        data_sys = ['the eagle, in the city centre.']
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            check_pretokenized(data_ref, data_sys, ['mteval'])
+            check_pretokenized(data_ref, [mteval_tokenize(sent) for sent in data_sys], ['ptb'])
+        self.assertIn('1/2 sampled sentences do not look mteval-tokenized', stderr.getvalue())
+        self.assertIn('1/2 sampled sentences do not look ptb-tokenized', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the METEOR wrapper (pycocoevalcap.meteor.meteor) against the original wrapper. The
+METEOR jar is replaced by a stand-in process that implements the jar's -stdio protocol (SCORE
+lines return statistics, EVAL lines return a score for each statistics vector + the aggregate),
+so that the pipelining, sharding & caching can be tested without Java.
+"""
+
+from __future__ import unicode_literals
+from builtins import range
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from pycocoevalcap.meteor import meteor as meteor_module
+from pycocoevalcap.meteor.meteor import Meteor
+from tests.baseline import meteor as baseline_meteor
+from tests.data import random_sentence
+
+# stand-in for the METEOR jar: statistics are output & reference lengths, matches & chunks
+FAKE_METEOR = r'''
+import sys
+
+def score(stats):
+    hyp_len, ref_len, matches, chunks = stats
+    if not matches:
+        return 0.0
+    prec, rec = matches / hyp_len, matches / ref_len
+    return 10 * prec * rec / (rec + 9 * prec) * (1 - 0.5 * (chunks / matches) ** 3)
+
+for line in sys.stdin.buffer:
+    fields = [field.strip() for field in line.decode('UTF-8').split('|||')]
+    if fields[0] == 'SCORE':
+        hyp = fields[-1].split()
+        stats = []
+        for ref in fields[1:-1]:
+            ref = ref.split()
+            matches = len(set(hyp) & set(ref))
+            stats.append([float(len(hyp)), float(len(ref)), float(matches), matches / 3.0])
+        sys.stdout.write(' '.join(repr(val) for val in max(stats, key=score)) + '\n')
+    elif fields[0] == 'EVAL':
+        total = [0.0] * 4
+        for field in fields[1:]:
+            stats = [float(val) for val in field.split()]
+            sys.stdout.write('%r\n' % score(stats))
+            total = [tot + val for tot, val in zip(total, stats)]
+        sys.stdout.write('%r\n' % score(total))
+    sys.stdout.flush()
+'''
+
+POPEN = subprocess.Popen
+
+
+def fake_popen(cmd, cwd=None, **kwargs):
+    return POPEN([sys.executable, '-c', FAKE_METEOR], **kwargs)
+
+
+class MeteorTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1)
+        # more segments than fit into a single EVAL line
+        num_segs = meteor_module.EVAL_CHUNK_SIZE * 2 + 100
+        self.gts = {inst_no: [random_sentence(rng).lower() for _ in range(rng.randint(1, 6))]
+                    for inst_no in range(num_segs)}
+        self.res = {inst_no: [random_sentence(rng).lower()] for inst_no in range(num_segs)}
+        patcher = mock.patch.object(subprocess, 'Popen', fake_popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def baseline_scores(self):
+        return baseline_meteor.Meteor().compute_score(self.gts, self.res)
+
+    def test_scores_match_baseline(self):
+        score, scores = Meteor().compute_score(self.gts, self.res)
+        self.assertEqual((score, scores), self.baseline_scores())
+
+    def test_workers(self):
+        expected = Meteor().compute_score(self.gts, self.res)
+        for workers in [2, 3]:
+            meteor = Meteor(workers=workers)
+            self.assertEqual(meteor.compute_score(self.gts, self.res), expected)
+            self.assertEqual(len(meteor.meteor_ps), workers)
+
+    def test_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        cache_file = os.path.join(tmp_dir, 'meteor.db')
+        meteor = Meteor(cache_file=cache_file)
+        expected = meteor.compute_score(self.gts, self.res)
+        stats = meteor.compute_stats(self.gts, self.res)
+        total = meteor.score_stats(stats)
+        self.assertEqual(total, expected[0])
+        # everything is found in the cache, METEOR is not started again
+        with mock.patch.object(subprocess, 'Popen', side_effect=OSError('METEOR started')):
+            meteor = Meteor(cache_file=cache_file)
+            self.assertEqual(meteor.compute_score(self.gts, self.res), expected)
+            self.assertEqual(meteor.compute_stats(self.gts, self.res), stats)
+            self.assertEqual(meteor.score_stats(stats), total)
+            self.assertEqual(meteor.meteor_ps, [])
+
+    def test_bootstrap(self):
+        meteor = Meteor()
+        sample_scores = meteor.bootstrap_scores(self.gts, self.res, num_samples=20, seed=1)
+        self.assertEqual(sample_scores.shape, (20,))
+        stats = meteor.compute_stats(self.gts, self.res)
+        rng = np.random.RandomState(1)
+        for sample_score in sample_scores:
+            counts = np.bincount(rng.randint(0, len(stats), len(stats)), minlength=len(stats))
+            resampled = [stats[inst_no] for inst_no, count in enumerate(counts) for _ in range(count)]
+            self.assertAlmostEqual(sample_score, meteor.score_stats(resampled), places=12)
+        np.testing.assert_array_equal(meteor.eval_stats([stats[0], stats[1]]),
+                                      [meteor.score_stats([stats[0]]), meteor.score_stats([stats[1]])])
+
+        meteor = Meteor(bootstrap=50, alpha=0.1)
+        score, scores = meteor.compute_score(self.gts, self.res)
+        self.assertEqual((score, scores), self.baseline_scores())
+        lower, upper = meteor.confidence_interval
+        self.assertTrue(lower <= upper)
+
+
+if __name__ == '__main__':
+    unittest.main()
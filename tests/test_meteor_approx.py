@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the in-process METEOR approximation (pycocoevalcap.meteor.meteor_approx): the
+corpus-level score must be the score of the summed statistics, the same as for the jar wrapper."""
+
+from __future__ import unicode_literals
+from builtins import range
+import unittest
+
+import numpy as np
+
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox, segment_stats, stem, STAGE_WEIGHTS, HYP_CONTENT_WMATCHES
+from tests.data import random_data, lowercase
+
+
+class MeteorApproxTest(unittest.TestCase):
+
+    def setUp(self):
+        data_ref, data_sys = lowercase(*random_data(300, min_sys_len=1))
+        self.gts = dict(enumerate(data_ref))
+        self.res = {inst_no: [sent] for inst_no, sent in enumerate(data_sys)}
+        self.meteor = MeteorApprox()
+
+    def test_corpus_score(self):
+        score, scores = self.meteor.compute_score(self.gts, self.res)
+        stats = self.meteor.compute_stats(self.gts, self.res)
+        self.assertEqual(len(scores), len(self.gts))
+        self.assertEqual(score, self.meteor.score_stats(stats))
+        np.testing.assert_array_equal(self.meteor.eval_stats(stats), scores)
+        self.assertTrue(all(0.0 <= seg_score <= 1.0 for seg_score in scores))
+        self.assertTrue(0.0 < score < 1.0)
+
+    def test_matching(self):
+        sent = 'the cat sat on the mat'
+        self.assertEqual(self.meteor.compute_score({0: [sent]}, {0: [sent]}), (1.0, [1.0]))
+        self.assertEqual(stem('running'), 'run')
+        # stem matches are weighted down
+        stats = segment_stats('the cats sat'.split(), 'the cat sat'.split(), {})
+        self.assertEqual(stats[HYP_CONTENT_WMATCHES], 1.0 + STAGE_WEIGHTS[1])
+        self.assertLess(self.meteor.compute_score({0: ['the cat sat']}, {0: ['the cats sat']})[0], 1.0)
+        # best-matching reference is used
+        score, _ = self.meteor.compute_score({0: ['a dog ran', sent]}, {0: [sent]})
+        self.assertEqual(score, 1.0)
+
+    def test_bootstrap(self):
+        sample_scores = self.meteor.bootstrap_scores(self.gts, self.res, num_samples=20, seed=1)
+        stats = self.meteor.compute_stats(self.gts, self.res)
+        rng = np.random.RandomState(1)
+        for sample_score in sample_scores:
+            counts = np.bincount(rng.randint(0, len(stats), len(stats)), minlength=len(stats))
+            resampled = [stats[inst_no] for inst_no, count in enumerate(counts) for _ in range(count)]
+            self.assertAlmostEqual(sample_score, self.meteor.score_stats(resampled), places=12)
+        meteor = MeteorApprox(bootstrap=50)
+        meteor.compute_score(self.gts, self.res)
+        lower, upper = meteor.confidence_interval
+        self.assertTrue(lower <= upper)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for block n-best list & MBR scoring (metrics.nbest) against scoring each candidate
+separately with the sentence-level scorers."""
+
+from __future__ import unicode_literals
+from builtins import range
+import math
+import random
+import unittest
+
+import numpy as np
+
+from metrics.corpus import Corpus
+from metrics.nbest import NBestScorer
+from metrics.pymteval import BLEUScore, NISTScore
+from pycocoevalcap.cider.cider_scorer import CiderReferences, cook_refs, cook_test
+from pycocoevalcap.rouge.rouge import Rouge
+from tests.data import random_data, random_sentence, lowercase
+
+K = 5
+
+
+def separate_scores(cand, refs, cider):
+    """Scores of a single candidate, each metric computed on its own (CIDEr given)."""
+    bleu = BLEUScore(smoothing=1.0)
+    bleu.append(cand, refs)
+    nist = NISTScore()
+    nist.append(cand, refs)
+    try:
+        nist_score = nist.score()
+    except ZeroDivisionError:  # undefined for short outputs
+        nist_score = float('nan')
+    return [bleu.score(), nist_score, Rouge().calc_score([cand], refs), cider]
+
+
+class NBestScorerTest(unittest.TestCase):
+
+    def setUp(self):
+        data_ref, _ = random_data(100)
+        self.data_ref, _ = lowercase(data_ref, [])
+        rng = random.Random(2)
+        # includes empty & short candidates (NIST undefined) and candidates repeating references
+        self.candidates = [[random_sentence(rng, 0, 12).lower() for _ in range(K - 1)] + [rng.choice(refs)]
+                           for refs in self.data_ref]
+
+    def assert_scores_equal(self, scores, expected):
+        for metric_no, metric in enumerate(['BLEU', 'NIST', 'ROUGE_L', 'CIDEr']):
+            np.testing.assert_array_equal(scores[metric], expected[:, :, metric_no])
+
+    def test_score(self):
+        scores = NBestScorer(self.data_ref).score(self.candidates)
+        corpus = Corpus()
+        cider_refs = CiderReferences([cook_refs(refs, corpus=corpus) for refs in self.data_ref], corpus=corpus)
+        expected = np.array([[separate_scores(cand, refs, cider_refs.score(cook_test(cand, corpus=corpus), seg_no))
+                              for cand in cands]
+                             for seg_no, (cands, refs) in enumerate(zip(self.candidates, self.data_ref))])
+        self.assertTrue(np.isnan(expected[:, :, 1]).any())
+        self.assert_scores_equal(scores, expected)
+
+    def test_mbr(self):
+        scores = NBestScorer().mbr(self.candidates)
+        corpus = Corpus()
+        cider_refs = CiderReferences([cook_refs(cands, corpus=corpus) for cands in self.candidates], corpus=corpus)
+        expected = []
+        for seg_no, cands in enumerate(self.candidates):
+            expected.append([])
+            for cand_no, cand in enumerate(cands):
+                # CIDEr against each single other candidate, with document frequencies of all candidates
+                sims = cider_refs.ref_sims(cook_test(cand, corpus=corpus), seg_no)
+                expected[-1].append(np.mean([separate_scores(cand, [cands[other_no]], np.mean(sims[other_no]) * 10.0)
+                                             for other_no in range(K) if other_no != cand_no], axis=0))
+        expected = np.array(expected)
+        self.assert_scores_equal(scores, expected)
+
+    def test_metrics_subset(self):
+        scores = NBestScorer(self.data_ref, metrics=['NIST', 'ROUGE_L']).score(self.candidates)
+        self.assertEqual(sorted(scores.keys()), ['NIST', 'ROUGE_L'])
+        full = NBestScorer(self.data_ref).score(self.candidates)
+        np.testing.assert_array_equal(scores['NIST'], full['NIST'])
+        self.assertRaises(ValueError, NBestScorer().mbr, [[cands[0]] for cands in self.candidates])
+        self.assertRaises(ValueError, NBestScorer(self.data_ref).score, self.candidates[1:])
+        self.assertTrue(math.isnan(NBestScorer([['a b c d e f']]).score([['a b']])['NIST'][0, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the sharded PTB tokenization (pycocoevalcap.tokenizer.ptbtokenizer). The tokenizer
+JVM is replaced by a stand-in process that keeps lines like PTBTokenizer -preserveLines does,
+so that the sharding and output checks can be tested without Java.
+"""
+
+from __future__ import unicode_literals
+from builtins import range
+from builtins import object
+import os
+import random
+import re
+import unittest
+from unittest import mock
+
+from pycocoevalcap.tokenizer import ptbtokenizer
+from pycocoevalcap.tokenizer.ptbtokenizer import PTBTokenizer
+from tests.data import random_sentence
+
+
+class FakeTokenizerProcess(object):
+    """Stand-in for the tokenizer JVM: lowercases & splits off punctuation in the given file,
+    keeping the line breaks; optionally drops the last lines or fails."""
+
+    drop_lines = 0
+    returncode = 0
+
+    def __init__(self, cmd, cwd, **kwargs):
+        with open(os.path.join(cwd, cmd[-1]), encoding='UTF-8') as fh:
+            lines = fh.read().split('\n')
+        lines = lines[:len(lines) - self.drop_lines]
+        self.output = '\n'.join(' '.join(re.findall(r'\w+|[^\w\s]', line.lower())) for line in lines)
+
+    def communicate(self, input=None):
+        return self.output, None
+
+
+class PTBTokenizerTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.captions = {img_id: [{'caption': random_sentence(rng, 0) + rng.choice(['', '.', '\n', '\r\n'])}
+                                  for _ in range(rng.randint(1, 5))]
+                         for img_id in range(500)}
+        self.tokenizer_dir = os.path.dirname(os.path.abspath(ptbtokenizer.__file__))
+        self.tmp_files = set(os.listdir(self.tokenizer_dir))
+
+    def tokenize(self, process_class=FakeTokenizerProcess, **kwargs):
+        with mock.patch.object(ptbtokenizer.subprocess, 'Popen', process_class):
+            return PTBTokenizer(**kwargs).tokenize(self.captions)
+
+    def test_shards_same_as_single_run(self):
+        single = self.tokenize()
+        self.assertEqual(sorted(single.keys()), sorted(self.captions.keys()))
+        for img_id, caps in self.captions.items():
+            self.assertEqual(len(single[img_id]), len(caps))
+        for workers, min_shard_size in [(2, 100), (3, 100), (7, 1)]:
+            self.assertEqual(self.tokenize(workers=workers, min_shard_size=min_shard_size), single)
+
+    def test_short_output(self):
+        class ShortOutput(FakeTokenizerProcess):
+            drop_lines = 1
+        self.assertRaises(RuntimeError, self.tokenize, ShortOutput, workers=3, min_shard_size=100)
+        self.assertEqual(set(os.listdir(self.tokenizer_dir)), self.tmp_files)
+
+    def test_failure(self):
+        class Failure(FakeTokenizerProcess):
+            returncode = 1
+        self.assertRaises(RuntimeError, self.tokenize, Failure)
+        self.assertEqual(set(os.listdir(self.tokenizer_dir)), self.tmp_files)
+
+
+if __name__ == '__main__':
+    unittest.main()
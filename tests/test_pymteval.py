@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for BLEU & NIST (metrics.pymteval) against the original implementation (Python mode,
+which the original implements) and the MTEval Perl script (Perl-compatible mode, if Perl with
+XML::Twig is available; the script's quirks are also tested on small examples)."""
+
+from __future__ import unicode_literals
+from builtins import zip
+import math
+import random
+import subprocess
+import unittest
+
+import numpy as np
+
+import check_mteval_parity
+from metrics.pymteval import BLEUScore, NISTScore, BLEUNISTScore, SegmentScores
+from tests.baseline import pymteval as baseline_pymteval
+from tests.data import example_data, random_data
+
+
+def has_perl_xml_twig():
+    try:
+        return subprocess.call(['perl', '-MXML::Twig', '-e', '1'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+    except OSError:
+        return False
+
+
+class PyMTEvalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = [example_data(), random_data(1000)]
+
+    def test_scores_match_baseline(self):
+        for data_ref, data_sys in self.datasets:
+            for scorer_class, baseline_class in [(BLEUScore, baseline_pymteval.BLEUScore),
+                                                 (NISTScore, baseline_pymteval.NISTScore)]:
+                scorer, baseline = scorer_class(), baseline_class()
+                for refs, sent in zip(data_ref, data_sys):
+                    scorer.append(sent, refs)
+                    baseline.append(sent, refs)
+                self.assertEqual(scorer.score(), baseline.score())
+
+    def test_cached_information_values(self):
+        # scores taken while appending must not use information values of older reference counts
+        data_ref, data_sys = self.datasets[1]
+        nist, baseline = NISTScore(), baseline_pymteval.NISTScore()
+        for seg_no, (refs, sent) in enumerate(zip(data_ref, data_sys)):
+            nist.append(sent, refs)
+            baseline.append(sent, refs)
+            if seg_no % 97 == 0:
+                self.assertEqual(nist.score(), baseline.score())
+        self.assertEqual(nist.score(), baseline.score())
+
+    def test_fused_bleu_nist(self):
+        for data_ref, data_sys in self.datasets:
+            for perl_compat in [False, True]:
+                for bleu_max_ngram, nist_max_ngram in [(4, 5), (5, 3)]:
+                    bleu_nist = BLEUNISTScore(bleu_max_ngram, nist_max_ngram, perl_compat=perl_compat)
+                    bleu = BLEUScore(bleu_max_ngram, perl_compat=perl_compat)
+                    nist = NISTScore(nist_max_ngram, perl_compat=perl_compat)
+                    for refs, sent in zip(data_ref, data_sys):
+                        bleu_nist.append(sent, bleu_nist.prepare_refs(refs))
+                        bleu.append(sent, refs)
+                        nist.append(sent, refs)
+                    self.assertEqual(bleu_nist.score(), (bleu.score(), nist.score()))
+
+
+class SegmentScoresTest(unittest.TestCase):
+
+    def test_scores_match_baseline(self):
+        # random data includes short outputs, with undefined NIST
+        for data_ref, data_sys in [example_data(), random_data(500)]:
+            seg_scores = SegmentScores()
+            expected = []
+            for refs, sent in zip(data_ref, data_sys):
+                seg_scores.append(sent, refs)
+                seg_expected = []
+                for smoothing in [0.0, 1.0]:
+                    bleu = baseline_pymteval.BLEUScore(smoothing=smoothing)
+                    bleu.append(sent, refs)
+                    seg_expected.append(bleu.score())
+                nist = baseline_pymteval.NISTScore()
+                nist.append(sent, refs)
+                try:
+                    seg_expected.append(nist.score())
+                except ZeroDivisionError:  # NaN in SegmentScores
+                    seg_expected.append(float('nan'))
+                expected.append(seg_expected)
+            expected = np.array(expected)
+            np.testing.assert_array_equal(seg_scores.bleu(), expected[:, 0])
+            np.testing.assert_array_equal(seg_scores.bleu(smoothing=1.0), expected[:, 1])
+            np.testing.assert_array_equal(seg_scores.nist(), expected[:, 2])
+        self.assertTrue(np.isnan(expected[:, 2]).any())
+
+    def test_empty(self):
+        seg_scores = SegmentScores()
+        self.assertEqual(len(seg_scores.bleu()), 0)
+        self.assertEqual(len(seg_scores.nist()), 0)
+
+
+class PerlCompatTest(unittest.TestCase):
+
+    @unittest.skipUnless(has_perl_xml_twig(), 'needs Perl with XML::Twig')
+    def test_parity_with_perl_script(self):
+        data_ref, data_sys = example_data()
+        rand_ref, rand_sys = check_mteval_parity.random_data(data_ref, data_sys, 200, random.Random(1))
+        for data in [(data_ref, data_sys), (rand_ref, rand_sys)]:
+            perl_bleu, perl_nist, perl_stats = check_mteval_parity.run_perl(*data)
+            py_bleu, py_nist, py_stats = check_mteval_parity.run_python(*data)
+            self.assertEqual((py_bleu, py_nist), (perl_bleu, perl_nist))
+            self.assertEqual(len(py_stats), len(perl_stats))
+            for perl_seg, py_seg in zip(perl_stats, py_stats):
+                self.assertEqual(py_seg[:4], perl_seg[:4])
+                for perl_info, py_info in zip(perl_seg[4], py_seg[4]):
+                    self.assertAlmostEqual(py_info, perl_info, places=9)
+
+    def test_smoothing(self):
+        # no 4-grams in the output (skipped), no 3-gram matches (smoothed by 1/2)
+        bleu = BLEUScore(perl_compat=True)
+        bleu.append('a b c', ['a b d'])
+        self.assertAlmostEqual(bleu.score(), math.exp((math.log(2 / 3.) + math.log(1 / 2.) + math.log(1 / 2.)) / 4))
+        self.assertRaises(ValueError, BLEUScore, smoothing=1.0, perl_compat=True)
+
+    def test_tokens(self):
+        # only A-Z are lowercased, empty outputs have no tokens
+        for perl_compat, hits in [(False, [2, 1, 0, 0]), (True, [1, 0, 0, 0])]:
+            bleu = BLEUScore(perl_compat=perl_compat)
+            bleu.append('CAFÉ Bar', ['café bar'])
+            self.assertEqual(bleu.hits, hits)
+        nist = NISTScore(perl_compat=True)
+        nist.append('', ['a b'])
+        self.assertEqual(nist.cand_lens, [0] * nist.max_ngram)
+
+    def test_zero_token_information(self):
+        # the script takes the total reference length as the count of the prefix "0"
+        for perl_compat, info in [(False, 0.0), (True, math.log(5, 2))]:
+            nist = NISTScore(perl_compat=perl_compat)
+            nist.append('0 a', ['0 a', 'b c d'])
+            self.assertAlmostEqual(nist.info(nist.corpus.vocab.encode_ngram(['0', 'a'])), info)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for ROUGE-L (pycocoevalcap.rouge.rouge) against the original implementation."""
+
+from __future__ import unicode_literals
+from builtins import range
+from contextlib import redirect_stderr
+import io
+import random
+import unittest
+
+from pycocoevalcap.rouge.rouge import Rouge, lcs_length, lcs_masks
+from tests.baseline import rouge as baseline_rouge
+from tests.data import example_data, random_data, lowercase
+
+
+def coco_dicts(data_ref, data_sys):
+    """References & outputs as compute_score takes them (outputs must not be empty)."""
+    gts = {inst_no: refs for inst_no, refs in enumerate(data_ref)}
+    res = {inst_no: [sent or 'a'] for inst_no, sent in enumerate(data_sys)}
+    return gts, res
+
+
+class RougeTest(unittest.TestCase):
+
+    def test_lcs_length(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            # long sequences take more than one machine word of bits
+            first = [rng.randint(0, 5) for _ in range(rng.randint(0, 150))]
+            second = [rng.randint(0, 5) for _ in range(rng.randint(0, 150))]
+            self.assertEqual(lcs_length(lcs_masks(first), len(first), second),
+                             baseline_rouge.my_lcs(first, second))
+
+    def test_scores_match_baseline(self):
+        for data in [example_data(), random_data()]:
+            gts, res = coco_dicts(*lowercase(*data))
+            score, scores = baseline_rouge.Rouge().compute_score(gts, res)
+            new_score, new_scores = Rouge().compute_score(gts, res)
+            self.assertEqual(new_score, score)
+            self.assertEqual(new_scores.tolist(), scores.tolist())
+
+    def test_pruning(self):
+        for data in [example_data(), random_data()]:
+            gts, res = coco_dicts(*lowercase(*data))
+            score, scores = Rouge().compute_score(gts, res)
+            rouge = Rouge(prune=True)
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                for _ in range(2):
+                    pruned_score, pruned_scores = rouge.compute_score(gts, res)
+                    self.assertEqual(pruned_score, score)
+                    self.assertEqual(pruned_scores.tolist(), scores.tolist())
+                    # counts are for the last call only
+                    self.assertEqual(rouge.lcs_computed + rouge.lcs_pruned, sum(len(refs) for refs in gts.values()))
+                    self.assertGreater(rouge.lcs_pruned, 0)
+            self.assertEqual(stderr.getvalue(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for sampled approximate evaluation (metrics.sampled): with all segments sampled, the
+estimates must equal the corpus-level scores."""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+import unittest
+
+import numpy as np
+
+from metrics.pymteval import BLEUNISTScore
+from metrics.sampled import SampledEvaluator, METRICS, whitespace_normalize, stratified_order, mr_stratum
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.rouge.rouge import Rouge
+from tests.data import random_data, lowercase
+
+
+class SampledEvaluatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_ref, self.data_sys = lowercase(*random_data(300, min_sys_len=1))
+        self.strata = [len(refs) for refs in self.data_ref]
+
+    def evaluator(self, strata=None):
+        return SampledEvaluator(self.data_ref, strata=strata, coco_tokenize=whitespace_normalize)
+
+    def corpus_scores(self):
+        bleu_nist = BLEUNISTScore(perl_compat=True)
+        for refs, sent in zip(self.data_ref, self.data_sys):
+            bleu_nist.append(sent, refs)
+        gts = dict(enumerate(self.data_ref))
+        res = {inst_no: [sent] for inst_no, sent in enumerate(self.data_sys)}
+        scores = dict(zip(['BLEU', 'NIST'], bleu_nist.score()))
+        scores['ROUGE_L'] = Rouge().compute_score(gts, res)[0]
+        scores['CIDEr'] = Cider().compute_score(gts, res)[0]
+        return scores
+
+    def test_full_sample(self):
+        expected = self.corpus_scores()
+        for strata in [None, self.strata]:
+            # never narrow enough, so the sample grows to all data
+            result = self.evaluator(strata).evaluate(self.data_sys, ci_width=0.0, initial_size=10, seed=1)
+            self.assertEqual(result['sample_size'], len(self.data_sys))
+            for metric in METRICS:
+                self.assertAlmostEqual(result[metric], expected[metric], places=12)
+                self.assertEqual(result[metric + '_CI'], (result[metric], result[metric]))
+
+    def test_generated_outputs(self):
+        requested = []
+
+        def generate(inst_nos):
+            requested.extend(inst_nos)
+            return [self.data_sys[inst_no] for inst_no in inst_nos]
+
+        evaluator = self.evaluator(self.strata)
+        result = evaluator.evaluate(generate, ci_width=None, time_budget=0, initial_size=50, seed=1)
+        self.assertEqual(result['sample_size'], 50)
+        self.assertEqual(len(set(requested)), 50)
+        self.assertEqual(evaluator.evaluate(self.data_sys, ci_width=None, time_budget=0, initial_size=50, seed=1),
+                         result)
+        for metric in METRICS:
+            lower, upper = result[metric + '_CI']
+            self.assertLess(lower, upper)
+
+    def test_stratified_order(self):
+        strata = np.array(self.strata)
+        order = stratified_order(strata, np.random.RandomState(1))
+        self.assertEqual(sorted(order.tolist()), list(range(len(strata))))
+        # every prefix has each stratum in proportion to its size (rounded)
+        for size in [20, 50, 150]:
+            counts = np.bincount(strata[order[:size]], minlength=strata.max() + 1)
+            expected = np.bincount(strata, minlength=strata.max() + 1) * size / float(len(strata))
+            self.assertTrue(np.all(np.abs(counts - expected) <= 1))
+        self.assertEqual(mr_stratum('name[The Eagle], eatType[coffee shop], food[French]'), 3)
+        self.assertRaises(ValueError, SampledEvaluator, self.data_ref, strata=self.strata[1:],
+                          coco_tokenize=whitespace_normalize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for chunked segment-level scoring (metrics.seg_level): the scores must not depend on
+the chunk size & number of workers, and must be the same as of the original scorers."""
+
+from __future__ import unicode_literals
+from builtins import zip
+import unittest
+
+import numpy as np
+
+from metrics.pymteval import SegmentScores
+from metrics.seg_level import SegLevelScorer
+from tests.baseline import cider_scorer as baseline_cider_scorer
+from tests.baseline import rouge as baseline_rouge
+from tests.data import random_data, lowercase
+
+
+class SegLevelScorerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_ref, self.data_sys = random_data(300)
+        coco_ref, coco_sys = lowercase(self.data_ref, self.data_sys)
+        self.coco_ref, self.coco_sys = coco_ref, [sent or 'a' for sent in coco_sys]
+
+    def scores(self, workers=1, chunk_size=1000):
+        scorer = SegLevelScorer(self.data_ref, self.data_sys, self.coco_ref, self.coco_sys)
+        return np.array(list(scorer.iter_scores(workers, chunk_size)))
+
+    def test_scores_match_baseline(self):
+        scores = self.scores()
+        seg_scores = SegmentScores()
+        for refs, sent in zip(self.data_ref, self.data_sys):
+            seg_scores.append(sent, refs)
+        np.testing.assert_array_equal(scores[:, 0], seg_scores.bleu())
+        np.testing.assert_array_equal(scores[:, 1], seg_scores.bleu(smoothing=1.0))
+        np.testing.assert_array_equal(scores[:, 2], seg_scores.nist())
+        gts = dict(enumerate(self.coco_ref))
+        res = {inst_no: [sent] for inst_no, sent in enumerate(self.coco_sys)}
+        _, rouge_scores = baseline_rouge.Rouge().compute_score(gts, res)
+        np.testing.assert_array_equal(scores[:, 3], rouge_scores)
+        cider = baseline_cider_scorer.CiderScorer(n=4, sigma=6.0)
+        for inst_no in gts:
+            cider += (res[inst_no][0], gts[inst_no])
+        _, cider_scores = cider.compute_score()
+        np.testing.assert_array_equal(scores[:, 4], cider_scores)
+
+    def test_chunks(self):
+        scores = self.scores()
+        for workers, chunk_size in [(1, 7), (1, 300), (3, 50), (2, 1)]:
+            np.testing.assert_array_equal(self.scores(workers, chunk_size), scores)
+        self.assertRaises(ValueError, self.scores, 1, 0)
+        self.assertRaises(ValueError, SegLevelScorer, self.data_ref[1:], self.data_sys, self.coco_ref, self.coco_sys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the significance tests (metrics.significance): scores computed from summed
+per-segment statistics must equal the corpus-level scorers, on the full data and on resampled
+data, and the resampling must not depend on the number of workers."""
+
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import range
+import unittest
+
+import numpy as np
+
+from metrics.pymteval import BLEUNISTScore, BLEUScore
+from metrics.significance import SegmentStats, SignificanceTester, bootstrap_p_values, confidence_intervals, METRICS
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox
+from pycocoevalcap.rouge.rouge import Rouge
+from tests.data import random_data, lowercase
+
+
+class SignificanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_ref, data_sys1 = random_data(150, seed=1)
+        _, data_sys2 = random_data(150, seed=2)
+        self.systems = [data_sys1, data_sys2]
+        self.coco_ref, _ = lowercase(self.data_ref, [])
+        self.meteor = MeteorApprox()
+
+    def coco_sys(self, data_sys):
+        return [sent or 'a' for sent in lowercase([], data_sys)[1]]
+
+    def system_stats(self, perl_compat=True):
+        cider_refs = Cider().prepare_references(dict(enumerate(self.coco_ref)))
+        return [SegmentStats.compute(self.data_ref, data_sys, self.coco_ref, self.coco_sys(data_sys), self.meteor,
+                                     perl_compat=perl_compat, cider_refs=cider_refs)
+                for data_sys in self.systems]
+
+    def test_observed_scores(self):
+        for perl_compat in [True, False]:
+            observed = SignificanceTester(self.system_stats(perl_compat), self.meteor).observed()
+            for sys_no, data_sys in enumerate(self.systems):
+                bleu_nist = BLEUNISTScore(perl_compat=perl_compat)
+                for refs, sent in zip(self.data_ref, data_sys):
+                    bleu_nist.append(sent, refs)
+                gts = dict(enumerate(self.coco_ref))
+                res = {inst_no: [sent] for inst_no, sent in enumerate(self.coco_sys(data_sys))}
+                expected = dict(zip(['BLEU', 'NIST'], bleu_nist.score()))
+                expected['METEOR'] = self.meteor.compute_score(gts, res)[0]
+                expected['ROUGE_L'] = Rouge().compute_score(gts, res)[0]
+                expected['CIDEr'] = Cider().compute_score(gts, res)[0]
+                for metric in METRICS:
+                    self.assertAlmostEqual(observed[metric][sys_no], expected[metric], places=12)
+
+    def test_resampled_bleu(self):
+        rng = np.random.RandomState(1)
+        for perl_compat in [True, False]:
+            stats = self.system_stats(perl_compat)[0]
+            for _ in range(10):
+                counts = np.bincount(rng.randint(0, len(stats), len(stats)), minlength=len(stats))
+                bleu = BLEUScore(perl_compat=perl_compat)
+                for inst_no, count in enumerate(counts):
+                    for _ in range(count):
+                        bleu.append(self.systems[0][inst_no], self.data_ref[inst_no])
+                sums = counts[None, :].astype(float).dot(stats.values)
+                self.assertAlmostEqual(stats.bleu(sums)[0], bleu.score(), places=12)
+
+    def test_resampling(self):
+        system_stats = self.system_stats()
+        samples = SignificanceTester(system_stats, self.meteor, batch_size=100).bootstrap(500, seed=5)
+        for workers in [2, 3]:
+            other_samples = SignificanceTester(system_stats, self.meteor, workers, batch_size=100).bootstrap(500, seed=5)
+            for metric in METRICS:
+                self.assertEqual(samples[metric].shape, (500, 2))
+                np.testing.assert_array_equal(other_samples[metric], samples[metric])
+        observed = SignificanceTester(system_stats, self.meteor).observed()
+        p_values = bootstrap_p_values(observed, samples)
+        intervals = confidence_intervals(samples)
+        for metric in METRICS:
+            self.assertTrue(0.0 <= p_values[metric][(0, 1)] <= 1.0)
+            self.assertTrue(np.all(intervals[metric][:, 0] <= intervals[metric][:, 1]))
+
+    def test_same_systems(self):
+        # swapping identical outputs never changes the scores
+        stats = self.system_stats()[0]
+        p_values = SignificanceTester([stats, stats], self.meteor).approx_randomization(200, seed=1)
+        for metric in METRICS:
+            self.assertEqual(p_values[metric][(0, 1)], 1.0)
+        self.assertRaises(ValueError, SignificanceTester, [stats], self.meteor)
+
+
+if __name__ == '__main__':
+    unittest.main()
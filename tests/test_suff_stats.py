@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for sufficient statistics (metrics.suff_stats): scores of merged statistics of parts
+of the data must be the same as of all the data at once, and the same as the scorers give."""
+
+from __future__ import unicode_literals
+from builtins import zip
+import os
+import shutil
+import tempfile
+import unittest
+
+from metrics.pymteval import BLEUNISTScore
+from metrics.suff_stats import SufficientStats, merge_stats
+from pycocoevalcap.cider.cider import Cider
+from pycocoevalcap.meteor.meteor_approx import MeteorApprox
+from tests.data import random_data, lowercase
+
+SPLITS = [0, 40, 41, 120, 200]
+
+
+class SufficientStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_ref, self.data_sys = random_data()
+        coco_ref, coco_sys = lowercase(self.data_ref, self.data_sys)
+        self.coco_ref, self.coco_sys = coco_ref, [sent or 'a' for sent in coco_sys]
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def compute(self, start, end):
+        return SufficientStats.compute(self.data_ref[start:end], self.data_sys[start:end],
+                                       self.coco_ref[start:end], self.coco_sys[start:end], MeteorApprox())
+
+    def test_whole_data(self):
+        scores = self.compute(None, None).scores()
+        bleu_nist = BLEUNISTScore(perl_compat=True)
+        for refs, sent in zip(self.data_ref, self.data_sys):
+            bleu_nist.append(sent, refs)
+        self.assertEqual((scores['BLEU'], scores['NIST']), bleu_nist.score())
+        cider, _ = Cider().compute_score(dict(enumerate(self.coco_ref)),
+                                         {inst_no: [sent] for inst_no, sent in enumerate(self.coco_sys)})
+        self.assertEqual(scores['CIDEr'], cider)
+
+    def test_merge(self):
+        scores = self.compute(None, None).scores()
+        parts = []
+        for part_no, (start, end) in enumerate(zip(SPLITS, SPLITS[1:])):
+            fname = os.path.join(self.tmp_dir, 'part%d.json%s' % (part_no, '.gz' if part_no % 2 else ''))
+            self.compute(start, end).save(fname)
+            parts.append(SufficientStats.load(fname))
+        merged = merge_stats(parts)
+        self.assertEqual(len(merged), len(self.data_sys))
+        self.assertEqual(merged.scores(), scores)
+        # merging is associative
+        regrouped = merge_stats([parts[0], merge_stats(parts[1:3]), parts[3]])
+        self.assertEqual(regrouped.data, merged.data)
+
+    def test_incompatible(self):
+        stats = self.compute(0, 10)
+        data = dict(stats.data, version=0)
+        self.assertRaises(ValueError, SufficientStats, data)
+        data = dict(stats.data, CIDEr=dict(stats.data['CIDEr'], sigma=3.0))
+        self.assertRaises(ValueError, stats.merge, SufficientStats(data))
+
+
+if __name__ == '__main__':
+    unittest.main()